@@ -0,0 +1,220 @@
+# announcer.py
+"""
+Event-driven continuous-mode announcements.
+
+The announcer subscribes to every camera's tracker and only speaks about
+changes: objects that appeared, left, or moved to another zone. A change
+is announced once it has held for ANNOUNCE_DEBOUNCE seconds, so a track
+that flickers for a frame or two stays silent, and announcements are at
+least ANNOUNCE_MIN_INTERVAL seconds apart; changes in between are
+collected into the next one. When continuous mode starts, the whole scene
+is described once as the baseline.
+
+The tracker callback only stores the newest snapshot and wakes the
+announcer thread, so detection never waits for speech.
+"""
+import threading
+import time
+from collections import Counter, deque
+import config
+from metrics import metrics
+from object_recognition import announce_scene, camera_prefix, cameras, describe_objects, describe_place
+from speech_output import speech_service, PRIORITY_AMBIENT
+
+WAKE_INTERVAL = 0.5  # Seconds between checks when no tracker update arrives
+
+
+class TrackedObject:
+    """What the announcer knows about one track and what it last said about it."""
+    __slots__ = ("label", "column", "column_since", "first_seen", "last_seen", "present", "announced_column")
+
+    def __init__(self, label, column, now):
+        self.label = label
+        self.column = column
+        self.column_since = now
+        self.first_seen = now
+        self.last_seen = now
+        self.present = True           # In the newest snapshot
+        self.announced_column = None  # Zone it was last announced in, None if never announced
+
+
+class ContinuousAnnouncer:
+    def __init__(self, min_interval=None, debounce=None):
+        """
+        Args:
+            min_interval (float): Seconds between announcements (config.ANNOUNCE_MIN_INTERVAL)
+            debounce (float): Seconds a change must hold before it is announced (config.ANNOUNCE_DEBOUNCE)
+        """
+        self.min_interval = config.ANNOUNCE_MIN_INTERVAL if min_interval is None else min_interval
+        self.debounce = config.ANNOUNCE_DEBOUNCE if debounce is None else debounce
+        self._condition = threading.Condition()
+        self._latest = {}    # camera name -> newest snapshot
+        self._versions = {}  # camera name -> version of the snapshot last observed
+        self._objects = {}   # camera name -> {track id: TrackedObject}
+        self._subscribed = set()
+        self._active = False
+        self._last_announcement = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.announcements = 0
+        self.events = Counter()  # "appeared" / "left" / "moved"
+        self.recent = deque()    # time.monotonic() of the announcements in the last minute
+        self.thread_cpu = 0.0    # CPU seconds used by the announcer thread
+        self._started_at = None
+        self._process_cpu_at_start = None
+
+    def start(self):
+        self.subscribe_cameras()
+        self._started_at = time.monotonic()
+        self._process_cpu_at_start = time.process_time()
+        self._thread = threading.Thread(target=self._run, name="announcer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def subscribe_cameras(self):
+        """Subscribe to the tracker of every registered camera not subscribed yet."""
+        for name, camera in list(cameras.items()):
+            if name not in self._subscribed:
+                self._subscribed.add(name)
+                camera.tracker.subscribe(lambda snapshot, name=name: self._on_update(name, snapshot))
+
+    def _on_update(self, name, snapshot):
+        # Runs on the detection thread: store and wake, nothing else
+        with self._condition:
+            self._latest[name] = snapshot
+            self._condition.notify()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                self._condition.wait(WAKE_INTERVAL)
+                latest = dict(self._latest)
+            cpu_start = time.thread_time()
+            with metrics.timer("announcer"):
+                self._step(latest, time.monotonic())
+            self.thread_cpu += time.thread_time() - cpu_start
+
+    def _step(self, latest, now):
+        if config.current_mode != "continuous" or not config.recognition_enabled:
+            self._active = False
+            return
+        if not self._active:
+            # Whatever happened while continuous mode was off is not a change to announce
+            self._objects.clear()
+            self._versions.clear()
+        for name, snapshot in latest.items():
+            self._observe(name, snapshot, now)
+        if not self._active:
+            # Entering continuous mode: describe everything once, then only changes
+            self._active = True
+            for objects in self._objects.values():
+                for tracked in objects.values():
+                    tracked.announced_column = tracked.column
+            announce_scene()
+            self._announced(now)
+            return
+        if now - self._last_announcement < self.min_interval:
+            return
+        sentence = self._collect_changes(now)
+        if sentence:
+            # A newer announcement replaces one that has not been spoken yet
+            speech_service.speak(sentence, priority=PRIORITY_AMBIENT, category="continuous",
+                                 max_age=config.ANNOUNCE_MAX_AGE, cached=True)
+            self._announced(now)
+
+    def _observe(self, name, snapshot, now):
+        """Fold a new snapshot into the per-track state of one camera."""
+        if self._versions.get(name) == snapshot.version:
+            return
+        self._versions[name] = snapshot.version
+        objects = self._objects.setdefault(name, {})
+        present = {spatial.id for spatial in snapshot.objects}
+        for track_id, tracked in objects.items():
+            tracked.present = track_id in present
+        for spatial in snapshot.objects:
+            tracked = objects.get(spatial.id)
+            if tracked is None:
+                objects[spatial.id] = TrackedObject(spatial.label, spatial.column, now)
+                continue
+            tracked.last_seen = now
+            if spatial.column != tracked.column:
+                tracked.column = spatial.column
+                tracked.column_since = now
+
+    @staticmethod
+    def _successor(objects, lost):
+        """A new, unannounced track of the same label as a lost one (same zone first), or None."""
+        candidates = [
+            (tracked.column != lost.column, track_id)
+            for track_id, tracked in objects.items()
+            if tracked.present and tracked.announced_column is None and tracked.label == lost.label
+        ]
+        return objects[min(candidates)[1]] if candidates else None
+
+    def _collect_changes(self, now):
+        """Sentence describing every change that held for the debounce time, or "" if none."""
+        parts = []
+        for name, objects in self._objects.items():
+            appeared, gone, moved = {}, {}, []
+            for track_id, tracked in list(objects.items()):
+                if now - tracked.last_seen < self.debounce:
+                    continue
+                del objects[track_id]
+                if tracked.announced_column is None:
+                    continue
+                # The tracker often loses an object and re-finds it as a new track (e.g. after
+                # a fast move): the new track inherits what was said, so this is no departure
+                successor = self._successor(objects, tracked)
+                if successor is None:
+                    gone.setdefault(tracked.announced_column, []).append(tracked.label)
+                else:
+                    successor.announced_column = tracked.announced_column
+
+            # Labels of announced objects missing right now, but not long enough to call them gone
+            missing = {tracked.label for tracked in objects.values() if not tracked.present and tracked.announced_column}
+            for tracked in objects.values():
+                if not tracked.present:
+                    continue
+                if tracked.announced_column is None:
+                    # Hold back while it may be a missing object re-found under a new track
+                    if now - tracked.first_seen >= self.debounce and tracked.label not in missing:
+                        appeared.setdefault(tracked.column, []).append(tracked.label)
+                        tracked.announced_column = tracked.column
+                elif tracked.column != tracked.announced_column and now - tracked.column_since >= self.debounce:
+                    moved.append((tracked.label, tracked.column))
+                    tracked.announced_column = tracked.column
+
+            sentences = [f"New {describe_place(column, None)}: {describe_objects(labels)}." for column, labels in appeared.items()]
+            sentences += [f"No longer {describe_place(column, None)}: {describe_objects(labels)}." for column, labels in gone.items()]
+            sentences += [f"{describe_objects([label]).capitalize()} moved to the {column}." for label, column in moved]
+            self.events.update({"appeared": sum(map(len, appeared.values())), "left": sum(map(len, gone.values())), "moved": len(moved)})
+            if sentences:
+                parts.append(camera_prefix(name) + " ".join(sentences))
+        return " ".join(parts)
+
+    def _announced(self, now):
+        self._last_announcement = now
+        self.announcements += 1
+        self.recent.append(now)
+
+    def stats(self):
+        """Announcement rate and CPU use since start()."""
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > 60:
+            self.recent.popleft()
+        elapsed = now - self._started_at if self._started_at else 0.0
+        return {
+            "announcements": self.announcements,
+            "announcements_last_minute": len(self.recent),
+            "announcements_per_minute": round(self.announcements * 60 / elapsed, 2) if elapsed else 0.0,
+            "events": dict(self.events),
+            "announcer_cpu_percent": round(100 * self.thread_cpu / elapsed, 3) if elapsed else 0.0,
+            "process_cpu_percent": round(100 * (time.process_time() - self._process_cpu_at_start) / elapsed, 1) if elapsed else 0.0,
+        }
@@ -0,0 +1,159 @@
+# audio_stream.py
+"""
+One persistent microphone stream shared by every speech consumer.
+
+PyAudio delivers 16 kHz mono int16 audio through a callback into a ring
+buffer. The callback is the only writer and only ever advances a sample
+counter, so consumers (the command recognizer, the interrupt listener and
+Vosk) each read through their own AudioReader cursor without locking the
+data. The background noise floor is tracked continuously from the same
+blocks, which replaces the per-call adjust_for_ambient_noise() second.
+"""
+import logging
+import threading
+import time
+import numpy as np
+import pyaudio
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 1024          # Samples per PyAudio callback
+BUFFER_SECONDS = 30
+PREROLL_SECONDS = 0.3      # Audio a new reader gets from before it was created
+
+
+class AudioStream:
+    def __init__(self, sample_rate=SAMPLE_RATE, buffer_seconds=BUFFER_SECONDS):
+        self.sample_rate = sample_rate
+        self.capacity = sample_rate * buffer_seconds
+        self.buffer = np.zeros(self.capacity, dtype=np.int16)
+        self.write_pos = 0         # Total samples written since start
+        self.noise_floor = None    # RMS of background noise, int16 units
+        self.last_write_time = None  # time.monotonic() of the newest block
+        self._data_ready = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._pa = None
+        self._stream = None
+
+    def start(self):
+        """Open the microphone once; later calls are no-ops."""
+        with self._start_lock:
+            if self._stream is not None:
+                return
+            self._pa = pyaudio.PyAudio()
+            self._stream = self._pa.open(
+                format=pyaudio.paInt16,
+                channels=1,
+                rate=self.sample_rate,
+                input=True,
+                frames_per_buffer=BLOCK_SIZE,
+                stream_callback=self._callback
+            )
+            self._stream.start_stream()
+            logger.info("Shared microphone stream started")
+
+    def stop(self):
+        with self._start_lock:
+            if self._stream is None:
+                return
+            try:
+                self._stream.stop_stream()
+                self._stream.close()
+            except Exception as e:
+                logger.error(f"Error closing stream: {e}")
+            self._pa.terminate()
+            self._stream = None
+            self._pa = None
+
+    @property
+    def running(self):
+        return self._stream is not None
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.write(np.frombuffer(in_data, dtype=np.int16))
+        return None, pyaudio.paContinue
+
+    def write(self, samples):
+        """Append samples to the ring buffer (single writer only)."""
+        samples = samples[-self.capacity:]
+        count = len(samples)
+        start = self.write_pos % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:]
+        self._update_noise_floor(samples)
+        self.write_pos += count
+        self.last_write_time = time.monotonic()
+        with self._data_ready:
+            self._data_ready.notify_all()
+
+    def _update_noise_floor(self, samples):
+        """Follow quiet passages quickly and louder ones slowly, so speech barely moves the floor."""
+        if not len(samples):
+            return
+        rms = float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        elif rms < self.noise_floor:
+            self.noise_floor = 0.9 * self.noise_floor + 0.1 * rms
+        else:
+            self.noise_floor = 0.995 * self.noise_floor + 0.005 * rms
+
+    def sample_time(self, position):
+        """Approximate time.monotonic() at which the sample at `position` was captured."""
+        if self.last_write_time is None:
+            return time.monotonic()
+        return self.last_write_time - (self.write_pos - position) / self.sample_rate
+
+    def wait_for_data(self, position, timeout):
+        """Wait until more than `position` samples have been written."""
+        with self._data_ready:
+            return self._data_ready.wait_for(lambda: self.write_pos > position, timeout)
+
+    def reader(self, preroll=PREROLL_SECONDS):
+        """Create an independent cursor starting slightly before the current position."""
+        self.start()
+        return AudioReader(self, max(0, self.write_pos - int(preroll * self.sample_rate)))
+
+
+class AudioReader:
+    """Independent read cursor into an AudioStream."""
+
+    def __init__(self, stream, position):
+        self.stream = stream
+        self.position = position
+        self.overruns = 0  # Times the writer lapped this reader and audio was skipped
+
+    def seek_to_now(self):
+        self.position = self.stream.write_pos
+
+    def available(self):
+        return self.stream.write_pos - self.position
+
+    def read_samples(self, count, timeout=None):
+        """
+        Return up to `count` int16 samples, waiting until that many are available.
+        Returns fewer (possibly none) if the timeout expires first.
+        """
+        stream = self.stream
+        while self.available() < count:
+            if not stream.wait_for_data(self.position + count - 1, timeout):
+                break
+        if self.available() > stream.capacity:
+            self.overruns += 1
+            self.position = stream.write_pos - stream.capacity
+        count = min(count, self.available())
+        start = self.position % stream.capacity
+        first = min(count, stream.capacity - start)
+        samples = np.concatenate((stream.buffer[start:start + first], stream.buffer[:count - first]))
+        self.position += count
+        return samples
+
+    def read(self, count, timeout=None):
+        """Like read_samples() but returns raw little-endian int16 bytes."""
+        return self.read_samples(count, timeout).tobytes()
+
+
+# Shared instance used by every speech consumer
+shared_stream = AudioStream()
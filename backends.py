@@ -0,0 +1,241 @@
+# backends.py
+"""
+Interchangeable inference runtimes for the YOLOv4-tiny detector.
+
+Every backend takes the preprocessed NCHW blob and returns a list of output
+arrays in the Darknet YOLO layout (one row per candidate: centre x, centre
+y, width, height, objectness, class scores, all relative to the input; a
+leading batch axis when several frames were stacked into the blob), so
+postprocessing, NMS and the tracker never need to know which runtime ran
+the network. The backend is chosen with config.DETECTOR_BACKEND:
+
+    "opencv"     cv2.dnn with the Darknet weights (default)
+    "onnx"       ONNX Runtime on the CPU with an FP32 ONNX export
+    "onnx-int8"  ONNX Runtime with an INT8 quantized export
+
+ONNX Runtime is an optional dependency and is imported only when one of its
+backends is selected. An INT8 model can be produced from the FP32 export with
+
+    python backends.py quantize yolov4-tiny.onnx yolov4-tiny.int8.onnx --calibration frames/
+"""
+import argparse
+import os
+import sys
+import cv2
+import numpy as np
+import config
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+OPENCV_TARGETS = {
+    "cpu": cv2.dnn.DNN_TARGET_CPU,
+    "opencl": cv2.dnn.DNN_TARGET_OPENCL,
+    "opencl_fp16": cv2.dnn.DNN_TARGET_OPENCL_FP16,
+}
+
+
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    try:
+        base_path = sys._MEIPASS  # type: ignore[attr-defined]
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+class OpenCVBackend:
+    """cv2.dnn running the Darknet cfg/weights, or any object with the cv2.dnn.Net interface."""
+
+    name = "opencv"
+
+    def __init__(self, net=None, weights="yolov4-tiny.weights", cfg="yolov4-tiny.cfg", target="cpu", threads=0):
+        """
+        Args:
+            net: Already loaded network; weights and cfg are ignored when given
+            target (str): One of OPENCV_TARGETS
+            threads (int): OpenCV worker threads, 0 keeps the library default
+        """
+        self.net = net
+        self.weights = weights
+        self.cfg = cfg
+        self.target = target
+        self.threads = threads
+        self.input_size = None  # Darknet accepts any multiple of 32, so the configured size is used
+        self.max_batch = None   # ... and any batch size
+        self.output_layers = []
+        if net is not None:
+            self._find_output_layers()
+
+    def load(self):
+        if self.threads:
+            cv2.setNumThreads(self.threads)
+        if self.net is None:
+            net = cv2.dnn.readNet(resource_path(self.weights), resource_path(self.cfg))
+            net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            net.setPreferableTarget(OPENCV_TARGETS[self.target])
+            self.net = net
+            self._find_output_layers()
+
+    def _find_output_layers(self):
+        layer_names = self.net.getLayerNames()
+        self.output_layers = [layer_names[i - 1] for i in np.asarray(self.net.getUnconnectedOutLayers()).flatten()]
+
+    def infer(self, blob):
+        self.net.setInput(blob)
+        return self.net.forward(self.output_layers)
+
+
+class OnnxRuntimeBackend:
+    """ONNX Runtime session on an ONNX export of yolov4-tiny (FP32 or quantized)."""
+
+    def __init__(self, model_path, name="onnx", threads=0, providers=("CPUExecutionProvider",)):
+        """
+        Args:
+            model_path (str): ONNX file, resolved with resource_path
+            threads (int): Intra-op threads, 0 keeps the runtime default
+            providers: Execution providers in order of preference
+        """
+        self.name = name
+        self.model_path = model_path
+        self.threads = threads
+        self.providers = list(providers)
+        self.session = None
+        self.input_name = None
+        self.input_size = None
+        self.max_batch = None
+
+    def load(self):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError(f"The {self.name} backend needs onnxruntime (pip install onnxruntime)") from e
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.session = onnxruntime.InferenceSession(
+            resource_path(self.model_path), sess_options=options, providers=self.providers
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        if isinstance(batch, int):
+            self.max_batch = batch
+        # Exports with a fixed input size dictate the blob size; dynamic ones accept any
+        if isinstance(height, int) and isinstance(width, int):
+            if height != width:
+                raise RuntimeError(f"{self.model_path} expects a {width}x{height} input, only square inputs are supported")
+            self.input_size = height
+
+    def infer(self, blob):
+        return to_yolo_outputs(self.session.run(None, {self.input_name: blob}))
+
+
+def to_yolo_outputs(outputs):
+    """
+    Bring ONNX exports into the Darknet YOLO layout, keeping the batch axis.
+
+    Two export styles are common: a single (B, N, 5 + classes) tensor that is
+    already in Darknet layout, and a pair of boxes (B, N, 1, 4) as corners
+    plus per-class confidences (B, N, classes), as written by the PyTorch
+    YOLOv4 converters. The pair is rewritten as centre/size rows with the
+    best class confidence standing in for the objectness score.
+    """
+    if len(outputs) == 2 and outputs[0].shape[-1] == 4:
+        batch = outputs[0].shape[0]
+        boxes = outputs[0].reshape(batch, -1, 4)
+        scores = outputs[1].reshape(batch, boxes.shape[1], -1)
+        rows = np.empty((batch, boxes.shape[1], 5 + scores.shape[2]), dtype=np.float32)
+        rows[..., 0] = (boxes[..., 0] + boxes[..., 2]) / 2
+        rows[..., 1] = (boxes[..., 1] + boxes[..., 3]) / 2
+        rows[..., 2] = boxes[..., 2] - boxes[..., 0]
+        rows[..., 3] = boxes[..., 3] - boxes[..., 1]
+        rows[..., 4] = scores.max(axis=2)
+        rows[..., 5:] = scores
+        return [rows]
+    return list(outputs)
+
+
+def split_batch(outputs, batch):
+    """Per-frame output lists from the outputs of a batched forward pass."""
+    if batch == 1:
+        return [outputs]
+    per_frame = [output.reshape(batch, -1, output.shape[-1]) for output in outputs]
+    return [[output[index] for output in per_frame] for index in range(batch)]
+
+
+BACKENDS = ("opencv", "onnx", "onnx-int8")
+
+
+def create_backend(name=None):
+    """Build the named backend (config.DETECTOR_BACKEND by default) with its configured thread count."""
+    name = name or config.DETECTOR_BACKEND
+    threads = config.DETECTOR_THREADS.get(name, 0)
+    if name == "opencv":
+        return OpenCVBackend(target=config.OPENCV_TARGET, threads=threads)
+    if name == "onnx":
+        return OnnxRuntimeBackend(config.ONNX_MODEL_PATH, name=name, threads=threads, providers=config.ONNX_PROVIDERS)
+    if name == "onnx-int8":
+        return OnnxRuntimeBackend(config.ONNX_INT8_MODEL_PATH, name=name, threads=threads, providers=config.ONNX_PROVIDERS)
+    raise ValueError(f"Unknown detector backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+
+class _CalibrationReader:
+    """Feeds preprocessed fixture images to the static quantizer."""
+
+    def __init__(self, input_name, image_dir, size, limit):
+        names = sorted(name for name in os.listdir(image_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.input_name = input_name
+        self.paths = [os.path.join(image_dir, name) for name in names[:limit]]
+        self.size = size
+
+    def get_next(self):
+        while self.paths:
+            frame = cv2.imread(self.paths.pop(0))
+            if frame is not None:
+                return {self.input_name: cv2.dnn.blobFromImage(frame, 1 / 255.0, self.size, swapRB=True, crop=False)}
+        return None
+
+
+def quantize_model(source, destination, calibration_dir, limit=100):
+    """
+    Write an INT8 copy of an FP32 ONNX model, calibrated on real frames.
+    Weights are quantized per channel and activations per tensor (QDQ format),
+    which ONNX Runtime executes with integer kernels on the CPU.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    model_input = onnx.load(source).graph.input[0]
+    dims = [dim.dim_value for dim in model_input.type.tensor_type.shape.dim]
+    size = (dims[3] or 416, dims[2] or 416)
+    reader = _CalibrationReader(model_input.name, calibration_dir, size, limit)
+    quantize_static(
+        source, destination, reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector backend utilities")
+    commands = parser.add_subparsers(dest="command", required=True)
+    quantize = commands.add_parser("quantize", help="Quantize an FP32 ONNX model to INT8")
+    quantize.add_argument("source", help="FP32 ONNX model")
+    quantize.add_argument("destination", help="Where to write the INT8 model")
+    quantize.add_argument("--calibration", required=True, help="Directory of representative camera frames")
+    quantize.add_argument("--limit", type=int, default=100, help="Maximum number of calibration frames")
+    args = parser.parse_args()
+
+    if args.command == "quantize":
+        quantize_model(args.source, args.destination, args.calibration, args.limit)
+        print(f"INT8 model written to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
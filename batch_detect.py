@@ -0,0 +1,388 @@
+# batch_detect.py
+"""
+Offline batch detection over recorded footage.
+
+Runs the detector on every frame (or every Nth frame) of video files and
+image directories as fast as the CPU allows, without a camera, display,
+speech or inference scheduler. Frames are decoded on a background thread
+into a bounded queue so decoding overlaps inference, and each inferred
+frame becomes one JSON line with its detections and a left/middle/right
+summary of the tracked objects.
+
+Progress is checkpointed next to the output file, so an interrupted run
+(Ctrl+C, a reboot) continues where it stopped with --resume instead of
+starting over. Only the tracker starts empty after a resume, so the zone
+summaries of the first few resumed frames can differ from an uninterrupted
+run; the detections are identical.
+
+Usage:
+    python batch_detect.py session1.mp4 session2.mp4 --output detections.jsonl
+    python batch_detect.py frames/ --stride 5 --batch 4 --output detections.jsonl
+    python batch_detect.py session1.mp4 session2.mp4 --output detections.jsonl --resume
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+import cv2
+import object_recognition
+from backends import create_backend
+from tracker import COLUMNS, ObjectTracker
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+READ_AHEAD = 32            # Decoded frames buffered ahead of inference
+CHECKPOINT_INTERVAL = 5.0  # Seconds between progress checkpoints
+REPORT_INTERVAL = 10.0     # Seconds between progress lines
+STAGES = ("preprocess", "forward", "postprocess", "nms")
+
+
+class FrameReader:
+    """Decodes a video file or an image directory on a background thread."""
+
+    def __init__(self, source, stride=1, start=0, read_ahead=READ_AHEAD):
+        """
+        Args:
+            source (str): Video file or directory of images
+            stride (int): Only frames whose index is a multiple of stride are decoded
+            start (int): Index of the first frame to deliver (when resuming)
+            read_ahead (int): Decoded frames that may wait for inference
+        """
+        self.source = source
+        self.stride = stride
+        self.start = start
+        self.frames = queue.Queue(maxsize=read_ahead)
+        self.error = None
+        self.total = None  # Frames in the source, if known
+        self.fps = None    # Frame rate of a video source
+        self.decode_time = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        if os.path.isdir(source):
+            self._images = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.total = len(self._images)
+            self._cap = None
+        else:
+            self._images = None
+            self._cap = cv2.VideoCapture(source)
+            if not self._cap.isOpened():
+                raise IOError(f"Could not open video source {source!r}")
+            self.fps = self._cap.get(cv2.CAP_PROP_FPS) or None
+            self.total = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+
+    def start_reading(self):
+        self._thread = threading.Thread(target=self._read_loop, name="batch-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._cap is not None:
+            self._cap.release()
+
+    def _put(self, item):
+        """Queue an item, waiting while the queue is full unless the reader is stopped."""
+        while not self._stop_event.is_set():
+            try:
+                self.frames.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_loop(self):
+        try:
+            if self._images is not None:
+                self._read_images()
+            else:
+                self._read_video()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(None)
+
+    def _read_images(self):
+        for index in range(self.start, len(self._images)):
+            if index % self.stride:
+                continue
+            start = time.perf_counter()
+            frame = cv2.imread(os.path.join(self.source, self._images[index]))
+            self.decode_time += time.perf_counter() - start
+            if frame is None:
+                continue
+            if not self._put((index, None, frame)):
+                return
+
+    def _read_video(self):
+        cap = self._cap
+        index = 0
+        if self.start:
+            # Seeking is inexact for some codecs; fall back to skipping frame by frame
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+            index = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if index != self.start:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                index = 0
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            if index < self.start or index % self.stride:
+                # grab() advances without converting the frame to BGR
+                ok, frame = cap.grab(), None
+            else:
+                ok, frame = cap.read()
+            self.decode_time += time.perf_counter() - start
+            if not ok:
+                return
+            if frame is not None:
+                timestamp = index / self.fps if self.fps else None
+                if not self._put((index, timestamp, frame)):
+                    return
+            index += 1
+
+
+def detection_record(detection):
+    """JSON-friendly copy of a detection dict."""
+    return {
+        "label": detection["label"],
+        "confidence": round(float(detection["confidence"]), 4),
+        "box": [int(value) for value in detection["box"]],
+    }
+
+
+def zone_summary(snapshot):
+    """Label counts per zone of a tracker snapshot, e.g. {"left": {"chair": 2}, "middle": {}, "right": {"person": 1}}."""
+    return {zone: dict(Counter(snapshot.labels(zone))) for zone in COLUMNS}
+
+
+class Progress:
+    """Checkpoint of a batch run: how far each source got and how much output is valid."""
+
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}     # source -> {"next_frame", "done", "frames", "next_track_id"}
+        self.output_bytes = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.sources = state.get("sources", {})
+        self.output_bytes = state.get("output_bytes", 0)
+        return True
+
+    def save(self):
+        # Write then rename, so a crash never leaves a half-written checkpoint
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"output_bytes": self.output_bytes, "sources": self.sources}, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def source(self, name):
+        return self.sources.setdefault(name, {"next_frame": 0, "done": False, "frames": 0, "next_track_id": 1})
+
+
+class BatchRun:
+    def __init__(self, output, stride=1, batch=1, resume=False):
+        """
+        Args:
+            output (str): JSONL file receiving one record per inferred frame
+            stride (int): Infer every Nth frame
+            batch (int): Frames per forward pass
+            resume (bool): Continue from the checkpoint next to the output instead of starting over
+        """
+        self.output_path = output
+        self.stride = max(1, stride)
+        self.batch = max(1, batch)
+        self.progress = Progress(output + ".progress")
+        if resume and self.progress.load():
+            # Drop records written after the last checkpoint; they are produced again
+            if os.path.exists(output):
+                os.truncate(output, self.progress.output_bytes)
+            self.output = open(output, "a", encoding="utf-8")
+        else:
+            self.output = open(output, "w", encoding="utf-8")
+        self.report = {"sources": {}}
+        self._last_checkpoint = time.monotonic()
+        self._last_report = time.monotonic()
+
+    def checkpoint(self):
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        self.progress.output_bytes = self.output.tell()
+        self.progress.save()
+        self._last_checkpoint = time.monotonic()
+
+    def run(self, sources):
+        start = time.perf_counter()
+        try:
+            for source in sources:
+                state = self.progress.source(source)
+                if state["done"]:
+                    print(f"Skipping {source}: already processed")
+                    continue
+                report = self.report["sources"][source] = self.process_source(source, state)
+                if report.get("interrupted"):
+                    print("Interrupted; continue with --resume")
+                    break
+        finally:
+            self.output.close()
+        self.report["wall_s"] = round(time.perf_counter() - start, 3)
+        self.report["frames"] = sum(report["frames"] for report in self.report["sources"].values())
+        self.report["fps"] = round(self.report["frames"] / self.report["wall_s"], 2) if self.report["wall_s"] else 0.0
+        return self.report
+
+    def process_source(self, source, state):
+        """Detect on one source from its checkpoint on. Returns its throughput report."""
+        try:
+            reader = FrameReader(source, self.stride, state["next_frame"])
+        except IOError as e:
+            print(f"Error: {e}")
+            return {"frames": 0, "error": str(e)}
+        tracker = ObjectTracker()
+        tracker.next_id = state["next_track_id"]
+        stage_time = dict.fromkeys(STAGES, 0.0)
+        frames = 0
+        first_frame = state["next_frame"]
+        wait_time = 0.0
+        start = time.perf_counter()
+        interrupted = False
+        reader.start_reading()
+        try:
+            finished = False
+            while not finished:
+                # Wait for one decoded frame, then batch whatever else is already decoded
+                waited = time.perf_counter()
+                items = []
+                item = reader.frames.get()
+                wait_time += time.perf_counter() - waited
+                while item:
+                    items.append(item)
+                    if len(items) == self.batch:
+                        break
+                    item = self._get_nowait(reader)
+                finished = item is None
+                if not items:
+                    break
+
+                timings = {}
+                results = object_recognition.infer_batch([frame for _, _, frame in items], timings)
+                for stage in STAGES:
+                    stage_time[stage] += timings[stage]
+                for (index, timestamp, frame), detections in zip(items, results):
+                    tracker.update_objects(detections, timestamp, (frame.shape[1], frame.shape[0]))
+                    self.output.write(json.dumps({
+                        "source": source,
+                        "frame": index,
+                        "time": round(timestamp, 3) if timestamp is not None else None,
+                        "detections": [detection_record(detection) for detection in detections],
+                        "zones": zone_summary(tracker.snapshot()),
+                    }) + "\n")
+                    state["next_frame"] = index + 1
+                    frames += 1
+                state["frames"] += len(items)
+                state["next_track_id"] = tracker.next_id
+                self._maybe_report(source, state, reader, frames, start)
+                if time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+                    self.checkpoint()
+        except KeyboardInterrupt:
+            # Keep the last checkpoint: it was taken between batches, so it matches the output
+            interrupted = True
+        finally:
+            reader.stop()
+        if not interrupted:
+            if reader.error is not None:
+                print(f"Error while reading {source}: {reader.error}")
+            else:
+                state["done"] = True
+            self.checkpoint()
+
+        wall = time.perf_counter() - start
+        report = {
+            "frames": frames,
+            "wall_s": round(wall, 3),
+            "fps": round(frames / wall, 2) if wall else 0.0,
+            "decode_ms_per_frame": round(reader.decode_time / frames * 1000, 3) if frames else 0.0,
+            "waiting_for_decode_s": round(wait_time, 3),
+            "stages_ms_per_frame": {stage: round(total / frames * 1000, 3) if frames else 0.0 for stage, total in stage_time.items()},
+        }
+        if interrupted:
+            report["interrupted"] = True
+        if reader.fps:
+            # How many seconds of footage each second of processing covers
+            report["realtime_factor"] = round((state["next_frame"] - first_frame) / reader.fps / wall, 2) if wall else 0.0
+        return report
+
+    @staticmethod
+    def _get_nowait(reader):
+        """The next decoded frame, None at the end, or False if nothing is decoded yet."""
+        try:
+            return reader.frames.get_nowait()
+        except queue.Empty:
+            return False
+
+    def _maybe_report(self, source, state, reader, frames, start):
+        now = time.monotonic()
+        if now - self._last_report < REPORT_INTERVAL:
+            return
+        self._last_report = now
+        elapsed = time.perf_counter() - start
+        fps = frames / elapsed if elapsed else 0.0
+        line = f"{source}: frame {state['next_frame']}"
+        if reader.total:
+            remaining = max(0, reader.total - state["next_frame"]) / self.stride
+            line += f"/{reader.total} ({100 * state['next_frame'] / reader.total:.0f}%)"
+            if fps:
+                line += f", about {remaining / fps / 60:.1f} min left"
+        print(f"{line}, {fps:.1f} frames/s")
+
+
+def print_report(report):
+    print(f"Processed {report['frames']} frames in {report['wall_s']:.1f} s ({report['fps']:.1f} frames/s)")
+    for source, summary in report["sources"].items():
+        if "error" in summary:
+            print(f"  {source}: {summary['error']}")
+            continue
+        line = f"  {source}: {summary['frames']} frames, {summary['fps']:.1f} frames/s"
+        if "realtime_factor" in summary:
+            line += f", {summary['realtime_factor']:.1f}x real time"
+        stages = ", ".join(f"{stage} {value:.1f} ms" for stage, value in summary["stages_ms_per_frame"].items())
+        print(f"{line}; decode {summary['decode_ms_per_frame']:.1f} ms, {stages}, waited {summary['waiting_for_decode_s']:.1f} s for frames")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect objects in recorded video files or image directories")
+    parser.add_argument("sources", nargs="+", help="Video files and/or directories of images")
+    parser.add_argument("--output", required=True, help="JSONL file for the per-frame detections")
+    parser.add_argument("--stride", type=int, default=1, help="Infer every Nth frame")
+    parser.add_argument("--batch", type=int, default=1, help="Frames per forward pass")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its checkpoint")
+    parser.add_argument("--backend", help="Detector backend to use instead of config.DETECTOR_BACKEND")
+    parser.add_argument("--input-size", type=int, help="Network input size, e.g. 320, 416 or 608")
+    parser.add_argument("--letterbox", action="store_true", help="Letterbox frames instead of stretching them")
+    parser.add_argument("--report", help="Write the throughput report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.backend:
+        backend = create_backend(args.backend)
+        backend.load()
+        object_recognition.set_backend(backend)
+    if args.input_size:
+        object_recognition.set_input_size(args.input_size)
+    if args.letterbox:
+        object_recognition.preprocessor.set_letterbox(True)
+    object_recognition.warm_up_network()
+
+    report = BatchRun(args.output, args.stride, args.batch, args.resume).run(args.sources)
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,702 @@
+# benchmark.py
+"""
+Offline benchmark for the detection and speech hot paths.
+
+Replays a directory of images or a video file through the detection path
+and times every stage, then runs the text/intent paths over a corpus of
+recorded transcripts. Results are printed and optionally written as JSON
+so runs can be compared between releases.
+
+Usage:
+    python benchmark.py --source frames/ --transcripts transcripts.txt --output results.json
+    python benchmark.py --source clip.mp4 --stub-net   # no yolov4-tiny.weights needed
+    python benchmark.py --skip-text --commands recordings/   # voice command latency
+    python benchmark.py --skip-text --source fixtures/ --parity opencv,onnx,onnx-int8   # exits 1 on a mismatch
+    python benchmark.py --skip-text --source frames/ --preprocess   # input sizes and letterboxing
+    python benchmark.py --skip-text --source clip.mp4 --cameras 4   # batched vs sequential, 1-4 sources
+    python benchmark.py --skip-text --source clip.mp4 --workers 1,2,4   # worker process scaling
+"""
+import argparse
+import functools
+import json
+import threading
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+import config
+import object_recognition
+from backends import OpenCVBackend, create_backend
+from preprocess import INPUT_SIZES, Preprocessor
+from tracker import iou_matrix
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+DETECTION_STAGES = ("preprocess", "forward", "postprocess", "nms", "draw")
+
+# A backend is equivalent to the reference when at least this share of detections match both ways
+PARITY_IOU = 0.5
+PARITY_MIN_AGREEMENT = 0.9  # Minimum recall and precision against the reference backend
+PARITY_MIN_IOU = 0.8        # Minimum mean IoU of the matched boxes
+
+# Used when no transcript corpus is given
+DEFAULT_TRANSCRIPTS = [
+    "what objects are on the left",
+    "what is in the middle",
+    "anything on my right",
+    "what's close on my right",
+    "are there any objects nearby",
+    "switch to next",
+    "switch to back",
+    "stop recognition",
+    "start query",
+    "gemini wake up what is artificial intelligence",
+    "gemini how do i cross a street safely",
+    "what time is it",
+]
+
+# Used by the chunk_text benchmark
+SAMPLE_ANSWER = (
+    "Artificial intelligence is the ability of a computer system to perform tasks that "
+    "normally require human intelligence. These include understanding speech, recognising "
+    "objects in images, making decisions and translating between languages! Modern systems "
+    "learn these skills from large amounts of data rather than from hand written rules. "
+    "Would you like to hear some everyday examples?"
+)
+
+
+class StubNet:
+    """
+    Stand-in for cv2.dnn.Net that returns synthetic yolov4-tiny outputs.
+    Lets the benchmark run on machines without yolov4-tiny.weights.
+    """
+
+    def __init__(self, forward_ms=0.0, seed=0, hit_rate=0.01):
+        self.forward_ms = forward_ms
+        self.rng = np.random.default_rng(seed)
+        self.hit_rate = hit_rate
+        self.num_classes = len(object_recognition.classes)
+
+    def getLayerNames(self):
+        return ["yolo_30", "yolo_37"]
+
+    def getUnconnectedOutLayers(self):
+        return np.array([1, 2])
+
+    def setInput(self, blob):
+        self.blob = blob
+
+    def forward(self, output_layers):
+        if self.forward_ms:
+            time.sleep(self.forward_ms * self.blob.shape[0] / 1000)
+        batch, size = self.blob.shape[0], self.blob.shape[2]
+        outputs = []
+        for stride in (32, 16):
+            rows = batch * 3 * (size // stride) ** 2
+            output = self.rng.random((rows, 5 + self.num_classes), dtype=np.float32) * 0.3
+            hits = self.rng.random(rows) < self.hit_rate
+            output[hits, 5 + self.rng.integers(0, self.num_classes, hits.sum())] = self.rng.uniform(0.5, 1.0, hits.sum())
+            # Like cv2.dnn, batched outputs get a leading batch axis
+            outputs.append(output.reshape(batch, -1, output.shape[-1]) if batch > 1 else output)
+        return outputs
+
+
+def stub_backend(forward_ms=0.0):
+    """Backend factory for worker processes in --stub-net runs (must be picklable)."""
+    return OpenCVBackend(net=StubNet(forward_ms=forward_ms))
+
+
+def iter_frames(source, limit=None):
+    """Yield BGR frames from an image directory or a video file."""
+    count = 0
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is None:
+                continue
+            yield frame
+            count += 1
+            if limit and count >= limit:
+                return
+    else:
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise SystemExit(f"Error: Could not open {source}")
+        try:
+            while not limit or count < limit:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+                count += 1
+        finally:
+            cap.release()
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+    }
+
+
+def benchmark_detection(source, limit=None, warmup=3):
+    """Replay frames through run_detection and the tracker, timing each stage."""
+    stage_samples = {stage: [] for stage in DETECTION_STAGES}
+    totals = []
+    frames = 0
+    for frame in iter_frames(source, limit):
+        timings = {}
+        start = time.perf_counter()
+        detected = object_recognition.run_detection(frame, timings)
+        object_recognition.object_tracker.update_objects(detected, frame_size=(frame.shape[1], frame.shape[0]))
+        elapsed = time.perf_counter() - start
+        frames += 1
+        if frames <= warmup:
+            continue
+        totals.append(elapsed)
+        for stage in DETECTION_STAGES:
+            stage_samples[stage].append(timings[stage])
+
+    result = {"frames": frames, "warmup_frames": min(warmup, frames)}
+    result["fps"] = round(len(totals) / sum(totals), 2) if totals else 0.0
+    result["total"] = summarize(totals)
+    result["stages"] = {stage: summarize(samples) for stage, samples in stage_samples.items()}
+    result["preprocessor"] = object_recognition.preprocessor.stats()
+    return result
+
+
+def benchmark_preprocess(source, limit=None, repeat=5):
+    """
+    Time and count allocations of cv2.dnn.blobFromImage against the Preprocessor
+    for every standard input size, stretched and letterboxed. Allocations are
+    measured with tracemalloc as the peak of new memory per frame.
+    """
+    frames = list(iter_frames(source, limit or 50))
+    variants = {}
+    for size in INPUT_SIZES:
+        variants[f"blobFromImage_{size}"] = lambda frame, size=size: cv2.dnn.blobFromImage(
+            frame, 1 / 255.0, (size, size), swapRB=True, crop=False)
+        for letterbox in (False, True):
+            preprocessor = Preprocessor(size, letterbox)
+            variants[f"preprocessor_{size}{'_letterbox' if letterbox else ''}"] = preprocessor.prepare
+
+    results = {"frames": len(frames)}
+    for name, prepare in variants.items():
+        prepare(frames[0])  # First call may allocate buffers
+        samples = []
+        for _ in range(repeat):
+            for frame in frames:
+                start = time.perf_counter()
+                prepare(frame)
+                samples.append(time.perf_counter() - start)
+        allocated = 0
+        tracemalloc.start()
+        for frame in frames:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            prepare(frame)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        results[name] = summarize(samples)
+        results[name]["bytes_allocated_per_frame"] = allocated // len(frames)
+    return results
+
+
+def benchmark_cameras(source, max_cameras=4, limit=None, warmup=2):
+    """
+    Compare one batched forward pass per step against one forward pass per camera,
+    for 1 to max_cameras simulated sources. Each source replays the same frames
+    from a different offset so the batch never holds identical images.
+    """
+    frames = list(iter_frames(source, limit or 60))
+    results = {"frames": len(frames)}
+    for count in range(1, max_cameras + 1):
+        offsets = [index * len(frames) // count for index in range(count)]
+        steps = [[frames[(step + offset) % len(frames)] for offset in offsets] for step in range(len(frames))]
+        timings = {}
+        for mode in ("sequential", "batched"):
+            samples = []
+            for step, batch in enumerate(steps):
+                start = time.perf_counter()
+                if mode == "batched":
+                    object_recognition.infer_batch(batch)
+                else:
+                    for frame in batch:
+                        object_recognition.infer_detections(frame)
+                if step >= warmup:
+                    samples.append(time.perf_counter() - start)
+            timings[mode] = samples
+        sequential, batched = sum(timings["sequential"]), sum(timings["batched"])
+        results[f"{count}_cameras"] = {
+            "sequential_fps": round(count * len(timings["sequential"]) / sequential, 2),
+            "batched_fps": round(count * len(timings["batched"]) / batched, 2),
+            "speedup": round(sequential / batched, 2),
+            "sequential": summarize(timings["sequential"]),
+            "batched": summarize(timings["batched"]),
+        }
+    return results
+
+
+def benchmark_workers(source, counts, limit=None, backend_factory=None):
+    """
+    Throughput and latency of the multi-process worker pool for each worker count,
+    against in-process detection (0 workers). Frames are submitted as fast as the
+    pool accepts them (blocking on backpressure) and collected in order.
+    """
+    from worker_pool import DetectionWorkerPool
+
+    frames = list(iter_frames(source, limit or 100))
+    height, width = frames[0].shape[:2]
+    results = {"frames": len(frames)}
+
+    samples = []
+    start = time.perf_counter()
+    for frame in frames:
+        frame_start = time.perf_counter()
+        object_recognition.infer_detections(frame)
+        samples.append(time.perf_counter() - frame_start)
+    elapsed = time.perf_counter() - start
+    results["in_process"] = {"fps": round(len(frames) / elapsed, 2), "latency": summarize(samples)}
+
+    for count in counts:
+        pool = DetectionWorkerPool(workers=count, max_frame_size=(width, height), backend_factory=backend_factory)
+        pool.start()
+        latencies = []
+        out_of_order = 0
+
+        def collect():
+            nonlocal out_of_order
+            expected = 0
+            for _ in frames:
+                result = pool.get_result()
+                out_of_order += result.sequence != expected
+                expected = result.sequence + 1
+                latencies.append(result.latency)
+
+        collector = threading.Thread(target=collect)
+        start = time.perf_counter()
+        collector.start()
+        for frame in frames:
+            pool.submit(frame, timeout=None)
+        collector.join()
+        elapsed = time.perf_counter() - start
+        stats = pool.stats()
+        pool.stop()
+        results[f"{count}_workers"] = {
+            "fps": round(len(frames) / elapsed, 2),
+            "speedup": round(len(frames) / elapsed / results["in_process"]["fps"], 2),
+            "latency": summarize(latencies),
+            "per_worker": stats["per_worker"],
+            "out_of_order": out_of_order,
+        }
+    return results
+
+
+def match_detections(reference, candidate, iou_threshold=PARITY_IOU):
+    """Greedy one-to-one matching of same-class detections. Returns (IoU, confidence delta) per match."""
+    matches = []
+    if not reference or not candidate:
+        return matches
+    ious = iou_matrix(
+        np.array([d["box"] for d in reference], dtype=np.float32),
+        np.array([d["box"] for d in candidate], dtype=np.float32),
+    )
+    same_class = np.array([d["class_id"] for d in reference])[:, None] == np.array([d["class_id"] for d in candidate])[None, :]
+    ious = np.where(same_class, ious, 0.0)
+    while ious.size and ious.max() >= iou_threshold:
+        i, j = np.unravel_index(np.argmax(ious), ious.shape)
+        matches.append((float(ious[i, j]), abs(reference[i]["confidence"] - candidate[j]["confidence"])))
+        ious[i, :] = 0.0
+        ious[:, j] = 0.0
+    return matches
+
+
+def benchmark_parity(source, names, limit=None, min_recall=PARITY_MIN_AGREEMENT,
+                     min_precision=PARITY_MIN_AGREEMENT, min_iou=PARITY_MIN_IOU):
+    """
+    Run every named backend over the same fixture frames and compare its detections
+    with the first one. A backend passes when its recall, precision and mean IoU of
+    matched boxes against the reference reach the minimums. Fixtures on which the
+    reference finds nothing prove nothing, so they fail too.
+    """
+    backends = []
+    for name in names:
+        backend = create_backend(name)
+        backend.load()
+        backends.append(backend)
+
+    reference_name = names[0]
+    counts = {name: {"reference": 0, "detections": 0, "matches": []} for name in names[1:]}
+    forward = {name: [] for name in names}
+    frames = 0
+    for frame in iter_frames(source, limit):
+        frames += 1
+        results = {}
+        for backend in backends:
+            timings = {}
+            results[backend.name] = object_recognition.infer_detections(frame, timings, backend=backend)
+            forward[backend.name].append(timings["forward"])
+        for name in names[1:]:
+            counts[name]["reference"] += len(results[reference_name])
+            counts[name]["detections"] += len(results[name])
+            counts[name]["matches"].extend(match_detections(results[reference_name], results[name]))
+
+    report = {"frames": frames, "reference": reference_name, "forward": {name: summarize(forward[name]) for name in names}}
+    report["thresholds"] = {"recall": min_recall, "precision": min_precision, "mean_iou": min_iou}
+    for name, count in counts.items():
+        matched = len(count["matches"])
+        recall = matched / count["reference"] if count["reference"] else 1.0
+        precision = matched / count["detections"] if count["detections"] else 1.0
+        mean_iou = float(np.mean([m[0] for m in count["matches"]])) if matched else 0.0
+        failures = []
+        if not count["reference"]:
+            failures.append(f"{reference_name} found nothing on the fixtures")
+        if recall < min_recall:
+            failures.append(f"recall {recall:.3f} < {min_recall}")
+        if precision < min_precision:
+            failures.append(f"precision {precision:.3f} < {min_precision}")
+        if matched and mean_iou < min_iou:
+            failures.append(f"mean IoU {mean_iou:.3f} < {min_iou}")
+        report[name] = {
+            "reference_detections": count["reference"],
+            "detections": count["detections"],
+            "matched": matched,
+            "recall": round(recall, 3),
+            "precision": round(precision, 3),
+            "mean_iou": round(mean_iou, 3) if matched else None,
+            "max_confidence_delta": round(max(m[1] for m in count["matches"]), 3) if matched else None,
+            "equivalent": not failures,
+            "failures": failures,
+        }
+    return report
+
+
+def load_transcripts(path):
+    """One transcript per line; blank lines are ignored."""
+    if not path:
+        return list(DEFAULT_TRANSCRIPTS)
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip().lower() for line in f if line.strip()]
+
+
+def time_calls(func, inputs, repeat):
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def benchmark_text(transcripts, repeat=50):
+    """Time the text and intent paths that run on every recognised utterance."""
+    # Imported here so detection-only runs don't need audio devices or Vertex AI
+    from speech_processing import chunk_text, match_voice_command
+    from gemini_ai import extract_query
+
+    return {
+        "transcripts": len(transcripts),
+        "match_voice_command": time_calls(match_voice_command, transcripts, repeat),
+        "categorize_objects": time_calls(lambda _: object_recognition.categorize_objects(), transcripts, repeat),
+        "build_object_response": time_calls(lambda q: object_recognition.build_object_response(q), transcripts, repeat),
+        "extract_query": time_calls(extract_query, transcripts, repeat),
+        "chunk_text": time_calls(chunk_text, [SAMPLE_ANSWER] + transcripts, repeat),
+    }
+
+
+def benchmark_commands(wav_dir, block_size=1600):
+    """
+    Command latency on recorded WAV commands: the streaming grammar spotter versus the
+    previous path (full-vocabulary Vosk result once the utterance has ended).
+    Latency is measured from the end of speech to the decision, in simulated real time:
+    audio still to be consumed plus the processing time of the deciding call.
+    Network round-trips of the Google path are not included.
+    """
+    from vosk import KaldiRecognizer
+    from vad import VoiceActivityDetector, read_wav, HANGOVER_MS
+    from command_spotter import CommandSpotter
+    import speech_processing
+    from speech_processing import EARLY_COMMANDS, ORDINARY_STARTS, VOICE_COMMANDS
+
+    try:
+        speech_processing.load_vosk_model()
+    except Exception as e:
+        raise SystemExit(f"Error: the command benchmark needs the Vosk model in model/ ({e})")
+    model = speech_processing.model
+    phrases = [entry[0] for entry in VOICE_COMMANDS]
+    spotter = CommandSpotter(model, phrases, early=EARLY_COMMANDS, ordinary=ORDINARY_STARTS)
+    full_recognizer = KaldiRecognizer(model, 16000)
+
+    spotter_latency, full_latency = [], []
+    spotter_correct = full_correct = files = 0
+    for name in sorted(os.listdir(wav_dir)):
+        if not name.lower().endswith(".wav"):
+            continue
+        samples, rate = read_wav(os.path.join(wav_dir, name))
+        expected = next((phrase for phrase in phrases if phrase in name.replace("_", " ").lower()), None)
+        files += 1
+
+        vad = VoiceActivityDetector(sample_rate=rate)
+        spotter.reset()
+        full_recognizer.Reset()
+        spotted_at = spotted = None
+        full_at = full_text = None
+        for offset in range(0, len(samples), block_size):
+            speech, finished = vad.process(samples[offset:offset + block_size])
+            audio_time = (offset + block_size) / rate
+            if len(speech):
+                full_recognizer.AcceptWaveform(speech.tobytes())
+                if spotted is None:
+                    start = time.perf_counter()
+                    spotted = spotter.feed(speech)
+                    if spotted:
+                        spotted_at = audio_time + time.perf_counter() - start
+            if finished and full_at is None:
+                start = time.perf_counter()
+                full_text = json.loads(full_recognizer.FinalResult()).get("text", "")
+                speech_end = finished[0].end - HANGOVER_MS / 1000
+                full_at = audio_time + time.perf_counter() - start
+                if spotted is None:
+                    start = time.perf_counter()
+                    spotted = spotter.finish()
+                    spotted_at = audio_time + time.perf_counter() - start
+                break
+        if full_at is None:
+            continue
+
+        spotter_latency.append(max(spotted_at - speech_end, 0.0) if spotted else full_at - speech_end)
+        full_latency.append(full_at - speech_end)
+        spotter_correct += int(spotted == expected)
+        full_correct += int(expected is not None and expected in full_text)
+
+    return {
+        "files": files,
+        "spotter": dict(summarize(spotter_latency), correct=spotter_correct),
+        "full_vosk": dict(summarize(full_latency), correct=full_correct),
+    }
+
+
+def benchmark_gemini(first_token_ms, token_ms, runs=3):
+    """
+    Time to the first speakable chunk of a Gemini answer, streaming versus waiting for the
+    whole response, against the local fake model (no network or TTS needed).
+    """
+    from fake_model import FakeGenerativeModel
+    from gemini_ai import generate_answer_chunks
+    from query_executor import ModelClient, QueryExecutor
+    from speech_processing import chunk_text
+
+    model = FakeGenerativeModel(first_token_delay=first_token_ms / 1000, token_delay=token_ms / 1000)
+    executor = QueryExecutor(ModelClient(model), max_attempts=1)
+    streaming, blocking = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        chunks = generate_answer_chunks(executor.stream(["how do i cross a street safely"]))
+        next(chunks)
+        streaming.append(time.perf_counter() - start)
+        chunks.close()
+
+        start = time.perf_counter()
+        response = model.generate_content(["how do i cross a street safely"])
+        chunk_text(response.candidates[0].content.text)[0]
+        blocking.append(time.perf_counter() - start)
+    executor.stop()
+    return {
+        "first_token_ms": first_token_ms,
+        "token_ms": token_ms,
+        "streaming_first_chunk": summarize(streaming),
+        "blocking_first_chunk": summarize(blocking),
+    }
+
+
+def benchmark_hedging(endpoint, queries, concurrency=4):
+    """
+    Time to the first text and to the whole answer over HTTP, without and with hedged requests.
+    Meant for the stand-in server of fake_model.py started with --slow-rate, e.g.
+    "python fake_model.py --slow-rate 0.1 --slow-delay 6", so a share of the requests is slow.
+    """
+    from query_executor import HttpModelClient, QueryExecutor
+
+    results = {"endpoint": endpoint, "queries": queries}
+    for name, max_attempts in (("single", 1), ("hedged", 2)):
+        executor = QueryExecutor(HttpModelClient(endpoint), max_concurrency=concurrency, max_attempts=max_attempts)
+        first_text, total = [], []
+        for _ in range(queries):
+            answer = executor.stream(["how do i cross a street safely"])
+            answer.text()
+            first_text.append(answer.first_text_at - answer.submitted_at)
+            total.append(time.monotonic() - answer.submitted_at)
+        stats = executor.stats()
+        executor.stop()
+        results[name] = {
+            "first_text": summarize(first_text),
+            "total": summarize(total),
+            "hedges": stats["hedges"],
+            "hedge_wins": stats["hedge_wins"],
+            "connections_opened": stats["client"]["connections_opened"],
+        }
+    return results
+
+
+def print_report(results):
+    detection = results.get("detection")
+    if detection:
+        preprocessor = detection["preprocessor"]
+        print(f"Detection: {detection['frames']} frames, {detection['fps']} fps, input {preprocessor['input_size']}"
+              f"{' letterboxed' if preprocessor['letterbox'] else ''}, {preprocessor['allocations']} blob allocation(s)")
+        for stage, summary in list(detection["stages"].items()) + [("total", detection["total"])]:
+            if summary["count"]:
+                print(f"  {stage:<12} p50 {summary['p50_ms']:8.3f} ms  p95 {summary['p95_ms']:8.3f} ms  p99 {summary['p99_ms']:8.3f} ms")
+    text = results.get("text")
+    if text:
+        print(f"Text paths: {text['transcripts']} transcripts")
+        for name, summary in text.items():
+            if isinstance(summary, dict):
+                print(f"  {name:<22} p50 {summary['p50_ms']:8.4f} ms  p99 {summary['p99_ms']:8.4f} ms")
+    gemini = results.get("gemini")
+    if gemini:
+        print("Gemini time to first speakable chunk (fake model):")
+        for name in ("streaming_first_chunk", "blocking_first_chunk"):
+            print(f"  {name:<22} p50 {gemini[name]['p50_ms']:8.1f} ms")
+    hedging = results.get("hedging")
+    if hedging:
+        print(f"Gemini endpoint latency over {hedging['queries']} queries to {hedging['endpoint']}:")
+        for name in ("single", "hedged"):
+            entry = hedging[name]
+            print(f"  {name:<8} first text p50 {entry['first_text']['p50_ms']:8.1f} ms  p99 {entry['first_text']['p99_ms']:8.1f} ms"
+                  f"  total p99 {entry['total']['p99_ms']:8.1f} ms  hedges {entry['hedges']} (won {entry['hedge_wins']})"
+                  f"  connections {entry['connections_opened']}")
+    preprocess = results.get("preprocess")
+    if preprocess:
+        print(f"Preprocessing on {preprocess['frames']} frames:")
+        for name, summary in preprocess.items():
+            if isinstance(summary, dict):
+                print(f"  {name:<28} p50 {summary['p50_ms']:7.3f} ms  allocated {summary['bytes_allocated_per_frame']:>9} B/frame")
+    workers = results.get("workers")
+    if workers:
+        print(f"Worker pool scaling on {workers['frames']} frames:")
+        for name, entry in workers.items():
+            if isinstance(entry, dict):
+                extra = f"  speedup {entry['speedup']:.2f}x  per worker {entry['per_worker']}" if "speedup" in entry else ""
+                print(f"  {name:<12} {entry['fps']:8.2f} fps  latency p50 {entry['latency']['p50_ms']:8.2f} ms{extra}")
+    multi = results.get("cameras")
+    if multi:
+        print(f"Multi-camera throughput (frames/s over all cameras, {multi['frames']} frames per source):")
+        for name, entry in multi.items():
+            if isinstance(entry, dict):
+                print(f"  {name:<10} sequential {entry['sequential_fps']:8.2f}  batched {entry['batched_fps']:8.2f}  speedup {entry['speedup']:.2f}x")
+    parity = results.get("parity")
+    if parity:
+        print(f"Backend parity on {parity['frames']} frames against {parity['reference']}:")
+        for name, summary in parity["forward"].items():
+            entry = parity.get(name)
+            line = f"  {name:<10} forward p50 {summary.get('p50_ms', 0.0):8.2f} ms"
+            if entry:
+                verdict = "equivalent" if entry["equivalent"] else "DIFFERENT: " + "; ".join(entry["failures"])
+                line += f"  recall {entry['recall']:.3f}  precision {entry['precision']:.3f}  mean IoU {entry['mean_iou'] or 0.0:.3f}  {verdict}"
+            print(line)
+    commands = results.get("commands")
+    if commands:
+        print(f"Command latency after end of speech: {commands['files']} recordings")
+        for name in ("spotter", "full_vosk"):
+            summary = commands[name]
+            if summary["count"]:
+                print(f"  {name:<10} p50 {summary['p50_ms']:8.1f} ms  p95 {summary['p95_ms']:8.1f} ms  correct {summary['correct']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection and speech hot paths")
+    parser.add_argument("--source", help="Directory of images or a video file to replay")
+    parser.add_argument("--limit", type=int, help="Maximum number of frames to replay")
+    parser.add_argument("--transcripts", help="Text file with one recorded transcript per line")
+    parser.add_argument("--commands", help="Directory of WAV command recordings named after the phrase (e.g. stop_query_01.wav)")
+    parser.add_argument("--gemini", action="store_true", help="Compare streamed and blocking Gemini answers on the fake model")
+    parser.add_argument("--fake-first-token-ms", type=float, default=800.0)
+    parser.add_argument("--fake-token-ms", type=float, default=30.0)
+    parser.add_argument("--gemini-endpoint", help="Compare single and hedged requests to this HTTP endpoint (see fake_model.py)")
+    parser.add_argument("--gemini-queries", type=int, default=20, help="Queries per run for --gemini-endpoint")
+    parser.add_argument("--skip-text", action="store_true", help="Only benchmark detection")
+    parser.add_argument("--stub-net", action="store_true", help="Use a synthetic network instead of yolov4-tiny.weights")
+    parser.add_argument("--stub-forward-ms", type=float, default=0.0, help="Simulated forward pass time for --stub-net")
+    parser.add_argument("--backend", help="Detector backend to benchmark instead of config.DETECTOR_BACKEND")
+    parser.add_argument("--parity", help="Comma-separated backends to compare on --source, the first is the reference")
+    parser.add_argument("--parity-min-recall", type=float, default=PARITY_MIN_AGREEMENT)
+    parser.add_argument("--parity-min-precision", type=float, default=PARITY_MIN_AGREEMENT)
+    parser.add_argument("--parity-min-iou", type=float, default=PARITY_MIN_IOU, help="Minimum mean IoU of matched boxes")
+    parser.add_argument("--input-size", type=int, help="Network input size, e.g. 320, 416 or 608")
+    parser.add_argument("--letterbox", action="store_true", help="Letterbox frames instead of stretching them")
+    parser.add_argument("--preprocess", action="store_true", help="Compare preprocessing time and allocations on --source")
+    parser.add_argument("--cameras", type=int, help="Compare batched and sequential inference for 1..N sources replaying --source")
+    parser.add_argument("--workers", help="Comma-separated worker process counts to benchmark on --source, e.g. 1,2,4")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.stub_net:
+        object_recognition.set_network(StubNet(forward_ms=args.stub_forward_ms))
+    elif args.backend:
+        backend = create_backend(args.backend)
+        backend.load()
+        object_recognition.set_backend(backend)
+    if args.input_size:
+        object_recognition.set_input_size(args.input_size)
+    if args.letterbox:
+        object_recognition.preprocessor.set_letterbox(True)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "backend": "stub" if args.stub_net else (args.backend or config.DETECTOR_BACKEND),
+    }
+    if args.source and args.preprocess:
+        results["preprocess"] = benchmark_preprocess(args.source, args.limit)
+    elif args.source and args.workers:
+        factory = functools.partial(stub_backend, args.stub_forward_ms) if args.stub_net else None
+        results["workers"] = benchmark_workers(args.source, [int(count) for count in args.workers.split(",")], args.limit, factory)
+    elif args.source and args.cameras:
+        results["cameras"] = benchmark_cameras(args.source, args.cameras, args.limit)
+    elif args.source and args.parity:
+        results["parity"] = benchmark_parity(
+            args.source, args.parity.split(","), args.limit,
+            args.parity_min_recall, args.parity_min_precision, args.parity_min_iou
+        )
+    elif args.source:
+        results["detection"] = benchmark_detection(args.source, args.limit)
+    if not args.skip_text:
+        results["text"] = benchmark_text(load_transcripts(args.transcripts))
+    if args.gemini:
+        results["gemini"] = benchmark_gemini(args.fake_first_token_ms, args.fake_token_ms)
+    if args.gemini_endpoint:
+        results["hedging"] = benchmark_hedging(args.gemini_endpoint, args.gemini_queries)
+    if args.commands:
+        results["commands"] = benchmark_commands(args.commands)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    # The parity run doubles as a gate for backend changes (e.g. in CI)
+    parity = results.get("parity")
+    if parity and not all(parity[name]["equivalent"] for name in parity["forward"] if name != parity["reference"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
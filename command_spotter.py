@@ -0,0 +1,83 @@
+# command_spotter.py
+"""
+Offline spotter for the fixed voice command set.
+
+A KaldiRecognizer restricted to a grammar of the known command phrases
+decodes far faster than the full vocabulary. Anything outside the grammar
+comes back as "[unk]", which tells the caller to fall back to the full
+recognizer for open-ended queries.
+
+Because the grammar forces ordinary speech onto the command words, a
+command normally fires only once its whole phrase has been heard. Harmless
+commands passed as `early` may also fire on PartialResult() as soon as the
+words heard can only be that command, unless those words are in `ordinary`
+(a common start of everyday speech) or unknown words were heard as well.
+"""
+import json
+from vosk import KaldiRecognizer
+
+UNKNOWN = "[unk]"
+
+
+class CommandSpotter:
+    def __init__(self, model, phrases, sample_rate=16000, early=(), ordinary=()):
+        """
+        Args:
+            model: Loaded Vosk model
+            phrases (list): Command phrases the grammar is restricted to
+            sample_rate (int): Sample rate of the audio fed in
+            early (iterable): Phrases that may fire on an unambiguous prefix; all others need the whole phrase
+            ordinary (iterable): Word sequences that also start everyday speech and so never fire early
+        """
+        self.phrases = [phrase.lower() for phrase in phrases]
+        self._phrase_words = [phrase.split() for phrase in self.phrases]
+        self.early = {phrase.lower() for phrase in early}
+        self.ordinary = {words.lower() for words in ordinary}
+        self.recognizer = KaldiRecognizer(model, sample_rate, json.dumps(self.phrases + [UNKNOWN]))
+        self.recognizer.SetWords(False)
+
+    def reset(self):
+        self.recognizer.Reset()
+
+    def match(self, text):
+        """
+        Return the command the text can only be, or None if there is none or it is still ambiguous.
+        A full phrase anywhere in the text wins. Otherwise an `early` phrase wins if the words
+        heard are a prefix of it and of no other phrase, and no unknown word was heard.
+        """
+        tokens = text.split()
+        # Unknown words stay in place, so "shut down [unk] assistant" is not a full phrase
+        padded = f" {' '.join(tokens)} "
+        for phrase in self.phrases:
+            if f" {phrase} " in padded:
+                return phrase
+        if UNKNOWN in tokens or len(tokens) < 2 or " ".join(tokens) in self.ordinary:
+            return None
+        candidates = [
+            phrase for phrase, phrase_words in zip(self.phrases, self._phrase_words)
+            if len(tokens) < len(phrase_words) and phrase_words[:len(tokens)] == tokens
+        ]
+        if len(candidates) == 1 and candidates[0] in self.early:
+            return candidates[0]
+        return None
+
+    def feed(self, audio):
+        """
+        Stream audio (int16 bytes or NumPy array) into the recognizer.
+        Returns a command as soon as one is unambiguous, otherwise None.
+        """
+        if not isinstance(audio, bytes):
+            audio = audio.tobytes()
+        if self.recognizer.AcceptWaveform(audio):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+        else:
+            text = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        command = self.match(text)
+        if command:
+            self.reset()
+        return command
+
+    def finish(self):
+        """End of utterance: return the command if the final result is one, else None."""
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return self.match(text)
@@ -1,4 +1,5 @@
 # config.py
+import threading
 
 current_mode = "on_demand"  # Default mode
 recognition_enabled = True  # Default recognition state
@@ -23,7 +24,85 @@ def toggle_gemini(enabled):
     gemini_enabled = enabled
     print(f"Gemini AI {'enabled' if enabled else 'disabled'}")
 
+shutdown_event = threading.Event()  # Set by a signal or the shutdown voice command
+
+def request_shutdown():
+    """Ask the application to stop (replaces the 'q' key on devices without a display)"""
+    shutdown_event.set()
+    print("Shutdown requested")
+
 
     # Project ID and Region for Vertex AI
 PROJECT_ID = "concise-dolphin-441609-p9"
 REGION = "us-central1"
+
+
+# Gemini answers
+GEMINI_STREAMING = True     # Speak each sentence as soon as it has been generated
+GEMINI_FAKE_MODEL = False   # Use the local stand-in from fake_model.py instead of Vertex AI
+GEMINI_ENDPOINT = None      # e.g. "http://127.0.0.1:8765/generate" for the HTTP stand-in (python fake_model.py)
+
+# Gemini query execution (see query_executor.py)
+GEMINI_DEADLINE = 30.0           # Seconds a whole answer may take
+GEMINI_HEDGE_AFTER = 4.0         # Seconds without a first word before a second, identical request is sent
+GEMINI_MAX_ATTEMPTS = 2          # Requests per query, counting hedged and retried ones
+GEMINI_MAX_CONCURRENCY = 4       # Requests in flight at once
+GEMINI_POOL_SIZE = 4             # Idle keep-alive connections kept to GEMINI_ENDPOINT
+GEMINI_THINKING_CUE_AFTER = 2.5  # Seconds without an answer before "Still thinking" is spoken
+
+# Gemini response cache (see response_cache.py)
+GEMINI_CACHE_ENABLED = True
+GEMINI_CACHE_PATH = "cache/gemini_responses.sqlite3"
+GEMINI_CACHE_MAX_ENTRIES = 500
+GEMINI_CACHE_MAX_BYTES = 2_000_000
+GEMINI_CACHE_TTL = 7 * 24 * 3600  # Seconds
+
+# Speech output (see speech_output.py and phrase_cache.py)
+TTS_PCM_PLAYBACK = True      # Render speech to PCM and play it, synthesizing the next chunk meanwhile
+PHRASE_CACHE_ENABLED = True  # Reuse rendered audio of confirmations, object answers and announcements
+PHRASE_CACHE_PATH = "cache/phrase_audio.sqlite3"
+PHRASE_CACHE_MAX_BYTES = 20_000_000    # PCM kept on disk
+PHRASE_CACHE_MEMORY_BYTES = 5_000_000  # PCM kept in memory
+
+# Words that stop a spoken answer (spotted offline with Vosk)
+INTERRUPT_KEYWORDS = ["stop response", "cancel", "shut up", "stop"]
+
+# Adaptive inference scheduling (see scheduler.py)
+INFERENCE_MIN_RATE = 1.0     # Inferences per second even on a static scene
+INFERENCE_MAX_RATE = 15.0    # Upper bound on inferences per second
+INFERENCE_CPU_BUDGET = 0.5   # Max share of wall time spent in inference
+MOTION_THRESHOLD = 0.02      # Mean thumbnail difference (0-1) that counts as motion
+
+# Continuous-mode announcements (see announcer.py)
+ANNOUNCE_MIN_INTERVAL = 5.0  # Seconds between two announcements
+ANNOUNCE_DEBOUNCE = 1.0      # Seconds an object must be there, gone or in a new zone before it is announced
+ANNOUNCE_MAX_AGE = 3.0       # Seconds an announcement may wait to be spoken before it is dropped as stale
+
+# Object detection runtime (see backends.py): "opencv", "onnx" or "onnx-int8"
+DETECTOR_BACKEND = "opencv"
+DETECTOR_THREADS = {"opencv": 0, "onnx": 0, "onnx-int8": 0}  # Per backend, 0 = library default
+OPENCV_TARGET = "cpu"        # "opencl" only helps with a real OpenCL device
+ONNX_MODEL_PATH = "yolov4-tiny.onnx"
+ONNX_INT8_MODEL_PATH = "yolov4-tiny.int8.onnx"
+ONNX_PROVIDERS = ["CPUExecutionProvider"]  # e.g. ["OpenVINOExecutionProvider"] with onnxruntime-openvino
+DETECTOR_INPUT_SIZE = 416    # 320 is faster, 608 finds smaller objects; see preprocess.INPUT_SIZES
+DETECTOR_LETTERBOX = False   # Pad to keep the aspect ratio instead of stretching the frame
+
+# Capture sources: name -> camera index or video file path (files replay at their own frame rate)
+# e.g. {"front": 0, "down": 1}; with several cameras announcements name the camera
+CAMERA_SOURCES = {"front": 0}
+
+# Multi-process detection (see worker_pool.py); 0 runs detection in the main process
+DETECTOR_WORKERS = 0
+DETECTOR_WORKER_THREADS = 1           # Runtime threads per worker process
+WORKER_MAX_FRAME_SIZE = (1920, 1080)  # Largest frame a shared-memory slot holds
+
+# Latency instrumentation (see metrics.py)
+METRICS_ENABLED = False
+METRICS_HISTORY = 1024        # Most recent samples kept per stage
+METRICS_PORT = 9464           # Served on 127.0.0.1 only
+METRICS_LOG_INTERVAL = 60     # Seconds between latency summaries in the log
+
+# Run without a display: nothing is drawn unless the debug stream has a viewer
+HEADLESS = False
+DEBUG_STREAM_PORT = None  # e.g. 8081 to serve annotated MJPEG video on 127.0.0.1
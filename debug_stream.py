@@ -0,0 +1,92 @@
+# debug_stream.py
+"""
+Optional MJPEG debug stream for headless devices.
+
+Serves the annotated video at http://127.0.0.1:<port>/ so a developer can
+watch what the detector sees without a display attached. Frames are only
+rendered and JPEG-encoded while at least one client is connected; with no
+viewer the stream costs nothing.
+"""
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = "frame"
+JPEG_QUALITY = 70
+
+
+class DebugStream:
+    def __init__(self, port, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self.clients = 0
+        self._condition = threading.Condition()
+        self._jpeg = None
+        self._sequence = 0
+        self._server = None
+
+    def has_clients(self):
+        return self.clients > 0
+
+    def publish(self, frame):
+        """Encode a rendered frame and hand it to every connected client."""
+        ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+        if not ok:
+            return
+        with self._condition:
+            self._jpeg = encoded.tobytes()
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def _next_jpeg(self, last_sequence, timeout=1.0):
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence != last_sequence, timeout)
+            return self._sequence, self._jpeg
+
+    def start(self):
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+                self.end_headers()
+                with stream._condition:
+                    stream.clients += 1
+                sequence = None
+                try:
+                    while True:
+                        new_sequence, jpeg = stream._next_jpeg(sequence)
+                        if jpeg is None or new_sequence == sequence:
+                            continue
+                        sequence = new_sequence
+                        self.wfile.write(
+                            f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                        )
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stream._condition:
+                        stream.clients -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="debug-stream", daemon=True).start()
+        logger.info(f"Debug stream at http://{self.host}:{self._server.server_address[1]}/")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
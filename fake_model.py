@@ -0,0 +1,179 @@
+# fake_model.py
+"""
+Local stand-in for the Vertex AI GenerativeModel.
+
+Returns a canned answer with configurable delays, either all at once or
+streamed token by token, so the Gemini path can be tested and benchmarked
+without network access or Google Cloud credentials.
+
+Run as a script it serves the same answers over HTTP, for the executor's
+HttpModelClient (config.GEMINI_ENDPOINT):
+
+    python fake_model.py --port 8765 --slow-rate 0.1 --slow-delay 6
+
+A share of the requests (--slow-rate) waits --slow-delay seconds for its
+first token, like a slow backend replica, so deadlines and hedging can be
+measured locally.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = (
+    "To cross a street safely, find a marked crossing or a corner with traffic lights. "
+    "Stop at the curb and listen for traffic in both directions. "
+    "If there is an accessible signal, wait for the walk tone before you step off. "
+    "Keep listening while you cross and walk straight to the opposite curb. "
+    "If you are unsure, it is fine to ask someone nearby for help."
+)
+
+
+class _Content:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Candidate:
+    def __init__(self, text):
+        self.content = _Content(text)
+
+
+class FakeResponse:
+    """Mimics the parts of a Vertex AI response the app reads."""
+
+    def __init__(self, text):
+        self.text = text
+        self.candidates = [_Candidate(text)]
+
+
+class FakeGenerativeModel:
+    def __init__(self, answer=DEFAULT_ANSWER, first_token_delay=0.8, token_delay=0.03, tokens_per_chunk=4):
+        """
+        Args:
+            answer (str): Text every query is answered with
+            first_token_delay (float): Seconds before the first token (request + prefill)
+            token_delay (float): Seconds per generated token (one word counts as one token)
+            tokens_per_chunk (int): Tokens per streamed response chunk
+        """
+        self.answer = answer
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens_per_chunk = tokens_per_chunk
+        self.calls = 0
+
+    def _tokens(self):
+        words = self.answer.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def generate_content(self, contents, stream=False):
+        self.calls += 1
+        if stream:
+            return self._stream()
+        tokens = self._tokens()
+        time.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        return FakeResponse(self.answer)
+
+    def _stream(self, first_token_delay=None):
+        tokens = self._tokens()
+        time.sleep(self.first_token_delay if first_token_delay is None else first_token_delay)
+        for start in range(0, len(tokens), self.tokens_per_chunk):
+            piece = tokens[start:start + self.tokens_per_chunk]
+            time.sleep(self.token_delay * len(piece))
+            yield FakeResponse("".join(piece))
+
+
+class _FakeModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real endpoint
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))  # The query does not change the answer
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for response in self.server.model._stream(self.server.first_token_delay()):
+                self._write_chunk(json.dumps({"text": response.text}).encode() + b"\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled: stop generating
+            self.server.cancelled += 1
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    """HTTP stand-in for the Gemini endpoint, streaming FakeGenerativeModel answers as newline-delimited JSON."""
+    daemon_threads = True
+
+    def __init__(self, address, model=None, slow_rate=0.0, slow_delay=5.0, seed=None):
+        """
+        Args:
+            address (tuple): (host, port) to listen on, port 0 for any free port
+            model (FakeGenerativeModel): Answer and timing of normal requests
+            slow_rate (float): Share of requests whose first token takes slow_delay seconds instead
+            slow_delay (float): First-token delay of a slow request
+            seed (int): Seed for picking the slow requests, for repeatable runs
+        """
+        super().__init__(address, _FakeModelHandler)
+        self.model = model or FakeGenerativeModel()
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.slow = 0
+        self.cancelled = 0
+
+    def first_token_delay(self):
+        with self.lock:
+            self.requests += 1
+            if self.random.random() < self.slow_rate:
+                self.slow += 1
+                return self.slow_delay
+        return self.model.first_token_delay
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/generate"
+
+    def start(self):
+        """Serve on a background thread (for tests and benchmarks)."""
+        threading.Thread(target=self.serve_forever, name="fake-model-server", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP stand-in for the Gemini endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.8, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="Seconds per generated token")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests that are slow")
+    parser.add_argument("--slow-delay", type=float, default=5.0, help="First-token delay of a slow request")
+    parser.add_argument("--seed", type=int, help="Seed for picking the slow requests")
+    args = parser.parse_args()
+
+    model = FakeGenerativeModel(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+    server = FakeModelServer((args.host, args.port), model, args.slow_rate, args.slow_delay, args.seed)
+    print(f"Fake model serving on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,186 @@
 # gemini_ai.py
-import vertexai
-from vertexai.preview.generative_models import GenerativeModel
 import config
-from speech_processing import speak_with_interruption
-
-vertexai.init(project=config.PROJECT_ID, location=config.REGION)
-generative_model = GenerativeModel("gemini-1.5-pro-002")
+from speech_processing import InterruptListener, speak_with_interruption, speak_stream_with_interruption, stream_chunks
+from speech_output import speech_service, PRIORITY_COMMAND, PRIORITY_QUERY
+from fake_model import FakeGenerativeModel
+from response_cache import ResponseCache
+from query_executor import HttpModelClient, ModelClient, QueryCancelled, QueryExecutor, QueryTimeout
+import threading
+import time
+from metrics import metrics
 
 # Define wake words as a constant for easy maintenance
 WAKE_WORDS = ["gemini", "gemini wake up"]
 
-def query_gemini(user_query):
+THINKING_CUE = "Still thinking"
+TIMEOUT_MESSAGE = "Sorry, the answer is taking too long."
+
+# Created by init_gemini(), in the background at startup or on the first query
+generative_model = None
+query_executor = None
+response_cache = None
+init_lock = threading.Lock()
+
+def init_gemini():
+    """Set up the Gemini client, the query executor and the response cache, unless already done."""
+    global generative_model, query_executor, response_cache
+    with init_lock:
+        if query_executor is not None:
+            return
+        if config.GEMINI_CACHE_ENABLED and response_cache is None:
+            response_cache = ResponseCache(
+                config.GEMINI_CACHE_PATH,
+                max_entries=config.GEMINI_CACHE_MAX_ENTRIES,
+                max_bytes=config.GEMINI_CACHE_MAX_BYTES,
+                ttl=config.GEMINI_CACHE_TTL,
+                wake_words=WAKE_WORDS
+            )
+        if config.GEMINI_ENDPOINT:
+            client = HttpModelClient(config.GEMINI_ENDPOINT, config.GEMINI_POOL_SIZE)
+        else:
+            if config.GEMINI_FAKE_MODEL:
+                generative_model = FakeGenerativeModel()
+            else:
+                # Imported here: the Vertex AI SDK alone takes seconds to import
+                import vertexai
+                from vertexai.preview.generative_models import GenerativeModel
+                vertexai.init(project=config.PROJECT_ID, location=config.REGION)
+                generative_model = GenerativeModel("gemini-1.5-pro-002")
+            client = ModelClient(generative_model)
+        query_executor = QueryExecutor(client)
+        query_executor.start()
+
+def gemini_stats():
+    """Query executor and response cache statistics, or None if Gemini was never set up."""
+    if query_executor is None and response_cache is None:
+        return None
+    stats = query_executor.stats() if query_executor is not None else {}
+    if response_cache is not None:
+        stats["cache"] = response_cache.stats()
+    return stats
+
+def extract_query(user_query):
     """
-    Process queries with wake word detection.
-    Only responds if the query contains a wake word.
-    Args:
-        user_query (str): The voice input from user
-    Returns:
-        bool: True if query was processed, False if no wake word
+    Strip wake words from the voice input.
+    Returns None if the input contains no wake word.
     """
     lower_query = user_query.lower()
     
     # Check for wake word
     if not any(word in lower_query for word in WAKE_WORDS):
-        return False
+        return None
         
     # Clean query by removing wake words
     clean_query = lower_query
     for word in WAKE_WORDS:
         clean_query = clean_query.replace(word, "").strip()
+    return clean_query
+
+def generate_answer_chunks(answer, on_complete=None):
+    """
+    Yield sentence-sized chunks of a submitted query's answer as soon as each is complete.
+    Closing the generator cancels the query, which stops the rest of the generation.
+    on_complete(text) is called with the full answer only if it was streamed to the end.
+    Args:
+        answer (AnswerStream): From query_executor.stream()
+    """
+    chunks = []
+    try:
+        for chunk in stream_chunks(answer):
+            if not chunks:
+                metrics.record("gemini_first_chunk", time.monotonic() - answer.submitted_at)
+            chunks.append(chunk)
+            yield chunk
+        metrics.record("gemini_total", time.monotonic() - answer.submitted_at)
+        if on_complete and chunks:
+            on_complete(" ".join(chunks))
+    except QueryCancelled:
+        return
+    except QueryTimeout as e:
+        print(f"Gemini query timed out: {e}")
+        yield TIMEOUT_MESSAGE
+    finally:
+        answer.cancel()  # Does nothing if the answer is complete
+
+def start_thinking_cue(answer):
+    """Say THINKING_CUE if the answer has not started after config.GEMINI_THINKING_CUE_AFTER seconds."""
+    def cue():
+        if not answer.first_text.is_set() and not answer.cancelled:
+            speech_service.speak(THINKING_CUE, priority=PRIORITY_QUERY, category="thinking", cached=True)
+
+    timer = threading.Timer(config.GEMINI_THINKING_CUE_AFTER, cue)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+def query_gemini(user_query):
+    """
+    Process queries with wake word detection.
+    Only responds if the query contains a wake word.
+    Args:
+        user_query (str): The voice input from user
+    Returns:
+        bool: True if query was processed, False if no wake word
+    """
+    clean_query = extract_query(user_query)
+    if clean_query is None:
+        return False
     
 # Only process if there's a query after removing wake word
     if clean_query:
-        response = generative_model.generate_content([clean_query])
-        if response:
-            response_text = response.candidates[0].content.text.strip()
+        try:
+            init_gemini()  # Waits if startup is still initializing it
+        except Exception as e:
+            print(f"Gemini AI is not available: {e}")
+            return False
+
+        # Keyed on the raw query; the cache strips wake words and punctuation itself
+        cache = response_cache if config.GEMINI_CACHE_ENABLED else None
+        if cache:
+            cached = cache.get(user_query)
+            if cached:
+                speak_with_interruption(cached)
+                return True
+        start = time.monotonic()
+
+        def store(text):
+            if cache:
+                cache.put(user_query, text, time.monotonic() - start)
+
+        # Runs on the executor's event loop; "stop" cancels it even before the answer has started
+        answer = query_executor.stream([clean_query])
+        thinking_cue = start_thinking_cue(answer)
+        try:
+            if config.GEMINI_STREAMING:
+                # Start speaking the first sentence while the rest is still being generated
+                if speak_stream_with_interruption(generate_answer_chunks(answer, on_complete=store), on_interrupt=answer.cancel):
+                    return True
+                if answer.cancelled:
+                    return True
+                print("No response received from Gemini.")
+                return False
+
+            listener = InterruptListener(on_interrupt=answer.cancel).start()
+            try:
+                with metrics.timer("gemini_total"):
+                    response_text = answer.text().strip()
+            except QueryCancelled:
+                speech_service.speak("okk i will stop", priority=PRIORITY_COMMAND, cached=True).wait()
+                return True
+            except QueryTimeout as e:
+                print(f"Gemini query timed out: {e}")
+                speech_service.speak(TIMEOUT_MESSAGE, priority=PRIORITY_QUERY).wait()
+                return True
+            except Exception as e:
+                print(f"Gemini query failed: {e}")
+                return False
+            finally:
+                listener.stop()
+        finally:
+            thinking_cue.cancel()
+
+        if response_text:
+            store(response_text)
             speak_with_interruption(response_text)
             return True
         else:
@@ -1,107 +1,151 @@
 import cv2
-from object_recognition import detect_objects, categorize_objects, announce_objects, handle_object_query
-from speech_processing import get_voice_input, process_voice_command, start_listening_thread
+from object_recognition import announcement_phrases, handle_object_query, render_overlay
+from speech_processing import command_phrases, get_voice_input, interrupt_stats, process_voice_command
 from gemini_ai import query_gemini
 import config  # Import global mode state and switch function
 import time
+import threading
+import signal
+from pipeline import Pipeline, open_sources
+from speech_output import speech_service
+from startup import startup
+from object_recognition import warm_up_network
+from speech_processing import load_vosk_model
+from audio_stream import shared_stream
+from gemini_ai import THINKING_CUE, gemini_stats, init_gemini
+from worker_pool import DetectionWorkerPool
+from metrics import metrics
+from debug_stream import DebugStream
+from announcer import ContinuousAnnouncer
+
+
+def voice_interaction_loop(pipeline):
+    """
+    Handles both continuous and on-demand modes for voice interactions.
+    Runs on its own thread so blocking voice input never freezes the camera.
+    """
+    while not pipeline.stop_event.is_set():
+        if pipeline.frame_width is None:
+            # Wait for the first frame before answering object queries
+            time.sleep(0.1)
+            continue
+
+        if config.current_mode == "continuous":
+            # The announcer speaks scene changes on its own thread; here we only listen for commands
+            command = get_voice_input()
+            if command:
+                process_voice_command(command)
+
+        else:  # On-Demand Mode
+            # Don't record our own voice: let queued speech finish before listening
+            speech_service.wait_idle()
+
+            # Get voice input from user
+            user_query = get_voice_input()
+            if user_query:
+                # Check for mode switching commands
+                process_voice_command(user_query)
+
+                if config.current_mode == "on_demand" and config.recognition_enabled:
+                    # Only process object queries if recognition is enabled
+                    if not handle_object_query(user_query):
+                        # If not an object query and Gemini is enabled, try Gemini
+                        if config.gemini_enabled:
+                            query_gemini(user_query)
+
+
+                elif config.current_mode == "on_demand" and not config.recognition_enabled:
+                    # Try Gemini if object recognition is disabled and Gemini is enabled
+                    if config.gemini_enabled:
+                        query_gemini(user_query)
 
 
 def main():
     """
-    Main function running the video capture and processing loop.
-    Handles both continuous and on-demand modes for object recognitions
-    and voice interactions.
+    Main function running the video capture and processing pipeline.
+    Capture and object recognition run on background threads, voice
+    interaction on another, and this thread only displays frames
+    (or, headless, waits for a shutdown signal or voice command).
     """
-    # Initialize video capture
-    cap = cv2.VideoCapture(0) 
-    if not cap.isOpened():
+    # Initialize video capture first so video flows while the models load
+    camera_start = time.monotonic()
+    sources = open_sources(config.CAMERA_SOURCES)
+    if not sources:
         print("Error: Could not open video capture device")
         return
+    startup.record("camera", time.monotonic() - camera_start)
 
-    try:
-        while True:
-            # Capture frame
-            ret, frame = cap.read()
-            if not ret:
-                print("Error: Could not read frame.")
-                break
+    if config.METRICS_ENABLED:
+        metrics.start_server()
+        metrics.start_log_summary()
 
-            # Only perform object detection if recognition is enabled
-            width = frame.shape[1]  # Default width if detection is disabled
-            if config.recognition_enabled:
-                result = detect_objects(frame)
-                if result is not None:
-                    width = result
-
-            else:
-                # Add visual feedback when recognition is disabled
-                cv2.putText(
-                    frame,
-                    "Object Recognition Disabled",
-                    (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    (0, 0, 255),  # Red color
-                    2
-                )
-
-            # Add Gemini disabled visual feedback
-            if not config.gemini_enabled:
-                cv2.putText(
-                    frame,
-                    "Gemini AI Disabled",
-                    (10, 60),  # Positioned below object recognition text
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    1,
-                    (255, 0, 0),  # Blue color
-                    2
-                )
-
-            if config.current_mode == "continuous":
-                # Start background listener for mode switching
-                start_listening_thread()
-                
-                # Continuous object detection and announcement
-                while config.current_mode == "continuous":
-                    if config.recognition_enabled:
-                        left, middle, right = categorize_objects(width)
-                        announce_objects(left, middle, right)
-
-                    else:
-                        # Small delay to prevent CPU overload when disabled
-                        time.sleep(0.1)
-
-            else:  # On-Demand Mode
-                # Get voice input from user
-                user_query = get_voice_input()
-                if user_query:
-                    # Check for mode switching commands
-                    process_voice_command(user_query)
-                    
-                    if config.current_mode == "on_demand" and config.recognition_enabled:
-                        # Only process object queries if recognition is enabled
-                        if not handle_object_query(user_query, width):
-                            # If not an object query and Gemini is enabled, try Gemini
-                            if config.gemini_enabled:
-                                query_gemini(user_query)
-                            
-
-                    elif config.current_mode == "on_demand" and not config.recognition_enabled:
-                        # Try Gemini if object recognition is disabled and Gemini is enabled
-                        if config.gemini_enabled:
-                            query_gemini(user_query)
-                        
-            
+    # Ctrl+C or a service manager's SIGTERM shut down cleanly, as does the voice command
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: config.request_shutdown())
+    debug_stream = DebugStream(config.DEBUG_STREAM_PORT) if config.DEBUG_STREAM_PORT else None
+    if debug_stream:
+        debug_stream.start()
+
+    # Load the heavy resources concurrently in the background
+    worker_pool = DetectionWorkerPool() if config.DETECTOR_WORKERS else None
+    startup.register("detector", worker_pool.start if worker_pool else warm_up_network)
+    startup.register("vosk", load_vosk_model)
+    startup.register("tts", speech_service.wait_ready)
+    startup.register("microphone", shared_stream.start)
+    startup.register("gemini", init_gemini)
+    startup.start()
+
+    # Frames are shown without detections until the network is warmed up
+    pipeline = Pipeline(sources, detector_ready=lambda: startup.is_ready("detector"), worker_pool=worker_pool)
+    pipeline.start()
+    # Fixed phrases are rendered into the phrase cache whenever the speech thread is idle
+    speech_service.prerender(command_phrases() + [THINKING_CUE] + announcement_phrases())
+    # Continuous mode announces what changed, driven by the trackers
+    announcer = ContinuousAnnouncer()
+    announcer.start()
+    voice_thread = threading.Thread(target=voice_interaction_loop, args=(pipeline,), daemon=True)
+    voice_thread.start()
+
+    try:
+        while not pipeline.stop_event.is_set() and not config.shutdown_event.is_set():
+            if config.HEADLESS and not (debug_stream and debug_stream.has_clients()):
+                # Nothing to render for: detections stay as data in the trackers
+                config.shutdown_event.wait(0.5)
+                continue
 
-            # Display video feed
-            cv2.imshow("Video", frame)
-            if cv2.waitKey(1) & 0xFF == ord("q"):
+            for packet in pipeline.next_display_frames():
+                # Overlays go on a copy; the captured frame is never drawn into
+                frame = render_overlay(packet.frame, packet.detections, packet.camera)
+                if debug_stream and debug_stream.has_clients():
+                    debug_stream.publish(frame)
+                if not config.HEADLESS:
+                    # Display video feed, one window per camera
+                    cv2.imshow("Video" if len(sources) == 1 else f"Video - {packet.camera}", frame)
+            if not config.HEADLESS and cv2.waitKey(1) & 0xFF == ord("q"):
                 break
 
     finally:
-        # Clean up resources
-        cap.release()
-        cv2.destroyAllWindows()
+        # Clean up resources; let a spoken goodbye finish first
+        speech_service.wait_idle(timeout=3)
+        announcer.stop()
+        pipeline.stop()
+        if worker_pool:
+            worker_pool.stop()
+        print(f"Pipeline stats: {pipeline.stats()}")
+        print(f"Speech stats: {speech_service.stats()}")
+        print(f"Announcer stats: {announcer.stats()}")
+        print(f"Interrupt stats: {interrupt_stats()}")
+        stats = gemini_stats()
+        if stats:
+            print(f"Gemini stats: {stats}")
+        if config.METRICS_ENABLED:
+            metrics.log_summary()
+        if debug_stream:
+            debug_stream.stop()
+        for source in sources.values():
+            source.release()
+        if not config.HEADLESS:
+            cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,213 @@
+# metrics.py
+"""
+Lightweight latency instrumentation.
+
+Each stage (capture, preprocess, forward, postprocess, nms, draw, ASR,
+Gemini, TTS) records its duration into a fixed-size ring buffer, so memory
+stays constant and percentiles reflect recent behaviour. When metrics are
+disabled, record() returns after one attribute check and timer() hands out
+a shared no-op context manager.
+
+The end-to-end "question spoken -> answer audible" latency is tracked as
+its own metric: the speech input marks when the user stopped speaking and
+the speech service closes the span when the answer's first audio starts.
+
+Results are served as JSON (/metrics.json) and Prometheus text (/metrics)
+on localhost, and summarized in the log periodically.
+"""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+QUESTION_TO_ANSWER = "question_to_answer"
+QUESTION_MAX_AGE = 60.0  # Seconds after which an unanswered question is forgotten
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """Ring buffer of the most recent durations (seconds) plus lifetime count and sum."""
+
+    def __init__(self, name, capacity=1024):
+        self.name = name
+        self.capacity = capacity
+        self.values = [0.0] * capacity
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.values[self.index] = seconds
+        self.index = (self.index + 1) % self.capacity
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        recent = np.array(self.values[:min(self.count, self.capacity)])
+        if not len(recent):
+            return {"count": 0}
+        quantiles = np.quantile(recent, QUANTILES)
+        return {
+            "count": self.count,
+            "sum_s": round(self.total, 6),
+            "mean_ms": round(float(recent.mean()) * 1000, 3),
+            "p50_ms": round(float(quantiles[0]) * 1000, 3),
+            "p90_ms": round(float(quantiles[1]) * 1000, 3),
+            "p99_ms": round(float(quantiles[2]) * 1000, 3),
+            "max_ms": round(float(recent.max()) * 1000, 3),
+        }
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    def __init__(self, enabled=False, capacity=1024):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.histograms = {}
+        self._lock = threading.Lock()  # Only taken when a histogram is created
+        self._question_at = None
+        self._server = None
+        self._log_thread = None
+
+    def record(self, name, seconds):
+        """Add one duration in seconds to the named histogram."""
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(name, self.capacity))
+        histogram.record(seconds)
+
+    def timer(self, name):
+        """Context manager that records the duration of its block."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def question_heard(self, at=None):
+        """The user finished asking something (time.monotonic(), default now)."""
+        if self.enabled:
+            self._question_at = at or time.monotonic()
+
+    def answer_audible(self, at=None):
+        """The first audio of a reply started; closes the pending question span."""
+        question_at = self._question_at
+        if question_at is None:
+            return
+        self._question_at = None
+        latency = (at or time.monotonic()) - question_at
+        if latency <= QUESTION_MAX_AGE:
+            self.record(QUESTION_TO_ANSWER, latency)
+
+    def snapshot(self):
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def prometheus(self):
+        """All histograms as one Prometheus summary family labelled by stage."""
+        lines = [
+            "# HELP assistant_stage_seconds Latency of each processing stage",
+            "# TYPE assistant_stage_seconds summary",
+        ]
+        for name, histogram in sorted(self.histograms.items()):
+            recent = np.array(histogram.values[:min(histogram.count, histogram.capacity)])
+            if len(recent):
+                for quantile, value in zip(QUANTILES, np.quantile(recent, QUANTILES)):
+                    lines.append(f'assistant_stage_seconds{{stage="{name}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'assistant_stage_seconds_sum{{stage="{name}"}} {histogram.total:.6f}')
+            lines.append(f'assistant_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self):
+        parts = [
+            f"{name} p50 {summary['p50_ms']:.1f} ms p99 {summary['p99_ms']:.1f} ms"
+            for name, summary in self.snapshot().items() if summary["count"]
+        ]
+        if parts:
+            logger.info("Latency: " + "; ".join(parts))
+
+    def start_server(self, port=None, host="127.0.0.1"):
+        """Serve /metrics (Prometheus text) and /metrics.json on localhost."""
+        if self._server is not None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif self.path in ("/", "/metrics.json"):
+                    body, content_type = json.dumps(metrics.snapshot(), indent=2), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        self._server = ThreadingHTTPServer((host, port or config.METRICS_PORT), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Metrics at http://{host}:{self._server.server_address[1]}/metrics")
+
+    def start_log_summary(self, interval=None):
+        """Log a latency summary every `interval` seconds."""
+        if self._log_thread is not None:
+            return
+        interval = interval or config.METRICS_LOG_INTERVAL
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.log_summary()
+
+        self._log_thread = threading.Thread(target=loop, name="metrics-log", daemon=True)
+        self._log_thread.start()
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Shared instance used by every instrumented module
+metrics = Metrics(config.METRICS_ENABLED, config.METRICS_HISTORY)
@@ -1,15 +1,17 @@
 import cv2
 import numpy as np
-import pyttsx3
 import threading
-from threading import Lock
-from collections import deque
-from config import current_mode
+from collections import Counter
+from scheduler import InferenceScheduler
+from tracker import ObjectTracker
+from backends import OpenCVBackend, create_backend, split_batch
+from preprocess import Geometry, Preprocessor
+from metrics import metrics
+import config
+from speech_output import speech_service, PRIORITY_AMBIENT, PRIORITY_QUERY
 import sys
 import os
-
-# Initialize TTS engine
-engine = pyttsx3.init()
+import time
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -19,37 +21,69 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-# Load YOLOv4 model
-net = cv2.dnn.readNet(resource_path("yolov4-tiny.weights"), resource_path("yolov4-tiny.cfg"))
 with open(resource_path("coco.names"), "r") as f:
     classes = [line.strip() for line in f.readlines()]
 
-layer_names = net.getLayerNames()
-output_layers = [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
+# Detection backend, loaded in the background at startup or on first use (or replaced via set_backend)
+detector = None
+network_lock = threading.Lock()
 
-net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+def load_network():
+    """Create and load the configured detector backend, unless one is already loaded."""
+    with network_lock:
+        if detector is not None:
+            return
+        new_detector = create_backend()
+        new_detector.load()
+        set_backend(new_detector)
 
-# Object tracker with thread safety and frame buffer
-class ObjectTracker:
-    def __init__(self, max_frames=5):
-        self.recognized_objects = {}
-        self.lock = Lock()
-        self.frame_buffer = deque(maxlen=max_frames)  # Buffer for recent detections
-    
-    def update_objects(self, new_detections):
-        with self.lock:
-            self.frame_buffer.append(new_detections)
-            # Merge detections from recent frames
-            self.recognized_objects = {}
-            for detections in self.frame_buffer:
-                self.recognized_objects.update(detections)
+def warm_up_network():
+    """Run one inference on a blank frame so the first real frame doesn't pay for lazy setup."""
+    load_network()
+    blank = np.zeros((416, 416, 3), dtype=np.uint8)
+    with preprocessor.lock:
+        blob, _ = preprocessor.prepare(blank, detector.input_size)
+        detector.infer(blob)
+
+def set_backend(new_detector):
+    """Use the given, already loaded backend (see backends.py) for detection."""
+    global detector
+    detector = new_detector
+
+def set_network(new_net):
+    """Use the given network (anything with the cv2.dnn.Net interface) for detection."""
+    set_backend(OpenCVBackend(net=new_net))
 
+# Instance-level tracker fed by every inference
 object_tracker = ObjectTracker()
 
-# Frame skipping and processing parameters
-FRAME_SKIP = 3
-frame_count = 0
+# Decides which frames get a forward pass
+inference_scheduler = InferenceScheduler()
+
+class CameraState:
+    """Tracker and inference scheduler of one capture source."""
+
+    def __init__(self, name, tracker=None, scheduler=None):
+        self.name = name
+        # Not "tracker or ...": an empty ObjectTracker is falsy (it has __len__)
+        self.tracker = tracker if tracker is not None else ObjectTracker()
+        self.scheduler = scheduler if scheduler is not None else InferenceScheduler()
+
+# One entry per capture source; the first configured camera uses the module-level tracker and scheduler
+PRIMARY_CAMERA = next(iter(config.CAMERA_SOURCES))
+cameras = {PRIMARY_CAMERA: CameraState(PRIMARY_CAMERA, object_tracker, inference_scheduler)}
+
+def get_camera(name=None):
+    """State of the named camera (the primary one by default), created on first use."""
+    name = name or PRIMARY_CAMERA
+    if name not in cameras:
+        cameras[name] = CameraState(name)
+    return cameras[name]
+
+# Reuses one input blob per resolution instead of allocating one per frame
+preprocessor = Preprocessor(config.DETECTOR_INPUT_SIZE, config.DETECTOR_LETTERBOX)
+
+# Processing parameters
 CONFIDENCE_THRESHOLD = 0.5
 NMS_THRESHOLD = 0.4
 
@@ -60,122 +94,345 @@ LOCATION_KEYWORDS = {
     "right": ["right"],
     "all": ["object", "objects", "nearby"]
 }
+# Narrow a location query to a row of the 3x3 grid or a distance (see tracker.SpatialSnapshot).
+# They never make a query on their own, so "how far is the moon" still goes to Gemini.
+ROW_KEYWORDS = {
+    "top": ["top", "above", "up high"],
+    "bottom": ["bottom", "below", "floor", "ground"],
+}
+DISTANCE_KEYWORDS = {
+    "close": ["close", "near me", "in front of me"],
+    "far": ["far", "distant"],
+}
 
-def preprocess_frame(frame):
-    """Optimize frame before detection"""
-    blob = cv2.dnn.blobFromImage(
-        frame, 
-        1/255.0, 
-        (416, 416),
-        swapRB=True,
-        crop=False
-    )
-    return blob
+def set_input_size(size):
+    """Change the network input resolution (e.g. 320 for speed, 608 for accuracy) from the next frame on."""
+    preprocessor.set_size(size)
 
-def detect_objects(frame):
-    """Detect objects in a video frame using YOLOv4."""
-    global frame_count
-    frame_count += 1
-    
-    # Skip frames if needed
-    if frame_count % FRAME_SKIP != 0:
-        return frame.shape[1]
-    
-    height, width = frame.shape[:2]
-    blob = preprocess_frame(frame)
-    net.setInput(blob)
-    outputs = net.forward(output_layers)
-    
-    boxes = []
-    confidences = []
-    class_ids = []
-    detected_objects = {}
+def postprocess_outputs(outputs, width, height, geometry=None):
+    """Turn raw YOLO output layers into NMS-ready boxes, confidences and class ids.
 
+    Rows are filtered per output layer with whole-array NumPy operations, so
+    only the few confident candidates are ever copied. The geometry from the
+    preprocessor maps relative coordinates back to frame pixels; without one
+    the input is assumed to be the whole frame stretched.
+    """
+    if geometry is None:
+        geometry = Geometry(width, height, 0.0, 0.0)
+    kept = []
     for output in outputs:
-        for detection in output:
-            scores = detection[5:]
-            class_id = np.argmax(scores)
-            confidence = scores[class_id]
-            
-            if confidence > CONFIDENCE_THRESHOLD:
-                center_x, center_y, w, h = (detection[:4] * np.array([width, height, width, height])).astype("int")
-                x, y = int(center_x - w / 2), int(center_y - h / 2)
-                
-                boxes.append([x, y, w, h])
-                confidences.append(float(confidence))
-                class_ids.append(class_id)
+        output = output.reshape(-1, output.shape[-1])
+        mask = output[:, 5:].max(axis=1) > CONFIDENCE_THRESHOLD
+        if mask.any():
+            kept.append(output[mask])
+    if not kept:
+        return [], [], []
+
+    detections = np.concatenate(kept)
+    scores = detections[:, 5:]
+    class_ids = np.argmax(scores, axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+
+    scale = np.array([geometry.scale_x, geometry.scale_y, geometry.scale_x, geometry.scale_y])
+    offset = np.array([geometry.offset_x, geometry.offset_y, 0.0, 0.0])
+    center_x, center_y, w, h = (detections[:, :4] * scale + offset).astype("int").T
+    x = (center_x - w / 2).astype("int")
+    y = (center_y - h / 2).astype("int")
+
+    boxes = np.stack([x, y, w, h], axis=1).tolist()
+    return boxes, confidences.tolist(), class_ids.tolist()
+
+def select_detections(outputs, width, height, geometry):
+    """
+    Postprocess and non-maximum suppress the outputs for one frame.
+    Returns:
+        tuple: (detections, seconds spent in postprocessing, seconds spent in NMS)
+    """
+    start = time.perf_counter()
+    boxes, confidences, class_ids = postprocess_outputs(outputs, width, height, geometry)
+    postprocessed = time.perf_counter()
+    detected_objects = []
 
     # Apply Non-Maximum Suppression
     indices = cv2.dnn.NMSBoxes(boxes, confidences, CONFIDENCE_THRESHOLD, NMS_THRESHOLD)
-    
+    suppressed = time.perf_counter()
+
     if len(indices) > 0:
-        for i in indices.flatten():
-            label = str(classes[class_ids[i]])
-            detected_objects[label] = {
-                "position": (boxes[i][0], boxes[i][1]),
+        for i in np.asarray(indices).flatten():
+            detected_objects.append({
+                "label": str(classes[class_ids[i]]),
+                "class_id": class_ids[i],
+                "box": tuple(boxes[i]),
                 "confidence": confidences[i]
-            }
-            
-            # Draw bounding box and label
-            x, y, w, h = boxes[i]
+            })
+    return detected_objects, postprocessed - start, suppressed - postprocessed
+
+def infer_batch(frames, timings=None, backend=None):
+    """
+    Run YOLO on several frames (e.g. the newest frame of every camera) with one batched forward pass.
+    Backends with a fixed batch size get the frames in groups of that size, the last group padded.
+    Args:
+        frames (list): BGR images, not modified
+        timings (dict): Optional dict that receives per-stage durations in seconds, summed over the batch
+        backend: Backend to run instead of the shared detector (used by the parity check)
+    Returns:
+        list: per frame, one dict per kept detection with "label", "class_id", "box" (x, y, w, h) and "confidence"
+    """
+    if backend is None:
+        if detector is None:
+            load_network()
+        backend = detector
+
+    start = time.perf_counter()
+    group = backend.max_batch or len(frames)
+    padded = -(-len(frames) // group) * group  # Whole groups; the padding rows are never read back
+    # The blob is shared, so no other thread may prepare frames until the forward passes are done
+    with preprocessor.lock:
+        blob, geometries = preprocessor.prepare_batch(frames, backend.input_size, padded)
+        preprocessed = time.perf_counter()
+        per_frame = []
+        for first in range(0, len(frames), group):
+            outputs = backend.infer(blob[first:first + group])
+            per_frame.extend(split_batch(outputs, group)[:len(frames) - first])
+        forwarded = time.perf_counter()
+
+    results = []
+    postprocess_time = nms_time = 0.0
+    for frame, outputs, geometry in zip(frames, per_frame, geometries):
+        height, width = frame.shape[:2]
+        detected_objects, postprocess_seconds, nms_seconds = select_detections(outputs, width, height, geometry)
+        results.append(detected_objects)
+        postprocess_time += postprocess_seconds
+        nms_time += nms_seconds
+
+    if timings is not None:
+        timings["preprocess"] = preprocessed - start
+        timings["forward"] = forwarded - preprocessed
+        timings["postprocess"] = postprocess_time
+        timings["nms"] = nms_time
+    if metrics.enabled:
+        metrics.record("preprocess", preprocessed - start)
+        metrics.record("forward", forwarded - preprocessed)
+        metrics.record("postprocess", postprocess_time)
+        metrics.record("nms", nms_time)
+    return results
+
+def infer_detections(frame, timings=None, backend=None):
+    """
+    Run one YOLO pass on a frame without touching its pixels.
+    Args:
+        frame: BGR image
+        timings (dict): Optional dict that receives per-stage durations in seconds
+        backend: Backend to run instead of the shared detector (used by the parity check)
+    Returns:
+        list: one dict per kept detection with "label", "class_id", "box" (x, y, w, h) and "confidence"
+    """
+    return infer_batch([frame], timings, backend)[0]
+
+def draw_detections(frame, detected_objects):
+    """Draw bounding boxes and labels into the frame."""
+    with metrics.timer("draw"):
+        for detection in detected_objects:
+            x, y, w, h = detection["box"]
             cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            cv2.putText(frame, detection["label"], (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+def run_detection(frame, timings=None):
+    """
+    Run one full YOLO pass on a frame and draw the results into it.
+    Args:
+        frame: BGR image
+        timings (dict): Optional dict that receives per-stage durations in seconds
+    Returns:
+        list: one dict per kept detection with "label", "class_id", "box" (x, y, w, h) and "confidence"
+    """
+    detected_objects = infer_detections(frame, timings)
+    start = time.perf_counter()
+    draw_detections(frame, detected_objects)
+    if timings is not None:
+        timings["draw"] = time.perf_counter() - start
+    return detected_objects
+
+def detect_objects(frame):
+    """Detect objects in a video frame using YOLOv4."""
+    # Skip inference when the scheduler says the previous detections still hold
+    if not inference_scheduler.should_infer(frame):
+        object_tracker.refresh()
+        return frame.shape[1]
     
-    object_tracker.update_objects(detected_objects)
-    return width
-
-def categorize_objects(width):
-    """Categorize detected objects into left, middle, and right sections."""
-    left, middle, right = [], [], []
-    with object_tracker.lock:
-        for obj, data in object_tracker.recognized_objects.items():
-            x, _ = data["position"]
-            if x < width // 3:
-                left.append(obj)
-            elif x > 2 * width // 3:
-                right.append(obj)
-            else:
-                middle.append(obj)
-    return left, middle, right
-
-def announce_objects(left, middle, right):
+    start = time.perf_counter()
+    detected_objects = run_detection(frame)
+    inference_scheduler.record_inference(time.perf_counter() - start)
+    object_tracker.update_objects(detected_objects, frame_size=(frame.shape[1], frame.shape[0]))
+    return frame.shape[1]
+
+def detect_cameras(frames):
+    """
+    Detect objects in the newest frame of every camera with one batched forward pass.
+    Each camera's scheduler decides whether its frame needs inference; the results are
+    demultiplexed to the per-camera trackers. Frames are not drawn into (see render_overlay).
+    Args:
+        frames (dict): camera name -> BGR frame
+    Returns:
+        dict: camera name -> detections, or None for cameras whose frame was not inferred
+    """
+    detections = dict.fromkeys(frames)
+    due = {}
+    for name, frame in frames.items():
+        camera = get_camera(name)
+        if camera.scheduler.should_infer(frame):
+            due[name] = frame
+        else:
+            camera.tracker.refresh()
+
+    if due:
+        start = time.perf_counter()
+        results = infer_batch(list(due.values()))
+        duration = time.perf_counter() - start
+        for (name, frame), detected_objects in zip(due.items(), results):
+            camera = cameras[name]
+            camera.scheduler.record_inference(duration)
+            camera.tracker.update_objects(detected_objects, frame_size=(frame.shape[1], frame.shape[0]))
+            detections[name] = detected_objects
+    return detections
+
+def render_overlay(frame, detections=None, camera=None):
+    """
+    Copy of the frame with boxes, labels and status messages drawn on it, for a display
+    or debug stream. Without detections (frame not inferred) the camera's tracks are drawn.
+    """
+    overlay = frame.copy()
+    if config.recognition_enabled:
+        draw_detections(overlay, detections if detections is not None else get_camera(camera).tracker.tracks())
+    else:
+        # Add visual feedback when recognition is disabled
+        cv2.putText(overlay, "Object Recognition Disabled", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    if not config.gemini_enabled:
+        # Positioned below the object recognition message
+        cv2.putText(overlay, "Gemini AI Disabled", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
+    return overlay
+
+def categorize_objects(camera=None):
+    """Tracked objects in the left, middle and right sections by box centre (one label per instance)."""
+    snapshot = get_camera(camera).tracker.snapshot()
+    return snapshot.labels("left"), snapshot.labels("middle"), snapshot.labels("right")
+
+NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
+IRREGULAR_PLURALS = {"person": "people", "mouse": "mice", "knife": "knives", "sheep": "sheep", "skis": "skis", "scissors": "scissors"}
+
+def pluralize(label, count):
+    """Spoken form of a count and a class label, e.g. "two chairs"."""
+    if count == 1:
+        article = "an" if label[0] in "aeiou" else "a"
+        return f"{article} {label}"
+    if label in IRREGULAR_PLURALS:
+        plural = IRREGULAR_PLURALS[label]
+    elif label.endswith(("s", "x", "ch", "sh")):
+        plural = label + "es"
+    else:
+        plural = label + "s"
+    number = NUMBER_WORDS[count] if count < len(NUMBER_WORDS) else str(count)
+    return f"{number} {plural}"
+
+def describe_objects(labels):
+    """Summarize a list of labels with counts, e.g. "two chairs, a person"."""
+    return ", ".join(pluralize(label, count) for label, count in Counter(labels).items())
+
+def describe_sections(left, middle, right):
+    """Full left/middle/right summary, e.g. for continuous announcements."""
+    response = f"Objects on the left: {describe_objects(left) or 'None'}. "
+    response += f"Objects in the middle: {describe_objects(middle) or 'None'}. "
+    response += f"Objects on the right: {describe_objects(right) or 'None'}."
+    return response
+
+def camera_prefix(name):
+    """Spoken camera name, only when there is more than one camera to tell apart."""
+    return f"{name.capitalize()} camera. " if len(cameras) > 1 else ""
+
+def announce_objects(left, middle, right, camera=None):
     """Announce all detected objects and their positions using text-to-speech."""
-    response = f"Objects on the left: {', '.join(left) or 'None'}. "
-    response += f"Objects in the middle: {', '.join(middle) or 'None'}. "
-    response += f"Objects on the right: {', '.join(right) or 'None'}."
-    engine.say(response)
-    engine.runAndWait()
+    response = describe_sections(left, middle, right)
+    if camera:
+        response = camera_prefix(camera) + response
+    # A newer continuous-mode announcement replaces one that has not been spoken yet
+    return speech_service.speak(response, priority=PRIORITY_AMBIENT, category="continuous",
+                                max_age=config.ANNOUNCE_MAX_AGE, cached=True)
 
-def handle_object_query(user_query, width):
-    """Process keyword-based object recognition queries."""
+def announce_scene():
+    """Announce the objects seen by every camera in one utterance, naming each camera."""
+    if len(cameras) == 1:
+        return announce_objects(*categorize_objects())
+    response = " ".join(camera_prefix(name) + describe_sections(*categorize_objects(name)) for name in cameras)
+    return speech_service.speak(response, priority=PRIORITY_AMBIENT, category="continuous",
+                                max_age=config.ANNOUNCE_MAX_AGE, cached=True)
+
+def match_keyword(lower_query, keyword_map):
+    """First key of keyword_map with a keyword in the query, or None."""
+    return next((key for key, keywords in keyword_map.items() if any(keyword in lower_query for keyword in keywords)), None)
+
+def describe_place(column, row):
+    """Spoken place of a grid cell, e.g. "on the left", "at the top right" or "" for anywhere."""
+    if row is None:
+        return {"left": "on the left", "middle": "in the middle", "right": "on the right"}.get(column, "")
+    return f"at the {row} {column}" if column else f"at the {row}"
+
+def build_object_response(user_query, camera=None):
+    """
+    Build the spoken answer for a keyword-based object query, e.g. "what's close on my right".
+    With several cameras the answer covers every camera, or only the one named in the query.
+    Returns None if the query has no location keywords.
+    """
     lower_query = user_query.lower()
-    has_keywords = any(
-        any(keyword in lower_query for keyword in keywords)
-        for keywords in LOCATION_KEYWORDS.values()
-    )
+    column = match_keyword(lower_query, LOCATION_KEYWORDS)
     
-    if not has_keywords:
-        return False
-    
-    left_objects, middle_objects, right_objects = categorize_objects(width)
-    
-    if any(keyword in lower_query for keyword in LOCATION_KEYWORDS["left"]):
-        response = "Objects on the left: " + ", ".join(left_objects) + "." if left_objects else "No objects on the left."
-    elif any(keyword in lower_query for keyword in LOCATION_KEYWORDS["middle"]):
-        response = "Objects in the middle: " + ", ".join(middle_objects) + "." if middle_objects else "No objects in the middle."
-    elif any(keyword in lower_query for keyword in LOCATION_KEYWORDS["right"]):
-        response = "Objects on the right: " + ", ".join(right_objects) + "." if right_objects else "No objects on the right."
-    else:
-        response = (
-            f"Objects on the left: {', '.join(left_objects) if left_objects else 'None'}. "
-            f"Objects in the middle: {', '.join(middle_objects) if middle_objects else 'None'}. "
-            f"Objects on the right: {', '.join(right_objects) if right_objects else 'None'}."
+    if column is None:
+        return None
+    if column == "all":
+        column = None
+    row = match_keyword(lower_query, ROW_KEYWORDS)
+    distance = match_keyword(lower_query, DISTANCE_KEYWORDS)
+
+    if camera is None and len(cameras) > 1:
+        named = [name for name in cameras if name.lower() in lower_query]
+        return " ".join(
+            camera_prefix(name) + build_object_response(user_query, name)
+            for name in (named or cameras)
         )
     
-    engine.say(response)
-    engine.runAndWait()
+    # One lookup in the tracker's precomputed index, without taking its lock
+    snapshot = get_camera(camera).tracker.snapshot()
+    if column is None and row is None and distance is None:
+        return describe_sections(snapshot.labels("left"), snapshot.labels("middle"), snapshot.labels("right"))
+
+    labels = snapshot.labels(column, row, distance)
+    place = describe_place(column, row)
+    if distance is None:
+        return f"Objects {place}: {describe_objects(labels)}." if labels else f"No objects {place}."
+    what = {"close": "close", "far": "far away"}[distance]
+    if not place and distance == "close":
+        place = "by"
+    if labels:
+        return f"{what.capitalize()} {place}".rstrip() + f": {describe_objects(labels)}."
+    return f"Nothing {what} {place}".rstrip() + "."
+
+def handle_object_query(user_query):
+    """Process keyword-based object recognition queries."""
+    response = build_object_response(user_query)
+    if response is None:
+        return False
+    
+    speech_service.speak(response, priority=PRIORITY_QUERY, cached=True)
     return True
 
+def announcement_phrases():
+    """Fragments of the object answers and announcements, to render into the phrase cache ahead of time."""
+    places = [describe_place(column, None) for column in ("left", "middle", "right")]
+    phrases = [f"Objects {place}" for place in places] + [f"No objects {place}" for place in places]
+    phrases += [f"New {place}" for place in places] + [f"No longer {place}" for place in places]
+    phrases += ["None", "Close by", "Nothing close by"]
+    phrases += [camera_prefix(name) for name in cameras]
+    return phrases + [pluralize(label, 1) for label in classes]
+
 # Main processing loop
 def main():
     cap = cv2.VideoCapture(0)
@@ -185,12 +442,12 @@ def main():
         if not ret:
             break
         
-        width = detect_objects(frame)
+        detect_objects(frame)
         cv2.imshow("Object Detection", frame)
         
         # Example query handling (replace with your actual input mechanism)
-        if current_mode == "query":
-            handle_object_query("What objects are on the left?", width)
+        if config.current_mode == "query":
+            handle_object_query("What objects are on the left?")
         
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
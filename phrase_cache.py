@@ -0,0 +1,198 @@
+# phrase_cache.py
+"""
+Cache of synthesized phrase audio.
+
+Most of what the assistant says comes from a small vocabulary: command
+confirmations, the "Objects on the left: ..." templates and the COCO
+labels. Those phrases are rendered to PCM once and kept in memory (LRU,
+bounded in bytes) in front of a small SQLite store on disk (LRU, bounded in
+bytes), so they survive restarts and never reach the TTS engine again.
+
+Template sentences are split into fragments at punctuation ("Objects on the
+left", "two chairs", "a person"); each fragment is cached on its own and
+the sentence is played as the fragments joined by short pauses.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Raw PCM samples plus their format
+PhraseAudio = namedtuple("PhraseAudio", ["pcm", "rate", "channels", "sample_width"])
+
+# Pause inserted after a fragment, by the punctuation that ended it
+PAUSES = {":": 0.25, ".": 0.3, "!": 0.3, "?": 0.3, ";": 0.2, ",": 0.12}
+_FRAGMENT = re.compile(r"[^:.,;!?]+[:.,;!?]*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_phrase(text):
+    """Cache key text: lowercase, single spaces, no trailing punctuation."""
+    return _WHITESPACE.sub(" ", text.lower()).strip(" :.,;!?")
+
+
+def split_fragments(text):
+    """
+    Split a sentence into cacheable fragments.
+    Returns:
+        list: (fragment text, pause in seconds after it)
+    """
+    fragments = []
+    for match in _FRAGMENT.finditer(text):
+        piece = match.group().strip()
+        words = piece.rstrip(":.,;!?")
+        if words.strip():
+            fragments.append((words.strip(), PAUSES.get(piece[-1], 0.0)))
+    return fragments
+
+
+def trim_silence(audio, threshold=300, margin=0.03):
+    """Cut the silence engines put around an utterance, keeping `margin` seconds, so joined fragments flow."""
+    if audio.sample_width != 2 or not audio.pcm:
+        return audio
+    samples = np.frombuffer(audio.pcm, dtype=np.int16)
+    loud = np.flatnonzero(np.abs(samples) > threshold) // audio.channels
+    if not len(loud):
+        return audio
+    pad = int(margin * audio.rate)
+    start = max(0, loud[0] - pad) * audio.channels
+    end = min(len(samples) // audio.channels, loud[-1] + pad + 1) * audio.channels
+    return audio._replace(pcm=samples[start:end].tobytes())
+
+
+def concatenate(parts, pauses):
+    """Join PhraseAudio parts of the same format with the given pauses (seconds) of silence after each."""
+    first = parts[0]
+    frame_bytes = first.channels * first.sample_width
+    pcm = bytearray()
+    for part, pause in zip(parts, pauses):
+        if part.rate != first.rate or part.channels != first.channels or part.sample_width != first.sample_width:
+            raise ValueError("Cannot join phrase audio of different formats")
+        pcm += part.pcm
+        pcm += bytes(int(pause * first.rate) * frame_bytes)
+    return PhraseAudio(bytes(pcm), first.rate, first.channels, first.sample_width)
+
+
+class PhraseCache:
+    def __init__(self, path, max_bytes=20_000_000, memory_bytes=5_000_000, voice=""):
+        """
+        Args:
+            path (str): SQLite file of the on-disk store
+            max_bytes (int): Cap on the PCM stored on disk
+            memory_bytes (int): Cap on the PCM kept in memory
+            voice (str): Engine voice and rate; audio of another voice is never returned
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.voice = voice
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()  # key -> PhraseAudio, least recently used first
+        self.memory_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS phrases ("
+            "voice TEXT NOT NULL, key TEXT NOT NULL, pcm BLOB NOT NULL, rate INTEGER NOT NULL, "
+            "channels INTEGER NOT NULL, sample_width INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "last_used REAL NOT NULL, PRIMARY KEY (voice, key))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS phrases_last_used ON phrases (last_used)")
+        self.db.commit()
+
+    def get(self, text):
+        """Return the cached PhraseAudio for the text, or None."""
+        key = normalize_phrase(text)
+        with self.lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return audio
+            row = self.db.execute(
+                "SELECT pcm, rate, channels, sample_width FROM phrases WHERE voice = ? AND key = ?", (self.voice, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE phrases SET last_used = ? WHERE voice = ? AND key = ?", (time.time(), self.voice, key))
+            self.db.commit()
+            audio = PhraseAudio(bytes(row[0]), row[1], row[2], row[3])
+            self._remember(key, audio)
+            self.hits += 1
+            self.disk_hits += 1
+            return audio
+
+    def put(self, text, audio):
+        key = normalize_phrase(text)
+        if not key or not audio.pcm:
+            return
+        with self.lock:
+            self._remember(key, audio)
+            self.db.execute(
+                "INSERT OR REPLACE INTO phrases (voice, key, pcm, rate, channels, sample_width, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.voice, key, audio.pcm, audio.rate, audio.channels, audio.sample_width, len(audio.pcm), time.time())
+            )
+            self._evict()
+            self.db.commit()
+
+    def __contains__(self, text):
+        key = normalize_phrase(text)
+        with self.lock:
+            if key in self.memory:
+                return True
+            return self.db.execute(
+                "SELECT 1 FROM phrases WHERE voice = ? AND key = ?", (self.voice, key)
+            ).fetchone() is not None
+
+    def _remember(self, key, audio):
+        """Keep audio in memory, dropping the least recently used phrases beyond the cap."""
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_size -= len(previous.pcm)
+        self.memory[key] = audio
+        self.memory_size += len(audio.pcm)
+        while self.memory_size > self.memory_bytes and len(self.memory) > 1:
+            _, dropped = self.memory.popitem(last=False)
+            self.memory_size -= len(dropped.pcm)
+
+    def _evict(self):
+        """Drop the least recently used phrases on disk until the byte cap holds."""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM phrases").fetchone()[0]
+        while total > self.max_bytes:
+            voice, key, size = self.db.execute(
+                "SELECT voice, key, size FROM phrases ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            self.db.execute("DELETE FROM phrases WHERE voice = ? AND key = ?", (voice, key))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM phrases").fetchone()
+            memory_entries = len(self.memory)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "memory_entries": memory_entries,
+            "memory_bytes": self.memory_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,295 @@
+# pipeline.py
+"""
+Threaded capture -> inference -> display pipeline.
+
+Each stage runs on its own thread and hands work to the next one through a
+LatestSlot, a one-element buffer where a newer value replaces an unread one.
+Slow stages therefore always see the newest frame instead of a backlog, and
+blocking voice I/O on another thread never stalls the camera.
+
+Every capture source (camera or video file) gets its own capture thread and
+slot. The inference thread takes the newest frame of each source and runs
+them through one batched forward pass, or, with a DetectionWorkerPool,
+hands them to worker processes while a result thread applies the
+detections in order.
+"""
+import os
+import threading
+import time
+import logging
+import cv2
+import config
+from metrics import metrics
+from object_recognition import detect_cameras, get_camera, cameras, preprocessor
+
+logger = logging.getLogger(__name__)
+
+
+class LatestSlot:
+    """Bounded "latest value wins" hand-off between two threads."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._value = None
+        self._fresh = False
+        self._closed = False
+        self.put_count = 0
+        self.dropped = 0  # Values overwritten before anyone read them
+
+    def put(self, value):
+        with self._condition:
+            if self._fresh:
+                self.dropped += 1
+            self._value = value
+            self._fresh = True
+            self.put_count += 1
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """Wait for a value newer than the last one read. Returns None on timeout or close."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._fresh or self._closed, timeout):
+                return None
+            if not self._fresh:
+                return None
+            self._fresh = False
+            return self._value
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class FramePacket:
+    """A captured frame together with its camera, capture time and sequence number."""
+    __slots__ = ("frame", "captured_at", "index", "width", "camera", "detections")
+
+    def __init__(self, frame, index, camera=None):
+        self.frame = frame
+        self.captured_at = time.monotonic()
+        self.index = index
+        self.width = frame.shape[1]
+        self.camera = camera
+        self.detections = None  # Set when this frame went through the detector; never drawn into the frame
+
+    def age(self):
+        """Seconds since the frame was captured."""
+        return time.monotonic() - self.captured_at
+
+
+class CameraSource:
+    """A camera index or a video file. Files are replayed at their own frame rate, like a live camera."""
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self._next_frame_at = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.frame_interval:
+            now = time.monotonic()
+            if self._next_frame_at is not None and now < self._next_frame_at:
+                time.sleep(self._next_frame_at - now)
+            self._next_frame_at = max(now, self._next_frame_at or now) + self.frame_interval
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+def open_sources(sources):
+    """
+    Open every configured source.
+    Args:
+        sources (dict): name -> camera index or video file path
+    Returns:
+        dict: name -> CameraSource for the sources that could be opened
+    """
+    opened = {}
+    for name, source in sources.items():
+        camera = CameraSource(name, source)
+        if camera.isOpened():
+            opened[name] = camera
+        else:
+            print(f"Error: Could not open video source {source!r} ({name})")
+    return opened
+
+
+class Pipeline:
+    """Runs capture and inference on background threads; the caller drives display."""
+
+    def __init__(self, sources, detector_ready=None, worker_pool=None):
+        """
+        Args:
+            sources (dict): camera name -> opened CameraSource
+            detector_ready: Callable returning True once the detector can be used
+            worker_pool: Started DetectionWorkerPool to detect in, instead of this process
+        """
+        self.sources = sources
+        self.primary = next(iter(sources))
+        for name in sources:
+            get_camera(name)  # Register every camera up front so announcements name them
+        self.detector_ready = detector_ready or (lambda: True)
+        self.worker_pool = worker_pool
+        self.capture_slots = {name: LatestSlot() for name in sources}
+        self.display_slots = {name: LatestSlot() for name in sources}
+        self.frames_ready = threading.Event()   # Set by any capture thread
+        self.display_ready = threading.Event()  # Set by the inference thread
+        self.stop_event = threading.Event()
+        self.finished = set()  # Sources that ran out of frames (video files)
+        self.frame_width = None  # Width of the primary camera's frames
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.frames_displayed = 0
+        self.batches = 0
+        self.inference_frame_age = 0.0  # Age of the oldest frame in a batch when inference started
+        self.display_frame_age = 0.0    # Age of the frame when it was shown
+        self._threads = []
+
+    def start(self):
+        targets = [(f"capture-{name}", self._capture_loop, (name,)) for name in self.sources]
+        if self.worker_pool is None:
+            targets.append(("inference", self._inference_loop, ()))
+        else:
+            targets.append(("dispatch", self._dispatch_loop, ()))
+            targets.append(("results", self._result_loop, ()))
+        for name, target, args in targets:
+            thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        for slot in list(self.capture_slots.values()) + list(self.display_slots.values()):
+            slot.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    def _capture_loop(self, name):
+        """Read frames from one source as fast as it delivers them."""
+        source = self.sources[name]
+        while not self.stop_event.is_set():
+            with metrics.timer("capture"):
+                ret, frame = source.read()
+            if not ret:
+                if source.is_file:
+                    print(f"End of video source: {name}")
+                else:
+                    print("Error: Could not read frame.")
+                self.finished.add(name)
+                # A camera failing stops everything; video files stop once all of them ended
+                if not source.is_file or len(self.finished) == len(self.sources):
+                    self.stop_event.set()
+                break
+            self.frames_captured += 1
+            packet = FramePacket(frame, self.frames_captured, name)
+            if name == self.primary and self.frame_width is None:
+                self.frame_width = packet.width
+            self.capture_slots[name].put(packet)
+            self.frames_ready.set()
+
+    def _inference_loop(self):
+        """Run batched detection on the newest frame of every source and feed the per-camera trackers."""
+        while not self.stop_event.is_set():
+            packets = self._next_packets()
+            if not packets:
+                continue
+            self.inference_frame_age = max(packet.age() for packet in packets)
+            # Only perform object detection if recognition is enabled
+            if config.recognition_enabled and self.detector_ready():
+                detections = detect_cameras({packet.camera: packet.frame for packet in packets})  # Updates the trackers
+                for packet in packets:
+                    packet.detections = detections[packet.camera]
+                self.frames_processed += len(packets)
+                self.batches += 1
+            for packet in packets:
+                self._show(packet)
+
+    def _next_packets(self):
+        """Wait for new frames and take the newest one of every source."""
+        if not self.frames_ready.wait(timeout=0.5):
+            return []
+        self.frames_ready.clear()
+        return [packet for packet in (slot.get(timeout=0) for slot in self.capture_slots.values()) if packet]
+
+    def _show(self, packet):
+        if packet.camera == self.primary:
+            self.frame_width = packet.width
+        self.display_slots[packet.camera].put(packet)
+        self.display_ready.set()
+
+    def _dispatch_loop(self):
+        """Worker pool mode: send due frames to the workers, pass the others straight to display."""
+        while not self.stop_event.is_set():
+            packets = self._next_packets()
+            for packet in packets:
+                camera = get_camera(packet.camera)
+                self.inference_frame_age = packet.age()
+                if (config.recognition_enabled and self.detector_ready()
+                        and camera.scheduler.should_infer(packet.frame)
+                        and self.worker_pool.submit(packet.frame, packet) is not None):
+                    continue  # Shown by the result thread once detected
+                # Skipped, or refused because every worker slot is busy
+                camera.tracker.refresh()
+                self._show(packet)
+
+    def _result_loop(self):
+        """Worker pool mode: apply results in submission order to the per-camera trackers."""
+        while not self.stop_event.is_set():
+            if not self.detector_ready():
+                # start() reads the workers' ready messages from the same queue until then
+                self.stop_event.wait(0.1)
+                continue
+            try:
+                result = self.worker_pool.get_result(timeout=0.5)
+            except RuntimeError as e:
+                logger.error(e)
+                self.stop_event.set()
+                break
+            if result is None:
+                continue
+            packet = result.context
+            camera = get_camera(packet.camera)
+            metrics.record("worker_detect", result.latency)
+            # Workers run in parallel, so each inference costs the budget only a share of its latency
+            camera.scheduler.record_inference(result.latency / self.worker_pool.workers)
+            camera.tracker.update_objects(result.detections, frame_size=(packet.width, packet.frame.shape[0]))
+            packet.detections = result.detections
+            self.frames_processed += 1
+            self._show(packet)
+
+    def next_display_frames(self, timeout=0.5):
+        """Return the newest processed frame of every camera that has one, or an empty list."""
+        if not self.display_ready.wait(timeout):
+            return []
+        self.display_ready.clear()
+        packets = [packet for packet in (slot.get(timeout=0) for slot in self.display_slots.values()) if packet]
+        for packet in packets:
+            self.frames_displayed += 1
+            self.display_frame_age = packet.age()
+        return packets
+
+    def stats(self):
+        """Counters describing how far each stage keeps up with the cameras."""
+        return {
+            "frames_captured": self.frames_captured,
+            "frames_processed": self.frames_processed,
+            "frames_displayed": self.frames_displayed,
+            "batches": self.batches,
+            "mean_batch_size": round(self.frames_processed / self.batches, 2) if self.batches else 0.0,
+            "dropped_before_inference": sum(slot.dropped for slot in self.capture_slots.values()),
+            "dropped_before_display": sum(slot.dropped for slot in self.display_slots.values()),
+            "inference_frame_age_ms": self.inference_frame_age * 1000,
+            "display_frame_age_ms": self.display_frame_age * 1000,
+            "scheduler": {name: camera.scheduler.stats() for name, camera in cameras.items()},
+            "preprocess": preprocessor.stats(),
+            "workers": self.worker_pool.stats() if self.worker_pool else None,
+        }
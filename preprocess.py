@@ -0,0 +1,151 @@
+# preprocess.py
+"""
+Frame preprocessing for the detector without per-frame pixel buffers.
+
+cv2.dnn.blobFromImage allocates a resized copy and a new float32 blob for
+every frame. The Preprocessor keeps one uint8 and one float32 canvas per
+input size and one NCHW float32 blob per input and batch size, and writes
+each frame into them in place (several cameras share one batched blob):
+resize into the canvas (optionally letterboxed to keep the aspect ratio),
+convert it to float32 in one contiguous pass, then swap to RGB, scale to
+0-1 and transpose to planar layout straight into the blob. Converting the
+whole canvas first keeps the per-channel step free of dtype casts, which
+NumPy would otherwise buffer in a temporary allocation. What is still
+allocated per frame is Python bookkeeping (array views, the Geometry), about
+2 KB, against megabytes for blobFromImage.
+
+Every prepared frame comes with a Geometry that maps the network's relative
+box coordinates back to frame pixels, so the input size and letterboxing
+can change at runtime without the rest of the pipeline noticing.
+"""
+import threading
+import time
+from collections import namedtuple
+import cv2
+import numpy as np
+
+INPUT_SIZES = (320, 416, 608)  # The usual yolov4-tiny trade-offs; any multiple of 32 works
+LETTERBOX_FILL = 127           # Grey padding, as in Darknet's letterbox_image
+
+# Relative output coordinate -> frame pixel: pixel = relative * scale + offset
+Geometry = namedtuple("Geometry", ["scale_x", "scale_y", "offset_x", "offset_y"])
+
+
+class Preprocessor:
+    def __init__(self, size=416, letterbox=False):
+        """
+        Args:
+            size (int): Square network input size in pixels (multiple of 32)
+            letterbox (bool): Keep the aspect ratio and pad instead of stretching
+        """
+        # Reentrant so a caller can hold it while it uses the returned blob (see prepare_batch)
+        self.lock = threading.RLock()
+        self.size = None
+        self.letterbox = letterbox
+        self.set_size(size)
+        # Kept per size (and batch) so switching back and forth doesn't reallocate
+        self._canvases = {}
+        self._blobs = {}
+        self._scale = np.float32(1 / 255.0)
+        self.frames = 0
+        self.allocations = 0
+        self.bytes_allocated = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def set_size(self, size):
+        """Change the input resolution; takes effect with the next frame."""
+        if size % 32:
+            raise ValueError(f"Input size must be a multiple of 32, got {size}")
+        with self.lock:
+            self.size = size
+
+    def set_letterbox(self, enabled):
+        with self.lock:
+            self.letterbox = enabled
+
+    def _buffers_for(self, size, batch):
+        """uint8 and float32 canvases for the given size and blob for the given size and batch, allocated once each."""
+        canvases = self._canvases.get(size)
+        if canvases is None:
+            canvases = self._canvases[size] = (
+                np.empty((size, size, 3), dtype=np.uint8),
+                np.empty((size, size, 3), dtype=np.float32),
+            )
+            self.allocations += 2
+            self.bytes_allocated += sum(canvas.nbytes for canvas in canvases)
+        blob = self._blobs.get((size, batch))
+        if blob is None:
+            blob = self._blobs[(size, batch)] = np.empty((batch, 3, size, size), dtype=np.float32)
+            self.allocations += 1
+            self.bytes_allocated += blob.nbytes
+        return canvases, blob
+
+    def prepare(self, frame, size=None):
+        """
+        Write a BGR frame into the preallocated input blob.
+        Args:
+            frame: BGR image of any size
+            size (int): Overrides the configured size (backends with a fixed input)
+        Returns:
+            tuple: (blob, Geometry). The blob is reused by the next call.
+        """
+        blob, geometries = self.prepare_batch([frame], size)
+        return blob, geometries[0]
+
+    def prepare_batch(self, frames, size=None, batch=None):
+        """
+        Write several BGR frames (e.g. one per camera) into one preallocated NCHW blob.
+        Args:
+            frames (list): BGR images of any size
+            size (int): Overrides the configured size (backends with a fixed input)
+            batch (int): Rows of the blob, at least len(frames), for backends with a fixed batch size;
+                         rows past the frames are padding and their contents are undefined
+        Returns:
+            tuple: (blob, list of Geometry in frame order). The blob is reused by the next call, so a
+                   caller sharing the instance with other threads holds self.lock until it is done with it.
+        """
+        start = time.perf_counter()
+        # The canvases and blobs are shared by every caller of this instance
+        with self.lock:
+            size = size or self.size
+            canvases, blob = self._buffers_for(size, max(batch or 0, len(frames)))
+            geometries = [self._fill(frame, canvases, blob[index], size, self.letterbox) for index, frame in enumerate(frames)]
+
+            self.last_time = time.perf_counter() - start
+            self.total_time += self.last_time
+            self.frames += len(frames)
+        return blob, geometries
+
+    def _fill(self, frame, canvases, planes, size, letterbox):
+        """Resize one frame into the canvas and convert it into one (3, size, size) slice of the blob."""
+        canvas, canvas_float = canvases
+        height, width = frame.shape[:2]
+        if letterbox:
+            scale = min(size / width, size / height)
+            new_width, new_height = round(width * scale), round(height * scale)
+            pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+            canvas.fill(LETTERBOX_FILL)
+            cv2.resize(frame, (new_width, new_height), dst=canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width])
+            geometry = Geometry(size / scale, size / scale, -pad_x / scale, -pad_y / scale)
+        else:
+            cv2.resize(frame, (size, size), dst=canvas)
+            geometry = Geometry(width, height, 0.0, 0.0)
+
+        # Contiguous uint8 -> float32 conversion needs no cast buffer; then BGR -> planar RGB
+        # scaled to 0-1, written straight into the blob without any further cast
+        np.copyto(canvas_float, canvas)
+        for channel in range(3):
+            np.multiply(canvas_float[:, :, 2 - channel], self._scale, out=planes[channel])
+        return geometry
+
+    def stats(self):
+        return {
+            "input_size": self.size,
+            "letterbox": self.letterbox,
+            "frames": self.frames,
+            "allocations": self.allocations,
+            "bytes_allocated": self.bytes_allocated,
+            "mean_ms_per_frame": round(self.total_time * 1000 / self.frames, 3) if self.frames else 0.0,
+            "last_ms": round(self.last_time * 1000, 3),
+        }
@@ -0,0 +1,443 @@
+# query_executor.py
+"""
+Asynchronous executor for Gemini queries.
+
+Queries run as asyncio tasks on one background event loop. A caller gets an
+AnswerStream back at once, and one model client is shared by every query:
+the Vertex AI model with its channel, or a pool of keep-alive connections
+to an HTTP endpoint.
+
+- Every query has a deadline (config.GEMINI_DEADLINE). Once it passes, the
+  stream raises QueryTimeout.
+- At most config.GEMINI_MAX_CONCURRENCY model calls run at once. Further
+  queries wait for a free slot.
+- A query whose first text takes longer than config.GEMINI_HEDGE_AFTER is
+  hedged: a second, identical call starts, the first one to answer is used
+  and the other is cancelled. A failed call is retried the same way, up to
+  config.GEMINI_MAX_ATTEMPTS calls per query.
+- AnswerStream.cancel() (e.g. on an interrupt keyword) cancels the call.
+  That closes its connection, so the generation stops too.
+
+HttpModelClient talks to the stand-in server of fake_model.py. Latency
+behaviour (slow first tokens, hedging, cancellation) can therefore be
+tested without network access.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import config
+
+logger = logging.getLogger(__name__)
+
+_END = object()  # Marks the end of an answer (and of a synchronous response stream)
+
+
+class QueryCancelled(Exception):
+    """The query was cancelled before its answer was complete."""
+
+
+class QueryTimeout(TimeoutError):
+    """The query did not finish before its deadline."""
+
+
+def text_of(response):
+    """Text of a (possibly partial, streamed) response, or "" if it carries none."""
+    try:
+        return response.candidates[0].content.text
+    except (IndexError, AttributeError, ValueError):
+        return ""
+
+
+class ModelClient:
+    """
+    Async access to a GenerativeModel (Vertex AI or fake_model.FakeGenerativeModel).
+    The one model instance, and so its channel, serves every query. A model
+    without generate_content_async is driven from a small thread pool.
+    """
+
+    def __init__(self, model, threads=4):
+        self.model = model
+        self._threads = ThreadPoolExecutor(threads, thread_name_prefix="gemini-client")
+
+    async def stream(self, contents):
+        """Yield the text of each response chunk as it arrives."""
+        generate_async = getattr(self.model, "generate_content_async", None)
+        if generate_async is not None:
+            responses = await generate_async(contents, stream=True)
+            async for response in responses:
+                yield text_of(response)
+            return
+
+        responses = await asyncio.wrap_future(self._threads.submit(self.model.generate_content, contents, stream=True))
+        iterator = iter(responses)
+        step = None
+        try:
+            while True:
+                step = self._threads.submit(next, iterator, _END)
+                response = await asyncio.wrap_future(step)
+                if response is _END:
+                    return
+                yield text_of(response)
+        finally:
+            close = getattr(responses, "close", None)
+            if close and step is not None:
+                # A generator cannot be closed while next() still runs on a pool thread
+                step.add_done_callback(lambda _: close())
+            elif close:
+                close()
+
+
+class HttpModelClient:
+    """
+    Streams answers from an HTTP endpoint speaking the fake_model.py protocol:
+    POST {"contents": [...]} and read newline-delimited {"text": ...} objects
+    from the (chunked) response. Up to pool_size idle keep-alive connections
+    are kept for the next calls; a cancelled call's connection is closed.
+    """
+
+    def __init__(self, endpoint, pool_size=4):
+        """
+        Args:
+            endpoint (str): URL to post queries to, e.g. "http://127.0.0.1:8765/generate"
+            pool_size (int): Idle connections kept open (config.GEMINI_POOL_SIZE)
+        """
+        parts = urlsplit(endpoint)
+        if parts.scheme != "http":
+            raise ValueError(f"Only http:// endpoints are supported, got {endpoint}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.pool_size = pool_size
+        self._idle = []  # (reader, writer) of open keep-alive connections
+        self.opened = 0
+        self.reused = 0
+
+    async def _connection(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.reused += 1
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.opened += 1
+        return reader, writer, False
+
+    def _release(self, reader, writer, reusable):
+        if reusable and len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _read_chunk(reader):
+        """One chunk of a chunked body, b"" after the last one."""
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Model endpoint closed the connection in the middle of an answer")
+        size = int(line.split(b";")[0], 16)
+        data = await reader.readexactly(size) if size else b""
+        await reader.readline()  # CRLF after the data (there are no trailers after the last chunk)
+        return data
+
+    async def stream(self, contents):
+        """Yield the text of each response line as it arrives."""
+        body = json.dumps({"contents": contents}).encode()
+        request = (
+            f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        ).encode() + body
+        for _ in range(2):
+            reader, writer, reused = await self._connection()
+            try:
+                writer.write(request)
+                await writer.drain()
+                status = await reader.readline()
+            except ConnectionError:
+                status = b""
+            if status or not reused:
+                break
+            writer.close()  # The server had closed the idle connection: once more on a new one
+
+        reusable = False
+        try:
+            parts = status.split()
+            if len(parts) < 2 or parts[1] != b"200":
+                raise ConnectionError(f"Model endpoint answered {status.decode(errors='replace').strip() or 'nothing'}")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip().lower()
+
+            chunked = headers.get("transfer-encoding") == "chunked"
+            remaining = int(headers.get("content-length", 0))
+            buffer = b""
+            while True:
+                if chunked:
+                    data = await self._read_chunk(reader)
+                else:
+                    data = await reader.readexactly(remaining) if remaining else b""
+                    remaining = 0
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        yield json.loads(line).get("text", "")
+            if buffer.strip():
+                yield json.loads(buffer).get("text", "")
+            reusable = headers.get("connection") != "close"
+        finally:
+            self._release(reader, writer, reusable)
+
+    def stats(self):
+        return {"connections_opened": self.opened, "connections_reused": self.reused, "idle": len(self._idle)}
+
+
+class AnswerStream:
+    """
+    Caller's handle of one query. Iterating blocks for the answer text as it
+    arrives and raises QueryTimeout, QueryCancelled or the client's error.
+    """
+
+    def __init__(self):
+        self.submitted_at = time.monotonic()
+        self.first_text_at = None
+        self.first_text = threading.Event()  # Set when the first text arrived
+        self.attempts = 0    # Model calls made, counting hedges and retries
+        self.hedged = False
+        self.cancelled = False
+        self.finished = False  # Set once iteration reached the end or an error
+        self._queue = queue.Queue()
+        self._future = None
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                self.finished = True
+                return
+            if isinstance(item, BaseException):
+                self.finished = True
+                raise item
+            yield item
+
+    def text(self):
+        """Block until the whole answer is there and return it."""
+        return "".join(self)
+
+    def cancel(self):
+        """Stop the query; iteration ends with QueryCancelled. Does nothing once the query finished."""
+        # The future can still be running after the consumer read the last chunk
+        if self.finished or (self._future is not None and self._future.done()):
+            return
+        self.cancelled = True
+        self._queue.put(QueryCancelled())
+        if self._future is not None:
+            self._future.cancel()
+
+
+class QueryExecutor:
+    def __init__(self, client, max_concurrency=None, deadline=None, hedge_after=None, max_attempts=None):
+        """
+        Args:
+            client: ModelClient or HttpModelClient, shared by all queries
+            max_concurrency (int): Model calls running at once (config.GEMINI_MAX_CONCURRENCY)
+            deadline (float): Seconds a whole answer may take (config.GEMINI_DEADLINE)
+            hedge_after (float): Seconds without a first text before a second call starts (config.GEMINI_HEDGE_AFTER)
+            max_attempts (int): Model calls per query, counting hedges and retries (config.GEMINI_MAX_ATTEMPTS)
+        """
+        self.client = client
+        self.max_concurrency = max_concurrency or config.GEMINI_MAX_CONCURRENCY
+        self.deadline = config.GEMINI_DEADLINE if deadline is None else deadline
+        self.hedge_after = config.GEMINI_HEDGE_AFTER if hedge_after is None else hedge_after
+        self.max_attempts = max_attempts or config.GEMINI_MAX_ATTEMPTS
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+        self.queries = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.hedges = 0      # Second calls started because the first one was slow
+        self.hedge_wins = 0  # ... that answered first
+        self.retries = 0     # Second calls started because the first one failed
+        self.in_flight = 0   # Model calls running now
+        self.first_text_latency = deque(maxlen=100)  # Seconds from submission to the first text
+
+    def start(self):
+        """Start the event loop thread, unless already running."""
+        with self._lock:
+            if self._thread is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="gemini-executor", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=2)
+                self._thread = None
+
+    def stream(self, contents, deadline=None):
+        """
+        Submit a query and return at once.
+        Args:
+            contents (list): Model input, e.g. [query text]
+            deadline (float): Seconds the answer may take, instead of the executor's deadline
+        Returns:
+            AnswerStream: iterate for the answer text, or cancel()
+        """
+        self.start()
+        answer = AnswerStream()
+        self.queries += 1
+        deadline = self.deadline if deadline is None else deadline
+        answer._future = asyncio.run_coroutine_threadsafe(self._query(contents, answer, deadline), self._loop)
+        if answer.cancelled:
+            answer._future.cancel()  # Cancelled before the future existed
+        return answer
+
+    async def _query(self, contents, answer, deadline):
+        try:
+            await asyncio.wait_for(self._answer(contents, answer), deadline)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            answer._queue.put(QueryTimeout(f"No complete answer within {deadline:.1f} s"))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception as e:
+            self.failed += 1
+            answer._queue.put(e)
+        else:
+            self.completed += 1
+            answer._queue.put(_END)
+
+    async def _answer(self, contents, answer):
+        stream, text = await self._first_text(contents, answer)
+        try:
+            if text is None:
+                return  # The model answered with nothing
+            answer.first_text_at = time.monotonic()
+            self.first_text_latency.append(answer.first_text_at - answer.submitted_at)
+            answer.first_text.set()
+            answer._queue.put(text)
+            async for text in stream:
+                answer._queue.put(text)
+        finally:
+            await self._end_call(stream)
+
+    async def _call(self, contents):
+        """
+        Start one model call and wait for its first text.
+        Returns:
+            tuple: (response stream, first text or None for an empty answer); the caller ends the call
+        """
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        stream = self.client.stream(contents)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+        except BaseException:
+            await self._end_call(stream)
+            raise
+
+    async def _end_call(self, stream):
+        try:
+            await stream.aclose()
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _discard_call(self, task):
+        """Done callback of a call that lost the race: end it if it got as far as its first text."""
+        if not task.cancelled() and task.exception() is None:
+            self._loop.create_task(self._end_call(task.result()[0]))
+
+    async def _first_text(self, contents, answer):
+        """Run calls until one delivers its first text, hedging slow calls and retrying failed ones."""
+        loop = asyncio.get_running_loop()
+        calls = set()
+        hedge_calls = set()
+
+        def launch():
+            answer.attempts += 1
+            task = loop.create_task(self._call(contents))
+            calls.add(task)
+            return task
+
+        launch()
+        started = loop.time()
+        try:
+            while True:
+                hedge_in = None
+                if answer.attempts < self.max_attempts and self.hedge_after is not None:
+                    hedge_in = max(0.0, started + self.hedge_after - loop.time())
+                done, _ = await asyncio.wait(calls, timeout=hedge_in, return_when=asyncio.FIRST_COMPLETED)
+                calls -= done
+                winner, error = None, None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        await self._end_call(task.result()[0])
+                if winner is not None:
+                    if winner in hedge_calls:
+                        self.hedge_wins += 1
+                    return winner.result()
+
+                if done and calls:
+                    continue  # A call failed but another one is still running
+                if done:
+                    if answer.attempts >= self.max_attempts:
+                        raise error
+                    logger.warning(f"Gemini call failed, retrying: {error}")
+                    self.retries += 1
+                    launch()
+                elif not self._semaphore.locked():
+                    self.hedges += 1
+                    answer.hedged = True
+                    hedge_calls.add(launch())
+                # else: every slot is busy with other queries, so hedging would only queue; look again later
+                started = loop.time()
+        finally:
+            for task in calls:
+                task.cancel()
+                task.add_done_callback(self._discard_call)
+
+    def stats(self):
+        latencies = sorted(self.first_text_latency)
+        stats = {
+            "queries": self.queries,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "in_flight": self.in_flight,
+            "first_text_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        }
+        client_stats = getattr(self.client, "stats", None)
+        if client_stats:
+            stats["client"] = client_stats()
+        return stats
@@ -0,0 +1,125 @@
+# response_cache.py
+"""
+Persistent cache for Gemini answers.
+
+Users ask many of the same general questions, so answers are stored in a
+small SQLite file keyed on the normalized query (wake words removed, case,
+punctuation and whitespace normalized). Entries expire after a TTL and the
+least recently used ones are evicted once the entry or byte cap is hit.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text, wake_words=()):
+    """Cache key for a query: lowercase, no wake words, no punctuation, single spaces."""
+    text = text.lower()
+    # Longest first so "gemini wake up" is removed before "gemini"
+    for word in sorted(wake_words, key=len, reverse=True):
+        text = text.replace(word, " ")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class ResponseCache:
+    def __init__(self, path, max_entries=500, max_bytes=2_000_000, ttl=7 * 24 * 3600, wake_words=()):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.wake_words = tuple(wake_words)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.latency_saved = 0.0  # Seconds of generation time avoided by hits
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "latency REAL NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.commit()
+
+    def get(self, query):
+        """Return the cached answer for the query, or None."""
+        key = normalize_query(query, self.wake_words)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, latency, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.db.commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            self.latency_saved += row[1]
+            return row[0]
+
+    def put(self, query, response, latency):
+        """Store an answer together with how long it took to generate (seconds)."""
+        key = normalize_query(query, self.wake_words)
+        if not key or not response:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, latency, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response, size, latency, now, now)
+            )
+            self._evict(now)
+            self.db.commit()
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones until both caps hold."""
+        removed = self.db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,)).rowcount
+        count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            key, size = self.db.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 1").fetchone()
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            removed += 1
+        self.evictions += removed
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "latency_saved_s": round(self.latency_saved, 2),
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,110 @@
+# scheduler.py
+"""
+Adaptive inference scheduler.
+
+Decides per frame whether the YOLO forward pass should run, instead of a
+fixed frame-skip counter. The decision uses a cheap motion score (mean
+absolute difference of a small grayscale thumbnail against the frame last
+inferred), the measured inference latency and a CPU budget: inference
+never uses more than the budgeted share of wall time, never runs faster
+than the maximum rate, and always runs at least at the minimum rate.
+"""
+import time
+import threading
+from collections import Counter, deque
+import cv2
+import config
+
+THUMBNAIL_SIZE = (64, 48)  # (width, height) used for motion scoring
+
+
+class InferenceScheduler:
+    def __init__(self, min_rate=None, max_rate=None, cpu_budget=None, motion_threshold=None):
+        self.min_rate = min_rate or config.INFERENCE_MIN_RATE
+        self.max_rate = max_rate or config.INFERENCE_MAX_RATE
+        self.cpu_budget = cpu_budget or config.INFERENCE_CPU_BUDGET
+        self.motion_threshold = config.MOTION_THRESHOLD if motion_threshold is None else motion_threshold
+        self.lock = threading.Lock()
+        self.reference = None          # Thumbnail of the last inferred frame
+        self.last_inference = None     # time.monotonic() of the last inference
+        self.inference_latency = None  # Exponential moving average, seconds
+        self.motion_score = 0.0
+        self.last_decision = None
+        self.decisions = Counter()
+        self.recent = deque(maxlen=100)  # (timestamp, ran_inference, reason)
+
+    def set_rate_bounds(self, min_rate=None, max_rate=None):
+        """Change the inference rate bounds (inferences per second) at runtime."""
+        with self.lock:
+            if min_rate is not None:
+                self.min_rate = min_rate
+            if max_rate is not None:
+                self.max_rate = max_rate
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def min_interval(self):
+        """Shortest allowed gap between inferences given the rate cap and CPU budget."""
+        interval = 1.0 / self.max_rate
+        if self.inference_latency is not None:
+            interval = max(interval, self.inference_latency / self.cpu_budget)
+        return interval
+
+    def should_infer(self, frame):
+        """Return True if the forward pass should run on this frame."""
+        now = time.monotonic()
+        thumbnail = self._thumbnail(frame)
+        with self.lock:
+            if self.reference is None or self.reference.shape != thumbnail.shape:
+                run, reason = True, "first_frame"
+                self.motion_score = 1.0
+            else:
+                self.motion_score = float(cv2.absdiff(thumbnail, self.reference).mean()) / 255.0
+                elapsed = now - self.last_inference
+                if elapsed >= 1.0 / self.min_rate:
+                    run, reason = True, "min_rate"
+                elif elapsed < self.min_interval():
+                    run, reason = False, "budget"
+                elif self.motion_score >= self.motion_threshold:
+                    run, reason = True, "motion"
+                else:
+                    run, reason = False, "static"
+
+            if run:
+                self.reference = thumbnail
+                self.last_inference = now
+            self.last_decision = reason
+            self.decisions[reason] += 1
+            self.recent.append((now, run, reason))
+        return run
+
+    def record_inference(self, duration):
+        """Feed back how long the last inference took, in seconds."""
+        with self.lock:
+            if self.inference_latency is None:
+                self.inference_latency = duration
+            else:
+                self.inference_latency = 0.8 * self.inference_latency + 0.2 * duration
+
+    def stats(self):
+        """Decision counts by reason plus the current motion, latency and effective rate."""
+        with self.lock:
+            window = [entry for entry in self.recent if entry[1]]
+            if len(window) > 1:
+                rate = (len(window) - 1) / max(window[-1][0] - window[0][0], 1e-6)
+            else:
+                rate = 0.0
+            return {
+                "decisions": dict(self.decisions),
+                "last_decision": self.last_decision,
+                "motion_score": round(self.motion_score, 4),
+                "inference_latency_ms": round((self.inference_latency or 0.0) * 1000, 2),
+                "inference_rate": round(rate, 2),
+                "min_rate": self.min_rate,
+                "max_rate": self.max_rate,
+                "cpu_budget": self.cpu_budget,
+            }
@@ -0,0 +1,542 @@
+# speech_output.py
+"""
+Single text-to-speech service shared by the whole application.
+
+One background thread owns the only pyttsx3 engine and speaks requests from
+a priority queue, so callers enqueue and return immediately and no two
+engines fight over the audio device. A higher-priority request pre-empts
+the one being spoken (mid-utterance), which resumes afterwards from the
+interrupted chunk. Requests tagged with a category replace any pending
+request of the same category, so stale continuous-mode announcements are
+dropped instead of piling up.
+
+With TTS_PCM_PLAYBACK the engine only renders speech to a WAV file and a
+separate playback thread plays the PCM, so the next chunk is synthesized
+while the current one is heard and chunks follow each other without a gap.
+Requests marked cached (confirmations, object answers, announcements) are
+built from pre-rendered phrase fragments, see phrase_cache.py. If the
+engine cannot render to a file, or there is no output device, the engine
+speaks directly instead.
+"""
+import heapq
+import itertools
+import logging
+import os
+import tempfile
+import threading
+import time
+import wave
+from collections import deque
+import pyttsx3
+import config
+from metrics import metrics
+from phrase_cache import PhraseAudio, PhraseCache, concatenate, split_fragments, trim_silence
+
+logger = logging.getLogger(__name__)
+
+# Lower value = more urgent
+PRIORITY_URGENT = 0    # Safety announcements
+PRIORITY_COMMAND = 1   # Confirmations of voice commands
+PRIORITY_QUERY = 2     # Answers to object queries
+PRIORITY_ANSWER = 3    # Long Gemini answers
+PRIORITY_AMBIENT = 4   # Continuous-mode announcements
+
+SPEECH_RATE = 180
+PLAYBACK_BLOCK = 0.03  # Seconds of audio per device write: the longest an interruption waits
+
+
+class SpeechRequest:
+    """Handle for one queued utterance."""
+
+    def __init__(self, chunks, priority, category, max_age, streaming=False, cached=False):
+        self.chunks = deque(chunks)
+        self.cached = cached  # Built from the phrase cache instead of synthesized as a whole
+        self.closed = not streaming  # Streaming requests get chunks appended until close()
+        self._chunk_added = threading.Condition()
+        self.priority = priority
+        self.category = category
+        self.max_age = max_age
+        self.created_at = time.monotonic()
+        self.sequence = 0
+        self.first_audio_at = None
+        self.cancelled = False
+        self.dropped = False
+        self.done = threading.Event()
+
+    def add_chunk(self, text):
+        """Append text to a streaming request while it may already be speaking."""
+        with self._chunk_added:
+            self.chunks.append(text)
+            self._chunk_added.notify_all()
+
+    def close(self):
+        """No more chunks will be added; the request finishes once the queued ones are spoken."""
+        with self._chunk_added:
+            self.closed = True
+            self._chunk_added.notify_all()
+
+    def wait_for_chunk(self, timeout):
+        with self._chunk_added:
+            return self._chunk_added.wait_for(lambda: self.chunks or self.closed or self.cancelled, timeout)
+
+    def cancel(self):
+        """Stop this request, even in the middle of a chunk."""
+        self.cancelled = True
+        speech_service.interrupt_if_current(self)
+        with self._chunk_added:
+            self._chunk_added.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until the request finished, was cancelled or dropped."""
+        return self.done.wait(timeout)
+
+    def expired(self):
+        return self.max_age is not None and time.monotonic() - self.created_at > self.max_age
+
+
+class AudioPlayer:
+    """
+    Plays PhraseAudio on its own thread, so the speech thread can render the
+    next chunk meanwhile. Audio is written in small blocks and stop() takes
+    effect at the next block.
+    """
+
+    def __init__(self):
+        import pyaudio  # Deferred so the detection tools import without an audio stack
+        self._pa = pyaudio.PyAudio()
+        self._pa.get_default_output_device_info()  # Raises when there is no output device
+        self._stream = None
+        self._format = None
+        self._condition = threading.Condition()
+        self._audio = None
+        self._on_start = None
+        self._stop = False
+        self._playing = False
+        self._completed = False
+        self.finished_at = None  # time.monotonic() the last playback ended
+        self._thread = threading.Thread(target=self._run, name="speech-playback", daemon=True)
+        self._thread.start()
+
+    def play(self, audio, on_start=None):
+        """
+        Start playing audio and return at once.
+        Args:
+            audio (PhraseAudio): Samples to play
+            on_start: Called on the playback thread when the first block goes to the device
+        """
+        with self._condition:
+            self._audio = audio
+            self._on_start = on_start
+            self._stop = False
+            self._playing = True
+            self._condition.notify_all()
+
+    def stop(self):
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the current playback to end.
+        Returns:
+            bool: True if it played to the end, False if stopped, None if still playing after timeout
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: not self._playing, timeout):
+                return None
+            return self._completed
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._audio is not None)
+                audio, on_start = self._audio, self._on_start
+                self._audio = None
+            try:
+                completed = self._play(audio, on_start)
+            except OSError as e:
+                logger.error(f"Error playing speech: {e}")
+                completed = False
+            with self._condition:
+                self._playing = False
+                self._completed = completed
+                self.finished_at = time.monotonic()
+                self._condition.notify_all()
+
+    def _play(self, audio, on_start):
+        stream = self._open(audio)
+        frame_bytes = audio.channels * audio.sample_width
+        block = max(1, int(audio.rate * PLAYBACK_BLOCK)) * frame_bytes
+        for offset in range(0, len(audio.pcm), block):
+            if self._stop:
+                return False
+            if offset == 0 and on_start:
+                on_start()
+            stream.write(audio.pcm[offset:offset + block])
+        return not self._stop
+
+    def _open(self, audio):
+        """Output stream for the audio's format; kept open between utterances of the same format."""
+        audio_format = (audio.rate, audio.channels, audio.sample_width)
+        if self._format != audio_format:
+            if self._stream is not None:
+                self._stream.close()
+            self._stream = self._pa.open(
+                format=self._pa.get_format_from_width(audio.sample_width),
+                channels=audio.channels,
+                rate=audio.rate,
+                output=True,
+            )
+            self._format = audio_format
+        return self._stream
+
+
+class SpeechService:
+    def __init__(self, rate=SPEECH_RATE):
+        self.rate = rate
+        self._queue = []  # heap of (priority, sequence, request)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._current = None
+        self._interrupt = False
+        self._thread = None
+        self.ready = threading.Event()  # Set once the engine is initialized (or failed to)
+        self.error = None
+        self.spoken = 0
+        self.dropped = 0
+        self.preempted = 0
+        self.first_audio_latency = deque(maxlen=100)  # Seconds from enqueue to first audio
+        self.chunk_gaps = deque(maxlen=100)  # Seconds of silence between chunks of one request (PCM playback)
+        self.phrase_cache = None
+        self._player = None
+        self._render_path = None
+        self._rendering = False
+        self._prerender = deque()  # Phrases to render into the cache while idle
+
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="speech", daemon=True)
+                self._thread.start()
+
+    def speak(self, text=None, priority=PRIORITY_QUERY, category=None, max_age=None, chunks=None, streaming=False,
+              cached=False):
+        """
+        Queue text for speaking and return immediately.
+        Args:
+            text (str): Text to speak (or pass pre-split chunks instead)
+            priority (int): One of the PRIORITY_* constants
+            category (str): Pending requests with the same category are dropped in favour of this one
+            max_age (float): Drop the request if it has waited longer than this many seconds
+            chunks (list): Text already split into speaking chunks
+            streaming (bool): Keep the request open for add_chunk() until close() is called
+            cached (bool): Fixed or template text: build it from cached phrase fragments
+        Returns:
+            SpeechRequest: handle to wait on or cancel
+        """
+        if chunks is None:
+            chunks = [text] if text else []
+        request = SpeechRequest(chunks, priority, category, max_age, streaming, cached)
+        request.sequence = next(self._sequence)
+        self.start()
+        with self._condition:
+            # Checked under the lock: a failing engine sets error and drops the queue while holding it
+            if self.error is not None:
+                # No engine: complete the request at once so callers never wait forever
+                request.dropped = True
+                request.done.set()
+                return request
+            if category is not None:
+                kept = []
+                for entry in self._queue:
+                    if entry[2].category == category:
+                        self._drop(entry[2])
+                    else:
+                        kept.append(entry)
+                if len(kept) != len(self._queue):
+                    self._queue = kept
+                    heapq.heapify(self._queue)
+            heapq.heappush(self._queue, (priority, request.sequence, request))
+            if self._current is not None and priority < self._current.priority:
+                self._request_interrupt()
+            self._condition.notify()
+        return request
+
+    def prerender(self, phrases):
+        """Render phrases into the phrase cache whenever nothing is being spoken."""
+        with self._condition:
+            self._prerender.extend(phrases)
+            self._condition.notify()
+
+    def interrupt_if_current(self, request):
+        with self._condition:
+            if self._current is request:
+                self._request_interrupt()
+            self._condition.notify()
+
+    def _request_interrupt(self):
+        self._interrupt = True
+        if self._player is not None:
+            self._player.stop()
+
+    def wait_ready(self, timeout=None):
+        """Start the engine thread and wait until it can speak. Raises if initialization failed."""
+        self.start()
+        self.ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def is_idle(self):
+        with self._condition:
+            return self._current is None and not self._queue
+
+    def wait_idle(self, timeout=None):
+        """Block until nothing is queued or being spoken."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._current is None and not self._queue, timeout)
+
+    def stats(self):
+        latencies = sorted(self.first_audio_latency)
+        gaps = sorted(self.chunk_gaps)
+        return {
+            "queue_depth": self.queue_depth(),
+            "spoken": self.spoken,
+            "dropped": self.dropped,
+            "preempted": self.preempted,
+            "time_to_first_audio_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "playback": "pcm" if self._player is not None else "engine",
+            "chunk_gap_ms": round(gaps[len(gaps) // 2] * 1000, 1) if gaps else None,
+            "phrase_cache": self.phrase_cache.stats() if self.phrase_cache is not None else None,
+        }
+
+    def _drop(self, request):
+        request.dropped = True
+        self.dropped += 1
+        request.done.set()
+
+    def _next_request(self):
+        """Next request to speak, or None when there is only prerendering to do."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or (self._prerender and self.phrase_cache is not None))
+            if not self._queue:
+                return None
+            _, _, request = heapq.heappop(self._queue)
+            self._current = request
+            self._interrupt = False
+            return request
+
+    def _finish(self, request):
+        with self._condition:
+            self._current = None
+            self._condition.notify_all()
+        request.done.set()
+
+    def _on_utterance_started(self, name):
+        if not self._rendering:
+            self._audio_started()
+
+    def _audio_started(self):
+        request = self._current
+        if request is not None and request.first_audio_at is None:
+            request.first_audio_at = time.monotonic()
+            self.first_audio_latency.append(request.first_audio_at - request.created_at)
+            metrics.record("tts_first_audio", request.first_audio_at - request.created_at)
+            if request.priority < PRIORITY_AMBIENT:
+                # A reply to the user, not a continuous-mode announcement
+                metrics.answer_audible(request.first_audio_at)
+
+    def _on_word(self, name, location, length):
+        # Rendering is never cut short: the result may go into the phrase cache
+        if self._interrupt and not self._rendering:
+            self._engine.stop()
+
+    def _setup_playback(self):
+        """Switch to rendering plus PCM playback if enabled and an output device is available."""
+        if not config.TTS_PCM_PLAYBACK:
+            return
+        try:
+            self._player = AudioPlayer()
+        except Exception as e:
+            logger.warning(f"No audio output for PCM playback, the TTS engine speaks directly: {e}")
+            return
+        handle, self._render_path = tempfile.mkstemp(suffix=".wav", prefix="speech-")
+        os.close(handle)
+        if config.PHRASE_CACHE_ENABLED:
+            voice = f"{self._engine.getProperty('voice')}@{self.rate}"
+            try:
+                self.phrase_cache = PhraseCache(
+                    config.PHRASE_CACHE_PATH, config.PHRASE_CACHE_MAX_BYTES, config.PHRASE_CACHE_MEMORY_BYTES, voice
+                )
+            except Exception as e:
+                logger.warning(f"Phrase cache unavailable: {e}")
+
+    def _synthesize(self, text):
+        """Render text to PCM with the engine."""
+        with metrics.timer("tts_render"):
+            if os.path.exists(self._render_path):
+                os.remove(self._render_path)  # An engine that writes nothing must not replay the last rendering
+            self._rendering = True
+            try:
+                self._engine.save_to_file(text, self._render_path)
+                self._engine.runAndWait()
+            finally:
+                self._rendering = False
+            with wave.open(self._render_path, "rb") as wav:
+                return PhraseAudio(wav.readframes(wav.getnframes()), wav.getframerate(), wav.getnchannels(), wav.getsampwidth())
+
+    def _cached_phrase(self, text):
+        audio = self.phrase_cache.get(text)
+        if audio is None:
+            audio = trim_silence(self._synthesize(text))
+            self.phrase_cache.put(text, audio)
+        return audio
+
+    def _render(self, text, cached):
+        """PCM for one chunk: joined cached fragments for cached requests, a fresh rendering otherwise."""
+        fragments = split_fragments(text) if cached and self.phrase_cache is not None else []
+        if not fragments:
+            return self._synthesize(text)
+        parts = [self._cached_phrase(fragment) for fragment, _ in fragments]
+        return concatenate(parts, [pause for _, pause in fragments])
+
+    def _prerender_one(self):
+        with self._condition:
+            if not self._prerender:
+                return
+            text = self._prerender.popleft()
+        try:
+            for fragment, _ in split_fragments(text):
+                if fragment not in self.phrase_cache:
+                    self._cached_phrase(fragment)
+        except (OSError, EOFError, wave.Error, RuntimeError) as e:
+            # The next request falls back to direct speech if rendering is broken for good
+            logger.warning(f"Could not prerender {text!r}: {e}")
+            with self._condition:
+                self._prerender.clear()
+
+    def _speak_direct(self, request):
+        """Let the engine speak the chunks itself. Returns True if pre-empted."""
+        while not request.cancelled:
+            if not request.chunks:
+                if request.closed:
+                    break
+                if self._interrupt:
+                    # Let urgent speech through while waiting for more streamed text
+                    return True
+                request.wait_for_chunk(timeout=0.1)
+                continue
+            self._engine.say(request.chunks[0])
+            self._engine.runAndWait()
+            if self._interrupt:
+                return not request.cancelled
+            request.chunks.popleft()
+        return False
+
+    def _speak_rendered(self, request):
+        """
+        Play rendered chunks, synthesizing the next chunk while the current one plays.
+        Returns True if pre-empted.
+        """
+        upcoming = None  # (chunk text, audio) rendered ahead
+        previous_end = None
+        while not request.cancelled:
+            if not request.chunks:
+                if request.closed:
+                    break
+                if self._interrupt:
+                    return True
+                request.wait_for_chunk(timeout=0.1)
+                continue
+            text = request.chunks[0]
+            audio = upcoming[1] if upcoming and upcoming[0] is text else self._render(text, request.cached)
+            upcoming = None
+            if self._interrupt:
+                return not request.cancelled
+
+            def on_start(previous_end=previous_end):
+                self._audio_started()
+                if previous_end is not None:
+                    self.chunk_gaps.append(time.monotonic() - previous_end)
+                    metrics.record("tts_chunk_gap", time.monotonic() - previous_end)
+
+            self._player.play(audio, on_start)
+            completed = None
+            while completed is None:
+                if upcoming is None and len(request.chunks) > 1 and not self._interrupt:
+                    # Look-ahead: the next chunk is ready by the time this one ends
+                    upcoming = (request.chunks[1], self._render(request.chunks[1], request.cached))
+                    continue
+                completed = self._player.wait(timeout=0.05)
+            if self._interrupt:
+                return not request.cancelled
+            previous_end = self._player.finished_at
+            request.chunks.popleft()
+        return False
+
+    def _run(self):
+        # The engine lives on this thread; pyttsx3 drivers are not thread-safe
+        try:
+            self._engine = pyttsx3.init()
+            self._engine.setProperty('rate', self.rate)
+            self._engine.connect('started-utterance', self._on_utterance_started)
+            self._engine.connect('started-word', self._on_word)
+            self._setup_playback()
+        except Exception as e:
+            logger.error(f"Failed to initialize TTS engine: {e}")
+            with self._condition:
+                self.error = e
+                for _, _, request in self._queue:
+                    self._drop(request)
+                self._queue = []
+                self._condition.notify_all()
+            return
+        finally:
+            self.ready.set()
+
+        while True:
+            request = self._next_request()
+            if request is None:
+                self._prerender_one()
+                continue
+            if request.cancelled or request.expired():
+                with self._condition:
+                    self._drop(request)
+                self._finish(request)
+                continue
+
+            preempted = False
+            try:
+                if self._player is not None:
+                    try:
+                        preempted = self._speak_rendered(request)
+                    except (OSError, EOFError, wave.Error, AttributeError, NotImplementedError) as e:
+                        # The engine cannot render to a file here: let it speak for itself from now on
+                        logger.warning(f"Rendering speech failed, the TTS engine speaks directly: {e}")
+                        self._player = None
+                        self.phrase_cache = None
+                        preempted = self._speak_direct(request)
+                else:
+                    preempted = self._speak_direct(request)
+            except RuntimeError as e:
+                logger.error(f"Error in speech engine: {e}")
+
+            if preempted:
+                # Resume from the interrupted chunk once the urgent request is spoken
+                with self._condition:
+                    self.preempted += 1
+                    heapq.heappush(self._queue, (request.priority, request.sequence, request))
+                    self._current = None
+                continue
+
+            if not request.cancelled:
+                self.spoken += 1
+            self._finish(request)
+
+
+# Shared instance used by every module
+speech_service = SpeechService()
@@ -1,13 +1,17 @@
 import os
 import speech_recognition as sr
 from vosk import Model, KaldiRecognizer
-import pyaudio
 import json
 import logging
 import time
 import threading
+from collections import deque
 import config
-import pyttsx3
+from speech_output import speech_service, PRIORITY_COMMAND, PRIORITY_ANSWER
+from audio_stream import shared_stream
+from vad import VoiceActivityDetector, listen_for_segment
+from command_spotter import CommandSpotter
+from metrics import metrics
 import sys
 
 
@@ -15,13 +19,19 @@ import sys
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize TTS engine with interruption support
-engine = pyttsx3.init()
-engine.setProperty('rate', 180)  # Adjust speech rate
-
 # Initialize SpeechRecognition (Google API)
+# Audio comes from the shared microphone stream; only VAD speech segments are sent
 recognizer = sr.Recognizer()
-mic = sr.Microphone()
+
+# Recognizer usage, to see how much the VAD gate saves
+asr_stats = {"google_requests": 0, "vosk_segments": 0}
+
+def recognize_segment_google(segment):
+    """Send one VAD speech segment to the Google API and return the lowercased text."""
+    asr_stats["google_requests"] += 1
+    audio = sr.AudioData(segment.samples.tobytes(), shared_stream.sample_rate, 2)
+    with metrics.timer("asr_google"):
+        return recognizer.recognize_google(audio).lower()
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -31,193 +41,338 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-# Initialize Vosk Model (Offline)
+# Vosk Model (Offline), loaded in the background at startup
 # model = Model(r"B:\final_year\execute\model")  # Path to Vosk model
 model_path = resource_path("model")
+model = None
+vosk_recognizer = None
 
-try:
-    model = Model(model_path)
-    vosk_recognizer = KaldiRecognizer(model, 16000)
-except Exception as e:
-    logger.error(f"Failed to initialize Vosk model: {e}")
-    model = None
-    vosk_recognizer = None
+def load_vosk_model():
+    """Load the Vosk model. Until it is ready, commands fall back to the Google API."""
+    global model, vosk_recognizer
+    if model is not None:
+        return
+    new_model = Model(model_path)
+    vosk_recognizer = KaldiRecognizer(new_model, 16000)
+    model = new_model
+    # Build the grammar recognizers now rather than on the first utterance
+    get_command_spotter()
+    get_interrupt_spotter()
 
+command_spotter = None
+interrupt_spotter = None
+interrupt_latencies = deque(maxlen=50)  # Seconds from interrupt keyword to silence
 
-def chunk_text(text):
-    """Split text into natural speaking chunks"""
-    chunks = []
+
+def stream_chunks(pieces):
+    """
+    Split text arriving in pieces (e.g. streamed tokens) into natural speaking chunks,
+    yielding each chunk as soon as it is complete.
+    """
     current_chunk = []
-    for word in text.split():
-        current_chunk.append(word)
-        if len(current_chunk) >= 12 or word[-1] in '.!?':
-            chunks.append(' '.join(current_chunk))
-            current_chunk = []
+    partial = ""  # Last word of the text so far, which may continue in the next piece
+
+    def add_words(words):
+        for word in words:
+            current_chunk.append(word)
+            if len(current_chunk) >= 12 or word[-1] in '.!?':
+                yield ' '.join(current_chunk)
+                current_chunk.clear()
+
+    for piece in pieces:
+        text = partial + piece
+        words = text.split()
+        if words and not text[-1].isspace():
+            partial = words.pop()
+        else:
+            partial = ""
+        yield from add_words(words)
+    yield from add_words(partial.split())
     if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    return chunks
+        yield ' '.join(current_chunk)
 
 
-def speak_with_interruption(text):
-    """Speak text with interruption support"""
-    stop_event = threading.Event()
-    is_speaking = [True]  # Using a mutable list for thread-safe flag
+def chunk_text(text):
+    """Split text into natural speaking chunks"""
+    return list(stream_chunks([text]))
 
-    def background_listener():
-        """Continuous background listener for stop commands"""
+
+def get_interrupt_spotter():
+    """Grammar-restricted Vosk recognizer for config.INTERRUPT_KEYWORDS, created on first use."""
+    global interrupt_spotter
+    if interrupt_spotter is None and model is not None:
+        interrupt_spotter = CommandSpotter(model, config.INTERRUPT_KEYWORDS)
+    return interrupt_spotter
+
+class InterruptListener:
+    """
+    Background listener for interrupt keywords while the assistant is speaking.
+    Keywords are spotted offline on the shared audio stream; the Google API is
+    only used if the Vosk model is missing.
+    """
+
+    def __init__(self, on_interrupt):
+        self.on_interrupt = on_interrupt
+        self.triggered = threading.Event()
+        self.heard_at = None  # time.monotonic() at which the keyword audio was captured
+        self.keyword = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+    def _trigger(self, keyword, heard_at):
+        self.keyword = keyword
+        self.heard_at = heard_at
+        self.triggered.set()
+        self.on_interrupt()
+        print(f"\nInterruption detected! ({keyword})")
+
+    def _run(self):
         try:
-            with sr.Microphone() as source:
-                recognizer.adjust_for_ambient_noise(source)
-                while is_speaking[0]:
-                    try:
-                        audio = recognizer.listen(source, timeout=1, phrase_time_limit=1)
-                        interrupt_text = recognizer.recognize_google(audio).lower()
-                        if any(kw in interrupt_text for kw in ["stop response", "cancel", "shut up","stop"]):
-                            stop_event.set()
-                            
-                            print("\nInterruption detected!")
-         
-                            return  # Exit the listener thread
-                    except (sr.WaitTimeoutError, sr.UnknownValueError):
-                        continue
+            spotter = get_interrupt_spotter()
+            if spotter is None:
+                self._run_google()
+                return
+            reader = shared_stream.reader(preroll=0)
+            vad = VoiceActivityDetector(sample_rate=shared_stream.sample_rate, start_sample=reader.position)
+            spotter.reset()
+            while self._running:
+                speech, finished = vad.process(reader.read_samples(800, timeout=0.5), shared_stream.noise_floor)
+                if len(speech):
+                    keyword = spotter.feed(speech)
+                    if keyword:
+                        self._trigger(keyword, shared_stream.sample_time(reader.position))
+                        return  # Exit the listener thread
+                if finished:
+                    spotter.reset()
         except Exception as e:
             print(f"Listener error: {e}")
 
+    def _run_google(self):
+        reader = shared_stream.reader()
+        while self._running:
+            try:
+                # Only actual speech reaches the cloud API, not every second of audio
+                segment = listen_for_segment(reader, timeout=1, phrase_time_limit=2)
+                if segment is None:
+                    continue
+                interrupt_text = recognize_segment_google(segment)
+                keyword = next((kw for kw in config.INTERRUPT_KEYWORDS if kw in interrupt_text), None)
+                if keyword:
+                    self._trigger(keyword, time.monotonic())
+                    return
+            except (sr.WaitTimeoutError, sr.UnknownValueError):
+                continue
+
+def report_interrupt(listener, request):
+    """Record how long it took from the spoken keyword until the speech stopped."""
+    request.wait()
+    latency = time.monotonic() - listener.heard_at
+    interrupt_latencies.append(latency)
+    print(f"Interrupt latency: {latency * 1000:.0f} ms")
 
-        # Start background listener thread
-    listener_thread = threading.Thread(target=background_listener, daemon=True)
-    listener_thread.start()
+def interrupt_stats():
+    """Median and worst interrupt latency of recent interruptions, in milliseconds."""
+    latencies = sorted(interrupt_latencies)
+    if not latencies:
+        return {"count": 0}
+    return {
+        "count": len(latencies),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
 
-    # Split text into natural chunks
-    chunks = chunk_text(text)
+def speak_with_interruption(text):
+    """Speak text with interruption support"""
+    # Queue natural chunks; the speech service can stop mid-chunk on cancel
+    request = speech_service.speak(chunks=chunk_text(text), priority=PRIORITY_ANSWER)
+    listener = InterruptListener(on_interrupt=request.cancel).start()
 
     try:
-        for chunk in chunks:
-            if stop_event.is_set():
-                break
-            engine.say(chunk)
-            engine.runAndWait()
-            time.sleep(0.1)  # Brief pause between chunks
+        request.wait()
 
         # Speak confirmation message after interruption is detected
-        if stop_event.is_set():
-            engine.say("okk i will stop")
-            engine.runAndWait()
+        if listener.triggered.is_set():
+            report_interrupt(listener, request)
+            speech_service.speak("okk i will stop", priority=PRIORITY_COMMAND, cached=True).wait()
+
+    finally:
+        listener.stop()
+
+def speak_stream_with_interruption(chunks, on_interrupt=None):
+    """
+    Speak chunks from an iterator as they arrive, with interruption support.
+    Args:
+        chunks: iterator of text chunks (e.g. a streamed Gemini answer); it is closed
+                on interruption so the remaining generation is cancelled
+        on_interrupt: Also called on interruption, e.g. to cancel a query still waiting for its answer
+    Returns:
+        bool: True if any text was produced
+    """
+    request = speech_service.speak(priority=PRIORITY_ANSWER, streaming=True)
+
+    def interrupt():
+        request.cancel()
+        if on_interrupt:
+            on_interrupt()
+
+    listener = InterruptListener(on_interrupt=interrupt).start()
+    produced = [False]
+
+    def producer():
+        try:
+            for chunk in chunks:
+                if request.cancelled:
+                    break
+                produced[0] = True
+                request.add_chunk(chunk)
+        except Exception as e:
+            logger.error(f"Error while streaming answer: {e}")
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()  # Stops the remaining generation if we broke out early
+            request.close()
 
-    except RuntimeError as e:
-        print(f"Error in speech engine: {e}")
+    producer_thread = threading.Thread(target=producer, daemon=True)
+    producer_thread.start()
+
+    try:
+        request.wait()
+
+        # Speak confirmation message after interruption is detected
+        if listener.triggered.is_set():
+            report_interrupt(listener, request)
+            speech_service.speak("okk i will stop", priority=PRIORITY_COMMAND, cached=True).wait()
 
     finally:
-        is_speaking[0] = False
-        listener_thread.join()
+        listener.stop()
+    return produced[0]
+
+def get_command_spotter():
+    """Grammar-restricted Vosk recognizer for VOICE_COMMANDS, created on first use."""
+    global command_spotter
+    if command_spotter is None and model is not None:
+        command_spotter = CommandSpotter(
+            model, [entry[0] for entry in VOICE_COMMANDS], early=EARLY_COMMANDS, ordinary=ORDINARY_STARTS
+        )
+    return command_spotter
+
+def listen_for_utterance(timeout=10, block_size=1600):
+    """
+    Listen for one utterance, spotting fixed commands while it is still being spoken.
+    Returns:
+        tuple: (command, None) as soon as a known command is unambiguous,
+               (None, SpeechSegment) for anything else once the utterance ends,
+               (None, None) if nobody spoke before the timeout
+    """
+    spotter = get_command_spotter()
+    reader = shared_stream.reader()
+    vad = VoiceActivityDetector(
+        sample_rate=shared_stream.sample_rate,
+        max_segment_seconds=timeout,
+        start_sample=reader.position
+    )
+    if spotter:
+        spotter.reset()
+    deadline = time.monotonic() + timeout
+    while True:
+        if not vad.in_speech and time.monotonic() > deadline:
+            return None, None
+        speech, finished = vad.process(reader.read_samples(block_size, timeout=0.5), shared_stream.noise_floor)
+        if spotter and len(speech):
+            command = spotter.feed(speech)
+            if command:
+                return command, None
+        if finished:
+            command = spotter.finish() if spotter else None
+            return command, (None if command else finished[0])
+
+def transcribe_segment_vosk(segment):
+    """Transcribe a speech segment with the full-vocabulary Vosk recognizer."""
+    if not model or not vosk_recognizer:
+        logger.error("Vosk model not initialized")
+        return None
+    asr_stats["vosk_segments"] += 1
+    with metrics.timer("asr_vosk"):
+        vosk_recognizer.Reset()
+        vosk_recognizer.AcceptWaveform(segment.samples.tobytes())
+        command = json.loads(vosk_recognizer.FinalResult()).get("text", "").lower().strip()
+    if command:
+        print(f"User said (Vosk, {segment.start:.2f}-{segment.end:.2f}s):", command)
+        return command
+    return None
 
 def get_voice_input(prefer_online=True, timeout=10):
+    """
+    Listen for one utterance. Known commands are recognised offline while they are spoken;
+    only open-ended queries go to the Google API (or the full Vosk recognizer as fallback).
+    """
+    print("Listening...")
+    command, segment = listen_for_utterance(timeout)
+    if command:
+        metrics.question_heard()
+        print("User said (command):", command)
+        return command
+    if segment is None:
+        print("Listening timed out.")
+        return None
+    # End-to-end latency counts from the moment the user stopped speaking
+    metrics.question_heard(shared_stream.sample_time(round(segment.end * shared_stream.sample_rate)))
+
     if prefer_online:
         try:
-            with sr.Microphone() as source:
-                print("Listening (Google API)...")
-                recognizer.adjust_for_ambient_noise(source, duration=1)
-                audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=timeout)
-                command = recognizer.recognize_google(audio).lower()
-                print("User said (Google):", command)
-                return command
+            command = recognize_segment_google(segment)
+            print(f"User said (Google, {segment.start:.2f}-{segment.end:.2f}s):", command)
+            return command
         except sr.UnknownValueError:
             print("Google API: Sorry, could not understand.")
         except sr.RequestError:
             print("Google API: Request failed, switching to Vosk.")
-        except sr.WaitTimeoutError:
-            print("Google API: Listening timed out.")
         except Exception as e:
             print(f"Unexpected error with Google API: {e}")
 
-    # If Google API fails or prefer_online=False, use Vosk
-    return get_voice_input_vosk()
+    # If Google API fails or prefer_online=False, use Vosk on the same audio
+    return transcribe_segment_vosk(segment)
 
-def get_voice_input_vosk():
-    """
-    Capture and return voice input using Vosk (offline) with continuous listening.
-    """
-    if not model or not vosk_recognizer:
-        logger.error("Vosk model not initialized")
-        return None
+# Voice commands: (phrase, action, spoken confirmation), checked in order
+VOICE_COMMANDS = [
+    ("switch to back", lambda: config.switch_mode("on_demand"), "i will got to on demand mode"),
+    ("switch to next", lambda: config.switch_mode("continuous"), "now you are in continuous mode"),
+    ("stop recognition", lambda: config.toggle_recognition(False), "Object recognition disabled"),
+    ("start recognition", lambda: config.toggle_recognition(True), "Object recognition enabled"),
+    ("stop query", lambda: config.toggle_gemini(False), "Gemini AI disabled"),
+    ("start query", lambda: config.toggle_gemini(True), "Gemini AI enabled"),
+    ("shut down assistant", config.request_shutdown, "Shutting down"),
+]
+
+# Commands that are harmless to run on a prefix before the phrase is finished (never shutting down)
+EARLY_COMMANDS = ["switch to back", "switch to next", "stop recognition", "start recognition", "stop query", "start query"]
+# Word sequences that also begin everyday speech, so they never trigger a command early
+ORDINARY_STARTS = ["switch to", "shut down", "stop", "start"]
+
+def match_voice_command(command):
+    """Return the (phrase, action, confirmation) entry matching the command, or None."""
+    for entry in VOICE_COMMANDS:
+        if entry[0] in command:
+            return entry
+    return None
 
-    pa = pyaudio.PyAudio()
-    stream = None
-    try:
-        stream = pa.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=16000,
-            input=True,
-            frames_per_buffer=4096
-        )
-        stream.start_stream()
-        
-        print("Listening (Vosk) - Say something or press Ctrl+C to stop...")
-        vosk_recognizer.Reset()  # Reset the recognizer before starting
-        
-        while True:
-            try:
-                data = stream.read(4096, exception_on_overflow=False)
-                if vosk_recognizer.AcceptWaveform(data):
-                    result = json.loads(vosk_recognizer.Result())
-                    command = result.get("text", "").lower().strip()
-                    if command:
-                        print("User said (Vosk):", command)
-                        return command
-            except KeyboardInterrupt:
-                print("\nListening stopped by user.")
-                return None
-            
-    except Exception as e:
-        logger.error(f"Vosk recognition error: {e}")
-        return None
-    finally:
-        # Carefully check and close the stream
-        if stream and stream.is_active():
-            try:
-                stream.stop_stream()
-                stream.close()
-            except Exception as e:
-                logger.error(f"Error closing stream: {e}")
-        pa.terminate()
-        
- 
 def process_voice_command(command):
     """Process user voice commands to switch modes and provide voice feedback."""
-    if "switch to back" in command:
-        config.switch_mode("on_demand")
-        engine.say("i will got to on demand mode")
-        engine.runAndWait()
-    elif "switch to next" in command:
-        config.switch_mode("continuous")
-        engine.say("now you are in continuous mode")
-        engine.runAndWait()
-    elif "stop recognition" in command:
-        config.toggle_recognition(False)
-        engine.say("Object recognition disabled")
-        engine.runAndWait()
-    elif "start recognition" in command:
-        config.toggle_recognition(True)
-        engine.say("Object recognition enabled")
-        engine.runAndWait()
-    elif "stop query" in command:
-        config.toggle_gemini(False)
-        engine.say("Gemini AI disabled")
-        engine.runAndWait()
-    elif "start query" in command:
-        config.toggle_gemini(True)
-        engine.say("Gemini AI enabled")
-        engine.runAndWait()
-
-def listen_for_mode_switch():
-    """Continuously listen for the switch command in a background thread."""
-    while True:
-        command = get_voice_input()
-        if command:
-            process_voice_command(command)
-
-def start_listening_thread():
-    """Start a background thread for voice input in Continuous Mode."""
-    thread = threading.Thread(target=listen_for_mode_switch, daemon=True)
-    thread.start()
\ No newline at end of file
+    entry = match_voice_command(command)
+    if entry:
+        _, action, confirmation = entry
+        action()
+        speech_service.speak(confirmation, priority=PRIORITY_COMMAND, cached=True)
+
+def command_phrases():
+    """Everything spoken in reply to a command, to render into the phrase cache ahead of time."""
+    return [entry[2] for entry in VOICE_COMMANDS] + ["okk i will stop"]
@@ -0,0 +1,106 @@
+# startup.py
+"""
+Deferred, concurrent initialization of the heavy subsystems.
+
+Nothing expensive happens at import time any more. main() opens the camera
+first and then starts every registered loader on its own thread, so the
+YOLO network, the Vosk model, the TTS engine, the microphone and the
+Gemini client load side by side while video is already flowing. Each
+subsystem reports readiness on its own; a loader that fails is logged and
+leaves that feature unavailable instead of crashing the application.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Subsystem:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.ready = threading.Event()  # Set when loading finished, successfully or not
+        self.error = None
+        self.started_at = None
+        self.duration = None
+
+    @property
+    def ok(self):
+        return self.ready.is_set() and self.error is None
+
+    def load(self):
+        self.started_at = time.monotonic()
+        try:
+            self.loader()
+        except Exception as e:
+            self.error = e
+            logger.error(f"Failed to initialize {self.name}: {e}")
+        finally:
+            self.duration = time.monotonic() - self.started_at
+            self.ready.set()
+
+
+class Startup:
+    def __init__(self):
+        self.subsystems = {}
+        self.timings = {}  # Steps timed outside the loaders (e.g. opening the camera)
+        self.started_at = time.monotonic()
+        self._threads = []
+
+    def register(self, name, loader):
+        self.subsystems[name] = Subsystem(name, loader)
+
+    def record(self, name, seconds):
+        self.timings[name] = seconds
+
+    def start(self):
+        """Run every registered loader concurrently in the background."""
+        for subsystem in self.subsystems.values():
+            thread = threading.Thread(target=subsystem.load, name=f"init-{subsystem.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._log_when_done, name="init-report", daemon=True).start()
+
+    def is_ready(self, name):
+        """True once the named subsystem loaded successfully."""
+        subsystem = self.subsystems.get(name)
+        return subsystem is not None and subsystem.ok
+
+    def wait(self, name, timeout=None):
+        """Wait for a subsystem to finish loading. Returns True if it is usable."""
+        subsystem = self.subsystems.get(name)
+        if subsystem is None:
+            return False
+        subsystem.ready.wait(timeout)
+        return subsystem.ok
+
+    def wait_all(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for subsystem in self.subsystems.values():
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            subsystem.ready.wait(remaining)
+
+    def report(self):
+        """Timing breakdown in milliseconds, with readiness of every subsystem."""
+        result = {name: {"ms": round(seconds * 1000, 1), "ok": True} for name, seconds in self.timings.items()}
+        for name, subsystem in self.subsystems.items():
+            result[name] = {
+                "ms": round(subsystem.duration * 1000, 1) if subsystem.duration is not None else None,
+                "ok": subsystem.ok,
+                "ready": subsystem.ready.is_set(),
+            }
+        return result
+
+    def _log_when_done(self):
+        self.wait_all()
+        total = time.monotonic() - self.started_at
+        parts = ", ".join(
+            f"{name} {entry['ms']:.0f} ms{'' if entry['ok'] else ' (failed)'}"
+            for name, entry in self.report().items()
+        )
+        logger.info(f"Startup finished in {total * 1000:.0f} ms: {parts}")
+
+
+# Shared instance; subsystems register their loaders in main.py
+startup = Startup()
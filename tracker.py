@@ -0,0 +1,279 @@
+# tracker.py
+"""
+Instance-level object tracker.
+
+Detections are matched to existing tracks by IoU (per class, greedy on the
+highest overlap), so two chairs stay two tracks with stable IDs. All track
+state lives in preallocated NumPy arrays indexed by slot; an update only
+touches the matched, missed and newly created slots.
+
+After every update the tracker publishes an immutable SpatialSnapshot:
+each object bucketed once into a column (left/middle/right by box centre),
+a row of the 3x3 grid and a relative distance from its size, plus an index
+of labels for every combination of those. Readers such as the spoken
+queries take the current snapshot without locking and answer from the
+index with one dictionary lookup. Subscribers (e.g. the continuous-mode
+announcer) are called with each new snapshot.
+"""
+import itertools
+import time
+from collections import namedtuple
+from threading import Lock
+from types import MappingProxyType
+import numpy as np
+
+DEFAULT_CAPACITY = 64
+IOU_THRESHOLD = 0.3
+MAX_MISSES = 2         # Inferences a track may go undetected before it is dropped
+VELOCITY_SMOOTHING = 0.5
+
+COLUMNS = ("left", "middle", "right")
+ROWS = ("top", "middle", "bottom")
+DISTANCES = ("close", "near", "far")
+# Relative distance from the box size: sqrt(box area / frame area)
+CLOSE_SIZE = 0.4
+NEAR_SIZE = 0.15
+
+SpatialObject = namedtuple("SpatialObject", ["id", "label", "box", "column", "row", "distance", "size"])
+
+
+class SpatialSnapshot(namedtuple("SpatialSnapshot", ["version", "timestamp", "width", "height", "objects", "index"])):
+    """
+    Immutable view of the tracked objects at one update.
+    index maps (column, row, distance), each None for "any", to a tuple of labels.
+    """
+    __slots__ = ()
+
+    def labels(self, column=None, row=None, distance=None):
+        """Labels of the objects in a column, grid row and/or distance bucket (None matches all)."""
+        return self.index.get((column, row, distance), ())
+
+
+def build_snapshot(version, timestamp, frame_size, objects):
+    """
+    Bucket tracked objects and index them.
+    Args:
+        version (int): Update counter of the tracker
+        timestamp (float): Time of the update
+        frame_size (tuple): (width, height) of the frames the boxes refer to
+        objects (list): (id, label, box) per active track, box as (x, y, w, h)
+    Returns:
+        SpatialSnapshot
+    """
+    width, height = frame_size
+    spatial = []
+    index = {}
+    for track_id, label, box in objects:
+        x, y, w, h = box
+        centre_x, centre_y = x + w / 2, y + h / 2
+        column = COLUMNS[min(2, max(0, int(3 * centre_x / width)))]
+        row = ROWS[min(2, max(0, int(3 * centre_y / height)))]
+        size = float(np.sqrt(max(w, 0) * max(h, 0) / (width * height)))
+        distance = "close" if size >= CLOSE_SIZE else "near" if size >= NEAR_SIZE else "far"
+        spatial.append(SpatialObject(track_id, label, box, column, row, distance, round(size, 3)))
+        # Every combination of specific and "any" keys, so a query is one lookup
+        for key in itertools.product((column, None), (row, None), (distance, None)):
+            index.setdefault(key, []).append(label)
+    index = MappingProxyType({key: tuple(labels) for key, labels in index.items()})
+    return SpatialSnapshot(version, timestamp, width, height, tuple(spatial), index)
+
+
+EMPTY_SNAPSHOT = SpatialSnapshot(0, None, None, None, (), MappingProxyType({}))
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) and (M, 4) arrays of [x, y, w, h] boxes."""
+    ax1, ay1 = boxes_a[:, 0:1], boxes_a[:, 1:2]
+    ax2, ay2 = ax1 + boxes_a[:, 2:3], ay1 + boxes_a[:, 3:4]
+    bx1, by1 = boxes_b[:, 0], boxes_b[:, 1]
+    bx2, by2 = bx1 + boxes_b[:, 2], by1 + boxes_b[:, 3]
+
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    intersection = inter_w * inter_h
+    area_a = boxes_a[:, 2:3] * boxes_a[:, 3:4]
+    area_b = boxes_b[:, 2] * boxes_b[:, 3]
+    union = area_a + area_b - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+class ObjectTracker:
+    """Thread-safe IoU tracker with array-backed per-track state."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, iou_threshold=IOU_THRESHOLD, max_misses=MAX_MISSES):
+        self.lock = Lock()
+        self.capacity = capacity
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+
+        self.active = np.zeros(capacity, dtype=bool)
+        self.track_ids = np.zeros(capacity, dtype=np.int64)
+        self.class_ids = np.full(capacity, -1, dtype=np.int32)
+        self.boxes = np.zeros((capacity, 4), dtype=np.float32)     # [x, y, w, h], predicted between inferences
+        self.centres = np.zeros((capacity, 2), dtype=np.float32)   # Last measured box centre
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)  # Centre pixels per second
+        self.confidence = np.zeros(capacity, dtype=np.float32)
+        self.hits = np.zeros(capacity, dtype=np.int32)             # Inferences the track was detected in
+        self.misses = np.zeros(capacity, dtype=np.int32)           # Consecutive inferences without a match
+        self.first_seen = np.zeros(capacity, dtype=np.float64)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.labels = [None] * capacity
+
+        self.next_id = 1
+        self.last_update = None   # time.monotonic() when detections were last confirmed
+        self.last_refresh = None  # time.monotonic() when boxes were last moved, by a detection or refresh()
+        self.frame_size = None    # (width, height) of the frames being tracked
+        self._snapshot = EMPTY_SNAPSHOT
+        self._subscribers = []
+
+    def update_objects(self, new_detections, now=None, frame_size=None):
+        """
+        Match one inference worth of detections against the current tracks.
+        Args:
+            new_detections (list): dicts with "label", "class_id", "box" (x, y, w, h) and "confidence"
+            now (float): Time of the frame in seconds, e.g. its position in a recording (default time.monotonic())
+            frame_size (tuple): (width, height) of the frame, needed for the spatial snapshot
+        """
+        now = time.monotonic() if now is None else now
+        count = len(new_detections)
+        det_boxes = np.array([d["box"] for d in new_detections], dtype=np.float32).reshape(count, 4)
+        det_classes = np.array([d["class_id"] for d in new_detections], dtype=np.int32)
+        det_confidence = np.array([d["confidence"] for d in new_detections], dtype=np.float32)
+
+        with self.lock:
+            if frame_size is not None:
+                self.frame_size = frame_size
+            self.last_update = now
+            self.last_refresh = now
+            slots = np.flatnonzero(self.active)
+            matched_slots, matched_dets = self._match(slots, det_boxes, det_classes)
+
+            if len(matched_slots):
+                centres = det_boxes[matched_dets, :2] + det_boxes[matched_dets, 2:] / 2
+                elapsed = (now - self.last_seen[matched_slots])[:, None]
+                measured = (centres - self.centres[matched_slots]) / np.maximum(elapsed, 1e-3)
+                self.velocity[matched_slots] = (
+                    VELOCITY_SMOOTHING * self.velocity[matched_slots] + (1 - VELOCITY_SMOOTHING) * measured
+                )
+                self.boxes[matched_slots] = det_boxes[matched_dets]
+                self.centres[matched_slots] = centres
+                self.confidence[matched_slots] = det_confidence[matched_dets]
+                self.hits[matched_slots] += 1
+                self.misses[matched_slots] = 0
+                self.last_seen[matched_slots] = now
+
+            missed = np.setdiff1d(slots, matched_slots, assume_unique=True)
+            if len(missed):
+                self.misses[missed] += 1
+                self.active[missed[self.misses[missed] > self.max_misses]] = False
+
+            new_dets = np.setdiff1d(np.arange(count), matched_dets, assume_unique=True)
+            if len(new_dets):
+                # Keep the most confident new objects if we run out of slots
+                new_dets = new_dets[np.argsort(-det_confidence[new_dets], kind="stable")]
+                free = np.flatnonzero(~self.active)[:len(new_dets)]
+                new_dets = new_dets[:len(free)]
+                self.active[free] = True
+                self.track_ids[free] = np.arange(self.next_id, self.next_id + len(free))
+                self.next_id += len(free)
+                self.class_ids[free] = det_classes[new_dets]
+                self.boxes[free] = det_boxes[new_dets]
+                self.centres[free] = det_boxes[new_dets, :2] + det_boxes[new_dets, 2:] / 2
+                self.velocity[free] = 0
+                self.confidence[free] = det_confidence[new_dets]
+                self.hits[free] = 1
+                self.misses[free] = 0
+                self.first_seen[free] = now
+                self.last_seen[free] = now
+                for slot, det in zip(free, new_dets):
+                    self.labels[slot] = new_detections[det]["label"]
+            self._publish(now)
+        self._notify()
+
+    def _match(self, slots, det_boxes, det_classes):
+        """Greedy IoU matching of same-class boxes. Returns (slot indices, detection indices)."""
+        if not len(slots) or not len(det_boxes):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        iou = iou_matrix(self.boxes[slots], det_boxes)
+        iou[self.class_ids[slots][:, None] != det_classes[None, :]] = 0.0
+
+        matched_slots, matched_dets = [], []
+        for _ in range(min(iou.shape)):
+            row, col = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[row, col] < self.iou_threshold:
+                break
+            matched_slots.append(slots[row])
+            matched_dets.append(col)
+            iou[row, :] = 0.0
+            iou[:, col] = 0.0
+        return np.array(matched_slots, dtype=np.intp), np.array(matched_dets, dtype=np.intp)
+
+    def refresh(self):
+        """Advance boxes by their velocity on a frame where inference was skipped."""
+        now = time.monotonic()
+        with self.lock:
+            if self.last_update is None:
+                return
+            # last_update stays at the last detection so age() keeps reporting staleness
+            elapsed = now - self.last_refresh
+            self.last_refresh = now
+            active = self.active
+            self.boxes[active, :2] += self.velocity[active] * elapsed
+            self._publish(now)
+        self._notify()
+
+    def _publish(self, now):
+        """Replace the spatial snapshot (called with the lock held)."""
+        if self.frame_size is None:
+            return
+        objects = [
+            (int(self.track_ids[slot]), self.labels[slot], tuple(int(v) for v in self.boxes[slot]))
+            for slot in np.flatnonzero(self.active)
+        ]
+        # A single reference assignment: readers see the old or the new snapshot, never a mix
+        self._snapshot = build_snapshot(self._snapshot.version + 1, now, self.frame_size, objects)
+
+    def _notify(self):
+        """Hand the current snapshot to the subscribers (called without the lock)."""
+        snapshot = self._snapshot
+        if snapshot is not EMPTY_SNAPSHOT:
+            for callback in self._subscribers:
+                callback(snapshot)
+
+    def subscribe(self, callback):
+        """Call callback(snapshot) after every update, on the updating thread, so keep it cheap."""
+        self._subscribers.append(callback)
+
+    def snapshot(self):
+        """The latest SpatialSnapshot; lock-free and safe to keep, it never changes."""
+        return self._snapshot
+
+    def age(self):
+        """Seconds since the tracked objects were last confirmed, or None if never."""
+        with self.lock:
+            if self.last_update is None:
+                return None
+            return time.monotonic() - self.last_update
+
+    def tracks(self):
+        """Return a list of dicts describing every active track."""
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "id": int(self.track_ids[slot]),
+                    "label": self.labels[slot],
+                    "class_id": int(self.class_ids[slot]),
+                    "box": tuple(int(v) for v in self.boxes[slot]),
+                    "confidence": float(self.confidence[slot]),
+                    "velocity": (float(self.velocity[slot, 0]), float(self.velocity[slot, 1])),
+                    "hits": int(self.hits[slot]),
+                    "misses": int(self.misses[slot]),
+                    "age": now - self.first_seen[slot],
+                }
+                for slot in np.flatnonzero(self.active)
+            ]
+
+    def __len__(self):
+        with self.lock:
+            return int(self.active.sum())
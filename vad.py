@@ -0,0 +1,314 @@
+# vad.py
+"""
+Lightweight voice activity detection for 16 kHz int16 audio.
+
+Audio is cut into 30 ms frames. A frame counts as speech if its RMS energy
+is well above the noise floor, or moderately above it with a high
+zero-crossing rate (unvoiced sounds like "s" and "f"). A hangover keeps a
+segment open through short pauses between words, and a short pre-roll is
+kept so word onsets are not clipped. Only speech audio is handed to the
+recognizers, together with start/end timestamps for every segment.
+
+Run on a WAV file to inspect the segments it finds:
+    python vad.py recording.wav
+
+Check the segment boundaries on synthetic audio (exits non-zero on failure):
+    python vad.py --self-check
+"""
+import sys
+import time
+import wave
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+ENERGY_RATIO = 3.0          # Voiced speech: RMS above this multiple of the noise floor
+UNVOICED_RATIO = 1.5        # Unvoiced speech: lower energy is enough if the ZCR is high
+UNVOICED_ZCR = 0.25         # Zero crossings per sample marking fricatives
+MAX_SPEECH_ZCR = 0.6        # Above this the frame is broadband noise, not speech
+MIN_ENERGY = 200            # Absolute RMS floor so silence in a quiet room is never speech
+HANGOVER_MS = 300
+PREROLL_MS = 150
+MIN_SPEECH_MS = 120         # Shorter bursts (clicks, bumps) are discarded
+MAX_SEGMENT_SECONDS = 10
+
+
+class SpeechSegment:
+    """A detected stretch of speech. Times are seconds since the start of the audio."""
+
+    def __init__(self, start, end, samples):
+        self.start = start
+        self.end = end
+        self.samples = samples
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"SpeechSegment({self.start:.2f}s-{self.end:.2f}s)"
+
+
+class VoiceActivityDetector:
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, hangover_ms=HANGOVER_MS,
+                 preroll_ms=PREROLL_MS, min_speech_ms=MIN_SPEECH_MS, max_segment_seconds=MAX_SEGMENT_SECONDS,
+                 start_sample=0):
+        self.sample_rate = sample_rate
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.preroll_frames = preroll_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_segment_frames = int(max_segment_seconds * 1000 // frame_ms)
+        self.noise_floor = None
+        self.position = start_sample  # Sample index of the next frame, for timestamps
+
+        self._pending = np.empty(0, dtype=np.int16)  # Samples not yet filling a whole frame
+        self._preroll = []
+        self._segment = []
+        self._segment_start = None
+        self._speech_frames = 0
+        self._silent_frames = 0
+
+        self.frames_total = 0
+        self.frames_speech = 0
+        self.segments = 0
+
+    @property
+    def in_speech(self):
+        return self._segment_start is not None
+
+    def classify(self, frames, noise_floor=None):
+        """Vectorized speech/non-speech decision for an (N, frame_size) int16 array."""
+        samples = frames.astype(np.float32)
+        energy = np.sqrt(np.mean(samples ** 2, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        floor = noise_floor if noise_floor is not None else self.noise_floor
+        if floor is None:
+            floor = float(np.min(energy))
+        voiced = energy > max(MIN_ENERGY, floor * ENERGY_RATIO)
+        unvoiced = (energy > max(MIN_ENERGY, floor * UNVOICED_RATIO)) & (zcr > UNVOICED_ZCR)
+        speech = (voiced | unvoiced) & (zcr < MAX_SPEECH_ZCR)
+
+        # Track the noise floor from non-speech frames when no external floor is given
+        if noise_floor is None:
+            for value in energy[~speech]:
+                if self.noise_floor is None:
+                    self.noise_floor = float(value)
+                elif value < self.noise_floor:
+                    self.noise_floor = 0.9 * self.noise_floor + 0.1 * float(value)
+                else:
+                    self.noise_floor = 0.99 * self.noise_floor + 0.01 * float(value)
+        return speech
+
+    def process(self, samples, noise_floor=None):
+        """
+        Feed audio through the detector.
+        Args:
+            samples: int16 NumPy array
+            noise_floor (float): Externally tracked noise RMS (e.g. from the shared stream)
+        Returns:
+            tuple: (speech samples to pass on to a streaming recognizer, list of finished SpeechSegments)
+        """
+        samples = np.concatenate((self._pending, samples)) if len(self._pending) else samples
+        usable = len(samples) - len(samples) % self.frame_size
+        self._pending = samples[usable:].copy()
+        if not usable:
+            return np.empty(0, dtype=np.int16), []
+
+        frames = samples[:usable].reshape(-1, self.frame_size)
+        decisions = self.classify(frames, noise_floor)
+        self.frames_total += len(frames)
+        self.frames_speech += int(decisions.sum())
+
+        speech_out = []
+        finished = []
+        for frame, is_speech in zip(frames, decisions):
+            frame_start = self.position
+            self.position += self.frame_size
+            if self._segment_start is None:
+                if is_speech:
+                    # Speech starts: emit the pre-roll first so the onset is not clipped
+                    self._segment_start = frame_start - len(self._preroll) * self.frame_size
+                    self._segment = self._preroll + [frame]
+                    speech_out.extend(self._segment)
+                    self._preroll = []
+                    self._speech_frames = 1
+                    self._silent_frames = 0
+                else:
+                    self._preroll.append(frame)
+                    if len(self._preroll) > self.preroll_frames:
+                        self._preroll.pop(0)
+                continue
+
+            self._segment.append(frame)
+            speech_out.append(frame)
+            if is_speech:
+                self._speech_frames += 1
+                self._silent_frames = 0
+            else:
+                self._silent_frames += 1
+            if self._silent_frames >= self.hangover_frames or len(self._segment) >= self.max_segment_frames:
+                segment = self._close_segment()
+                if segment is not None:
+                    finished.append(segment)
+
+        speech = np.concatenate(speech_out) if speech_out else np.empty(0, dtype=np.int16)
+        return speech, finished
+
+    def flush(self):
+        """Close a segment still open at the end of the audio."""
+        if self._segment_start is None:
+            return None
+        return self._close_segment()
+
+    def _close_segment(self):
+        start = self._segment_start
+        frames = self._segment
+        speech_frames = self._speech_frames
+        self._segment_start = None
+        self._segment = []
+        self._speech_frames = 0
+        self._silent_frames = 0
+        if speech_frames < self.min_speech_frames:
+            return None
+        self.segments += 1
+        end = start + len(frames) * self.frame_size
+        return SpeechSegment(start / self.sample_rate, end / self.sample_rate, np.concatenate(frames))
+
+    def stats(self):
+        return {
+            "frames_total": self.frames_total,
+            "frames_speech": self.frames_speech,
+            "speech_ratio": round(self.frames_speech / self.frames_total, 3) if self.frames_total else 0.0,
+            "segments": self.segments,
+        }
+
+
+def listen_for_segment(reader, timeout=None, phrase_time_limit=None, block_size=480):
+    """
+    Read from an audio_stream.AudioReader until one speech segment is complete.
+    Args:
+        reader: AudioReader cursor on the shared microphone stream
+        timeout (float): Give up if no speech starts within this many seconds
+        phrase_time_limit (float): Maximum segment length in seconds
+    Returns:
+        SpeechSegment or None on timeout
+    """
+    vad = VoiceActivityDetector(
+        sample_rate=reader.stream.sample_rate,
+        max_segment_seconds=phrase_time_limit or MAX_SEGMENT_SECONDS,
+        start_sample=reader.position,
+    )
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        if deadline and not vad.in_speech and time.monotonic() > deadline:
+            return None
+        samples = reader.read_samples(block_size, timeout=0.5)
+        _, finished = vad.process(samples, reader.stream.noise_floor)
+        if finished:
+            return finished[0]
+
+
+def read_wav(path):
+    """Load a 16-bit mono WAV file as (int16 samples, sample rate)."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"{path}: expected 16-bit mono audio")
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16), wav.getframerate()
+
+
+def detect_segments(samples, sample_rate=SAMPLE_RATE):
+    """Run the detector over a whole recording and return its speech segments."""
+    vad = VoiceActivityDetector(sample_rate=sample_rate)
+    _, segments = vad.process(samples)
+    last = vad.flush()
+    if last is not None:
+        segments.append(last)
+    return segments
+
+
+def synthetic_audio(parts, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, seed=0):
+    """
+    Quiet background noise with 300 Hz tone bursts standing in for speech.
+    Args:
+        parts (list): (kind, frames) in order, kind "silence" or "tone", lengths in whole VAD frames
+    Returns:
+        numpy.ndarray: int16 samples
+    """
+    frame_size = sample_rate * frame_ms // 1000
+    total = sum(frames for _, frames in parts) * frame_size
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, 30, total)
+    position = 0
+    for kind, frames in parts:
+        length = frames * frame_size
+        if kind == "tone":
+            t = np.arange(length) / sample_rate
+            audio[position:position + length] += 3000 * np.sin(2 * np.pi * 300 * t)
+        position += length
+    return audio.astype(np.int16)
+
+
+def self_check():
+    """
+    Assert segment start/end times, hangover, pre-roll and the minimum speech length
+    on synthetic audio, whole and streamed in small blocks.
+    Returns:
+        list: Failure messages, empty if everything matched
+    """
+    frame = FRAME_MS / 1000
+    preroll = PREROLL_MS // FRAME_MS
+    hangover = HANGOVER_MS // FRAME_MS
+    short_pause = hangover // 2
+    parts = [
+        ("silence", 40), ("tone", 20),
+        ("silence", short_pause), ("tone", 10),  # A pause shorter than the hangover does not split
+        ("silence", 40), ("tone", MIN_SPEECH_MS // FRAME_MS - 2),  # Too short: a click, discarded
+        ("silence", 30), ("tone", 20), ("silence", 5),  # Still open at the end: closed by flush()
+    ]
+    starts = np.cumsum([0] + [frames for _, frames in parts])
+    expected = [
+        # Pre-roll before the first speech frame; hangover frames after the last one
+        ((starts[1] - preroll) * frame, (starts[4] + hangover) * frame),
+        ((starts[7] - preroll) * frame, starts[9] * frame),
+    ]
+    samples = synthetic_audio(parts)
+
+    failures = []
+    streamed = VoiceActivityDetector()
+    segments_streamed = []
+    for offset in range(0, len(samples), 512):
+        segments_streamed.extend(streamed.process(samples[offset:offset + 512])[1])
+    last = streamed.flush()
+    if last is not None:
+        segments_streamed.append(last)
+
+    for name, segments in (("whole", detect_segments(samples)), ("streamed", segments_streamed)):
+        found = [(segment.start, segment.end) for segment in segments]
+        if len(found) != len(expected):
+            failures.append(f"{name}: expected {len(expected)} segments, found {segments}")
+            continue
+        for (start, end), (expected_start, expected_end) in zip(found, expected):
+            if abs(start - expected_start) > 1e-6 or abs(end - expected_end) > 1e-6:
+                failures.append(f"{name}: segment {start:.2f}s-{end:.2f}s, expected {expected_start:.2f}s-{expected_end:.2f}s")
+        for segment in segments:
+            if len(segment.samples) != round(segment.duration * SAMPLE_RATE):
+                failures.append(f"{name}: {segment} holds {len(segment.samples)} samples")
+    return failures
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--self-check"]:
+        failures = self_check()
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print("VAD self-check " + ("failed" if failures else "passed"))
+        sys.exit(1 if failures else 0)
+    for path in sys.argv[1:]:
+        samples, rate = read_wav(path)
+        segments = detect_segments(samples, rate)
+        print(f"{path}: {len(segments)} speech segment(s)")
+        for segment in segments:
+            print(f"  {segment.start:7.2f}s - {segment.end:7.2f}s  ({segment.duration:.2f}s)")
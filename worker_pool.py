@@ -0,0 +1,246 @@
+# worker_pool.py
+"""
+Optional multi-process detection.
+
+In-process detection shares the GIL with capture, tracking and the speech
+threads, so it never uses more than about one core. The worker pool runs
+the network in N separate processes instead:
+
+- Frames are copied once into a slot of a multiprocessing.shared_memory
+  block; only the slot number travels through the task queue.
+- Every worker holds its own backend and preprocessor and returns compact
+  arrays (boxes, class ids, confidences) instead of pickled frames.
+- Results are handed back in submission order by default, and a frame is
+  refused when every slot is in flight (backpressure), so a slow pool drops
+  frames instead of building a backlog.
+
+Enable it with config.DETECTOR_WORKERS > 0.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+import config
+import object_recognition
+from backends import create_backend
+
+logger = logging.getLogger(__name__)
+
+# One in-order result: detections as object_recognition dicts plus the caller's context
+WorkerResult = namedtuple("WorkerResult", ["sequence", "context", "detections", "latency", "worker"])
+
+
+def _worker_main(index, shm_name, slot_bytes, tasks, results, backend_factory, threads):
+    """Entry point of a worker process: load a backend, then detect on frames from shared memory."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is handled by the main process, which stops the pool
+    try:
+        if threads:
+            config.DETECTOR_THREADS = {name: threads for name in config.DETECTOR_THREADS}
+        backend = backend_factory() if backend_factory else create_backend()
+        backend.load()
+        object_recognition.set_backend(backend)
+        object_recognition.warm_up_network()
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except Exception as e:
+        results.put(("error", index, str(e)))
+        return
+    results.put(("ready", index, os.getpid()))
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            sequence, slot, shape = task
+            start = time.perf_counter()
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            detections = object_recognition.infer_detections(frame)
+            boxes = np.array([d["box"] for d in detections], dtype=np.int32).reshape(-1, 4)
+            class_ids = np.array([d["class_id"] for d in detections], dtype=np.int16)
+            confidences = np.array([d["confidence"] for d in detections], dtype=np.float32)
+            del frame  # Release the buffer view before the slot is reused
+            results.put((sequence, slot, boxes, class_ids, confidences, time.perf_counter() - start, index))
+    finally:
+        shm.close()
+
+
+class DetectionWorkerPool:
+    def __init__(self, workers=None, slots=None, max_frame_size=None, ordered=True, backend_factory=None, threads=None):
+        """
+        Args:
+            workers (int): Worker processes, each with its own network (config.DETECTOR_WORKERS)
+            slots (int): Frames that may be in flight at once, defaults to two per worker
+            max_frame_size (tuple): Largest (width, height) a slot can hold (config.WORKER_MAX_FRAME_SIZE)
+            ordered (bool): Deliver results in submission order
+            backend_factory: Picklable callable returning an unloaded backend; the configured one by default
+            threads (int): Runtime threads per worker (config.DETECTOR_WORKER_THREADS)
+        """
+        self.workers = workers or config.DETECTOR_WORKERS
+        self.slots = slots or 2 * self.workers
+        width, height = max_frame_size or config.WORKER_MAX_FRAME_SIZE
+        self.slot_bytes = width * height * 3
+        self.ordered = ordered
+        self.backend_factory = backend_factory
+        self.threads = config.DETECTOR_WORKER_THREADS if threads is None else threads
+
+        self.shm = None
+        self.processes = []
+        self.ready = threading.Event()
+        self.error = None
+        self._context = multiprocessing.get_context("spawn")  # Never fork the threaded main process
+        # Created up front so a collector thread can wait on results before start() has run
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._free_slots = queue.Queue()
+        self._lock = threading.Lock()
+        self._next_sequence = 0
+        self._next_delivery = 0
+        self._pending = {}   # sequence -> (context, submitted_at)
+        self._finished = {}  # sequence -> WorkerResult waiting for an earlier one (ordered mode)
+
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0  # Frames refused because every slot was in flight
+        self.per_worker = [0] * self.workers
+        self.latency = 0.0  # Moving average of submit -> result, seconds
+
+    def start(self, timeout=60):
+        """Spawn the workers and wait until every one of them has loaded its network."""
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        for slot in range(self.slots):
+            self._free_slots.put(slot)
+        for index in range(self.workers):
+            process = self._context.Process(
+                target=_worker_main,
+                args=(index, self.shm.name, self.slot_bytes, self._tasks, self._results, self.backend_factory, self.threads),
+                name=f"detector-{index}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+        deadline = time.monotonic() + timeout
+        for _ in range(self.workers):
+            status, index, detail = self._results.get(timeout=max(0.0, deadline - time.monotonic()))
+            if status == "error":
+                self.error = RuntimeError(f"Detection worker {index} failed to start: {detail}")
+                self.stop()
+                raise self.error
+        logger.info(f"Detection worker pool ready with {self.workers} workers and {self.slots} frame slots")
+        self.ready.set()
+
+    def is_ready(self):
+        return self.ready.is_set()
+
+    def submit(self, frame, context=None, timeout=0):
+        """
+        Copy a frame into a free shared-memory slot and queue it for detection.
+        Args:
+            frame: BGR uint8 image, at most max_frame_size
+            context: Anything the caller wants back with the result (e.g. the FramePacket)
+            timeout (float): Seconds to wait for a free slot; 0 refuses at once, None waits forever
+        Returns:
+            int: The sequence number, or None if the pool is saturated (the frame is dropped)
+        """
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.shape[1]}x{frame.shape[0]} exceeds the worker slot size")
+        try:
+            slot = self._free_slots.get(block=timeout != 0, timeout=timeout or None)
+        except queue.Empty:
+            self.rejected += 1
+            return None
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = frame
+        del view
+        with self._lock:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+            self._pending[sequence] = (context, time.monotonic())
+            self.submitted += 1
+        self._tasks.put((sequence, slot, frame.shape))
+        return sequence
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._pending)
+
+    def get_result(self, timeout=None):
+        """
+        Next result (in submission order when ordered), or None on timeout.
+        Only one thread should collect results.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.ordered and self._next_delivery in self._finished:
+                result = self._finished.pop(self._next_delivery)
+                self._next_delivery += 1
+                return result
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                message = self._results.get(timeout=min(remaining, 0.5) if remaining is not None else 0.5)
+            except queue.Empty:
+                dead = [process.name for process in self.processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Detection worker(s) exited: {', '.join(dead)}")
+                continue
+            result = self._collect(message)
+            if not self.ordered:
+                return result
+            self._finished[result.sequence] = result
+
+    def _collect(self, message):
+        """Free the slot and turn a worker message into a WorkerResult."""
+        sequence, slot, boxes, class_ids, confidences, _, worker = message
+        self._free_slots.put(slot)
+        with self._lock:
+            context, submitted_at = self._pending.pop(sequence)
+            self.completed += 1
+            self.per_worker[worker] += 1
+            latency = time.monotonic() - submitted_at
+            self.latency = latency if self.completed == 1 else 0.9 * self.latency + 0.1 * latency
+        detections = [
+            {
+                "label": object_recognition.classes[class_id],
+                "class_id": int(class_id),
+                "box": tuple(int(value) for value in box),
+                "confidence": float(confidence),
+            }
+            for box, class_id, confidence in zip(boxes, class_ids, confidences)
+        ]
+        return WorkerResult(sequence, context, detections, latency, worker)
+
+    def stop(self):
+        """Stop the workers and release the shared memory."""
+        for _ in self.processes:
+            self._tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+        self.ready.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "slots": self.slots,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "in_flight": len(self._pending),
+                "per_worker": list(self.per_worker),
+                "latency_ms": round(self.latency * 1000, 2),
+            }